@@ -1,15 +1,20 @@
 from typing import Any, Optional
 
-from fastapi import Path, Query
-from fastapi.responses import JSONResponse
+from fastapi import Depends, Path, Query
+from fastapi.responses import JSONResponse, Response
 from fastapi.routing import APIRouter
 from starlette import status
 
 from app import logger
 from app.annotations.schema import Annotation, FeatureType
-from app.config import get_base_service_url, get_services
+from app.config import get_service_url, get_services, provider_enum
 from app.constants import UNIPROT_ID_PARAM, UNIPROT_QUAL_DESC, UNIPROT_RANGE_DESC
-from app.utils import clean_args, get_final_service_url, send_async_requests
+from app.utils import (
+    Deadline,
+    clean_args,
+    get_deadline,
+    send_async_requests,
+)
 
 annotations_route = APIRouter()
 
@@ -33,9 +38,11 @@ async def get_annotations_api(
         ..., description="Annotation type", alias="type"
     ),
     provider: Optional[Any] = Query(
-        None, enum=[x["provider"] for x in get_services("annotations")]
+        None, json_schema_extra=provider_enum("annotations")
     ),
     res_range: Any = Query(None, alias="range", description=UNIPROT_RANGE_DESC),
+    response: Response = None,
+    deadline: Deadline = Depends(get_deadline),
 ):
     f"""Returns annotation details for a UniProt accession
 
@@ -55,11 +62,16 @@ async def get_annotations_api(
     uniprot_qualifier = uniprot_qualifier.upper()
 
     results = await get_annotations_api_helper(
-        uniprot_qualifier, annotation_type, provider, res_range
+        uniprot_qualifier, annotation_type, provider, res_range, deadline=deadline
     )
+    response.headers.update(deadline.headers())
 
     if not results:
-        return JSONResponse(content={}, status_code=status.HTTP_404_NOT_FOUND)
+        return JSONResponse(
+            content={},
+            status_code=status.HTTP_404_NOT_FOUND,
+            headers=deadline.headers(),
+        )
 
     return results
 
@@ -70,6 +82,7 @@ async def get_annotations_api_helper(
     annotation_type: str,
     provider: Optional[str] = None,
     res_range: Optional[str] = None,
+    deadline: Optional[Deadline] = None,
 ):
     """Helper function for get_annotations_api"""
     qualifier = uniprot_qualifier.upper()
@@ -79,17 +92,16 @@ async def get_annotations_api_helper(
     )
     calls = []
     for service in services:
-        base_url = get_base_service_url(service["provider"])
-        final_url = get_final_service_url(
-            base_url, service["accessPoint"], f"{qualifier}.json"
-        )
+        final_url = get_service_url(service, f"{qualifier}.json")
         final_url = f"{final_url}&type={annotation_type}"
         if res_range:
             final_url = f"{final_url}&range={res_range}"
 
         calls.append(final_url)
 
-    result = await send_async_requests(calls)
+    result = await send_async_requests(
+        calls, providers=[x["provider"] for x in services], deadline=deadline
+    )
     final_result = []
 
     for x in result:
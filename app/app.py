@@ -1,6 +1,8 @@
+import asyncio
 import time
 from contextlib import asynccontextmanager
 import os
+from typing import Dict
 
 from uvicorn.workers import UvicornWorker
 from fastapi import FastAPI
@@ -31,20 +33,34 @@ instrumentator = Instrumentator(
 async def lifespan(app: FastAPI):
     """Async context manager for FastAPI lifespan events."""
     # Startup: load configs
-    from app.config import load_data_file
+    from app.client import HttpClient
+    from app.config import (
+        REGISTRY_DATA_JSON,
+        clear_registry,
+        load_data_file,
+        refresh_registry_periodically,
+    )
     from worker.cache.redis_cache import RedisCache
 
     RedisCache.init_redis(REDIS_URL, "utf-8")
+    HttpClient.init_client()
     load_data_file()
 
+    # keep the registry up to date in the background when it comes from a URL
+    registry_refresher = None
+    if REGISTRY_DATA_JSON:
+        registry_refresher = asyncio.create_task(refresh_registry_periodically())
+
     yield
 
-    # Shutdown: clear caches
-    from app.config import get_providers, read_data_file
+    # Shutdown: stop the refresher, close the outbound connection pool and clear
+    # caches
+    if registry_refresher is not None:
+        registry_refresher.cancel()
+
+    await HttpClient.close_client()
 
-    read_data_file.cache_clear()
-    load_data_file.cache_clear()
-    get_providers.cache_clear()
+    clear_registry()
 
 
 app = FastAPI(
@@ -104,6 +120,13 @@ class CustomUvicornWorker(UvicornWorker):
 
 
 def custom_openapi():
+    from app.config import DATA_FILE, add_provider_enums, read_data_file
+
+    # the provider enums come from the registry, rebuild the schema when it changes
+    registry = read_data_file(DATA_FILE)
+    if app.openapi_schema and OPENAPI_REGISTRY.get("data") is not registry:
+        app.openapi_schema = None
+
     if not app.openapi_schema:
         app.openapi_schema = get_openapi(
             title=app.title,
@@ -123,7 +146,13 @@ def custom_openapi():
                 # remove 422 response, also can remove other status code
                 if "422" in responses:
                     del responses["422"]
+        add_provider_enums(app.openapi_schema)
+        OPENAPI_REGISTRY["data"] = registry
     return app.openapi_schema
 
 
+# holds the registry data the cached OpenAPI schema was built from
+OPENAPI_REGISTRY: Dict[str, Dict] = {}
+
+
 app.openapi = custom_openapi
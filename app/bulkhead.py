@@ -0,0 +1,68 @@
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from typing import Dict, Optional, Tuple
+
+from app.config import get_provider
+
+MAX_CONCURRENT_REQUESTS = int(os.getenv("MAX_CONCURRENT_REQUESTS", 100))
+MAX_CONCURRENT_PROVIDER_REQUESTS = int(
+    os.getenv("MAX_CONCURRENT_PROVIDER_REQUESTS", 20)
+)
+BATCH_MAX_CONCURRENT_REQUESTS = int(os.getenv("BATCH_MAX_CONCURRENT_REQUESTS", 50))
+BATCH_MAX_CONCURRENT_PROVIDER_REQUESTS = int(
+    os.getenv("BATCH_MAX_CONCURRENT_PROVIDER_REQUESTS", 10)
+)
+
+
+class Bulkhead:
+    """Bulkhead class caps the requests in flight to the beacons, in total and per
+    provider. Interactive and batch traffic use separate bulkheads so a large
+    batch cannot starve single accession lookups.
+    """
+
+    def __init__(self, name: str, max_requests: int, max_provider_requests: int):
+        self.name = name
+        self.max_provider_requests = max_provider_requests
+        self.semaphore = asyncio.Semaphore(max_requests)
+        self.provider_semaphores: Dict[str, Tuple[int, asyncio.Semaphore]] = {}
+
+    def get_provider_semaphore(self, provider: str) -> asyncio.Semaphore:
+        # the registry can set a lower or higher limit for a provider
+        provider_config = get_provider(provider) or {}
+        limit = int(provider_config.get("maxConcurrency", self.max_provider_requests))
+
+        current = self.provider_semaphores.get(provider)
+        if current is None or current[0] != limit:
+            # a registry refresh changed the limit, requests holding a slot
+            # release it to the semaphore they acquired
+            current = (limit, asyncio.Semaphore(limit))
+            self.provider_semaphores[provider] = current
+        return current[1]
+
+    @asynccontextmanager
+    async def slot(self, provider: Optional[str] = None):
+        """Waits for a free slot for a request to the provider.
+
+        Args:
+            provider (str, optional): A provider id, only the total limit applies
+                when not passed.
+        """
+        if provider is None:
+            async with self.semaphore:
+                yield
+            return
+
+        # wait for the provider before taking a total slot, otherwise requests
+        # queued for a slow provider hold total slots and block the others
+        async with self.get_provider_semaphore(provider):
+            async with self.semaphore:
+                yield
+
+
+INTERACTIVE_BULKHEAD = Bulkhead(
+    "interactive", MAX_CONCURRENT_REQUESTS, MAX_CONCURRENT_PROVIDER_REQUESTS
+)
+BATCH_BULKHEAD = Bulkhead(
+    "batch", BATCH_MAX_CONCURRENT_REQUESTS, BATCH_MAX_CONCURRENT_PROVIDER_REQUESTS
+)
@@ -0,0 +1,138 @@
+import math
+import os
+import time
+from typing import Any, Dict, List
+
+from prometheus_client import Gauge
+
+from app import logger
+from worker.cache.utils import (
+    claim_circuit_probe,
+    get_circuit_states,
+    increment_circuit_failures,
+    reset_circuit,
+    set_circuit_opened,
+)
+
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", 5))
+CIRCUIT_COOL_DOWN = float(os.getenv("CIRCUIT_COOL_DOWN", 30))
+
+CLOSED = 0
+HALF_OPEN = 1
+OPEN = 2
+
+CIRCUIT_STATE = Gauge(
+    "beacons_circuit_breaker_state",
+    "Circuit breaker state of a provider; 0 closed, 1 half-open, 2 open.",
+    ["provider"],
+    multiprocess_mode="livemostrecent",
+)
+
+
+def get_circuit_state(state: Dict[str, Any], now: float) -> int:
+    """Returns the state of a circuit from its failure count and opening time.
+
+    Args:
+        state (Dict): A circuit with failures and opened_at keys.
+        now (float): Current timestamp.
+
+    Returns:
+        int: One of CLOSED, HALF_OPEN or OPEN.
+    """
+    if state["failures"] < CIRCUIT_FAILURE_THRESHOLD:
+        return CLOSED
+    if now - state["opened_at"] < CIRCUIT_COOL_DOWN:
+        return OPEN
+    return HALF_OPEN
+
+
+class CircuitBreaker:
+    """CircuitBreaker class skips providers which keep failing.
+
+    A circuit opens after CIRCUIT_FAILURE_THRESHOLD consecutive failures and
+    no request is sent to the provider for CIRCUIT_COOL_DOWN seconds. After the
+    cool-down the circuit is half-open and a single probe request is let through;
+    a success closes the circuit, a failure opens it for another cool-down.
+    The circuits are shared between the workers through Redis: the failures are
+    counted atomically and the probe is claimed by a single worker.
+    """
+
+    # last known circuits, used when Redis is unavailable
+    circuits: Dict[str, Dict[str, Any]] = {}
+
+    @classmethod
+    def allow_requests(cls, providers: List[str]) -> List[bool]:
+        """Returns if a request can be sent to each of the providers.
+
+        Args:
+            providers (List[str]): A list of provider ids.
+
+        Returns:
+            List[bool]: False for the providers with an open circuit.
+        """
+        now = time.time()
+        allowed = []
+
+        for provider, shared in zip(providers, get_circuit_states(providers)):
+            circuit = shared or cls.circuits.get(provider)
+            if circuit is None:
+                allowed.append(True)
+                continue
+
+            cls.circuits[provider] = circuit
+            state = get_circuit_state(circuit, now)
+            allow = state != OPEN
+
+            if state == HALF_OPEN:
+                # claim the probe, other requests wait for its outcome
+                claimed = claim_circuit_probe(
+                    provider, max(1, math.ceil(CIRCUIT_COOL_DOWN))
+                )
+                if claimed is None:
+                    # Redis is unavailable, claim it in this worker
+                    circuit["opened_at"] = now
+                    claimed = True
+                if claimed:
+                    logger.info(f"Sending probe request to {provider}")
+                allow = claimed
+
+            CIRCUIT_STATE.labels(provider=provider).set(state)
+            allowed.append(allow)
+
+        return allowed
+
+    @classmethod
+    def record_result(cls, provider: str, success: bool) -> None:
+        """Records the outcome of a request to a provider.
+
+        Args:
+            provider (str): A provider id.
+            success (bool): If the provider answered without a server error.
+        """
+        circuit = cls.circuits.get(provider, {"failures": 0, "opened_at": 0.0})
+
+        if success:
+            if not circuit["failures"]:
+                return
+            if circuit["failures"] >= CIRCUIT_FAILURE_THRESHOLD:
+                logger.info(f"Circuit for {provider} closed")
+            circuit = {"failures": 0, "opened_at": 0.0}
+            reset_circuit(provider)
+        else:
+            failures = increment_circuit_failures(provider)
+            if failures is None:
+                failures = circuit["failures"] + 1
+            if failures == CIRCUIT_FAILURE_THRESHOLD:
+                logger.warning(
+                    f"Circuit for {provider} opened after {failures} failures"
+                )
+            opened_at = 0.0
+            if failures >= CIRCUIT_FAILURE_THRESHOLD:
+                opened_at = time.time()
+                set_circuit_opened(provider, opened_at)
+            circuit = {"failures": failures, "opened_at": opened_at}
+
+        cls.circuits[provider] = circuit
+        CIRCUIT_STATE.labels(provider=provider).set(
+            get_circuit_state(circuit, time.time())
+        )
@@ -0,0 +1,106 @@
+import os
+from typing import Dict, Optional
+
+import httpx
+from prometheus_client import Gauge
+
+from app import logger
+
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", 100))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", 20))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", 30))
+HTTP2_ENABLED = bool(os.getenv("HTTP2_ENABLED"))
+
+POOL_CONNECTIONS = Gauge(
+    "beacons_http_pool_connections",
+    "Connections held by the shared outbound HTTP pool.",
+    ["state"],
+    multiprocess_mode="livesum",
+)
+
+
+def http2_available() -> bool:
+    """Returns if HTTP/2 can be used, i.e. the optional h2 package is installed.
+
+    Returns:
+        bool: True if h2 is importable, otherwise False.
+    """
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class HttpClient:
+    """HttpClient class holds the httpx.AsyncClient shared by a worker process"""
+
+    client: Optional[httpx.AsyncClient] = None
+
+    @classmethod
+    def init_client(cls) -> None:
+        if cls.client is not None:
+            return
+
+        http2 = HTTP2_ENABLED
+        if http2 and not http2_available():
+            logger.warning(
+                "HTTP2_ENABLED is set but h2 is not installed, using HTTP/1.1"
+            )
+            http2 = False
+
+        cls.client = httpx.AsyncClient(
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+            ),
+        )
+
+    @classmethod
+    def get_client(cls) -> httpx.AsyncClient:
+        if cls.client is None:
+            cls.init_client()
+        return cls.client
+
+    @classmethod
+    async def close_client(cls) -> None:
+        if cls.client is not None:
+            await cls.client.aclose()
+            cls.client = None
+            cls.update_pool_metrics()
+
+    @classmethod
+    def pool_stats(cls) -> Dict[str, int]:
+        """Returns the number of active and idle connections in the pool.
+
+        Returns:
+            Dict: Connection counts keyed by state.
+        """
+        stats = {"active": 0, "idle": 0}
+        if cls.client is None:
+            return stats
+
+        # httpx does not expose pool statistics, read them from httpcore. These
+        # are private attributes, the counts stay at 0 if they change.
+        transport = getattr(cls.client, "_transport", None)
+        pool = getattr(transport, "_pool", None)
+        for connection in getattr(pool, "connections", None) or []:
+            is_idle = getattr(connection, "is_idle", None)
+            if not callable(is_idle):
+                continue
+            if is_idle():
+                stats["idle"] += 1
+            else:
+                stats["active"] += 1
+
+        return stats
+
+    @classmethod
+    def update_pool_metrics(cls) -> None:
+        """Exports the connection counts of the pool, the gauge is updated after
+        each request as callbacks are not collected from gunicorn workers.
+        """
+        for state, count in cls.pool_stats().items():
+            POOL_CONNECTIONS.labels(state=state).set(count)
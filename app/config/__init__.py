@@ -1,105 +1,379 @@
+import asyncio
 import json
 import os
-from functools import lru_cache
+import re
+import tempfile
+from typing import Any, Dict, List, Optional, Tuple
 
+import httpx
 from fastapi.params import Query
 
 from app import logger
+from app.version import __major__version__
 
 DATA_FILE = "data.json"
 ENV = os.getenv("ENVIRONMENT", "DEV")
-MAX_POST_LIMIT = int(os.getenv("MAX_POST_LIMIT", 10))
 GIFTS_API = os.getenv("GIFTS_API", "https://www.ebi.ac.uk/gifts/api/mappings/")
 UNIPROT_API = os.getenv("UNIPROT_API", "https://www.ebi.ac.uk/proteins/api/proteins/")
 DISABLED_BEACONS = os.environ.get("DISABLED_BEACONS", "").split(",")
+PROVIDER_PREFERENCE = [
+    x for x in os.getenv("PROVIDER_PREFERENCE", "pdbe").split(",") if x
+]
+SUMMARY_CACHE_TTL = int(os.getenv("SUMMARY_CACHE_TTL", 3600))
+DETAILS_CACHE_TTL = int(os.getenv("DETAILS_CACHE_TTL", 3600))
+BEACON_CACHE_TTL = int(os.getenv("BEACON_CACHE_TTL", 600))
+SUMMARY_INDEX_CACHE_SIZE = int(os.getenv("SUMMARY_INDEX_CACHE_SIZE", 256))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", 20))
+BATCH_CHUNK_SIZE = int(os.getenv("BATCH_CHUNK_SIZE", 100))
+BATCH_MAX_STRUCTURES = int(os.getenv("BATCH_MAX_STRUCTURES", 100000))
+REGISTRY_DATA_JSON = os.getenv("REGISTRY_DATA_JSON")
+REGISTRY_REFRESH_INTERVAL = float(os.getenv("REGISTRY_REFRESH_INTERVAL", 300))
+REGISTRY_REQUEST_TIMEOUT = float(os.getenv("REGISTRY_REQUEST_TIMEOUT", 10))
+REGISTRY_SNAPSHOT_FILE = os.getenv(
+    "REGISTRY_SNAPSHOT_FILE",
+    os.path.join(tempfile.gettempdir(), "3dbeacons-registry.json"),
+)
 
 logger.debug(f"Environment is {ENV}")
 
 
-@lru_cache(maxsize=None)
-def read_data_file(filename):
-    data_filepath = os.path.join(os.path.dirname(__file__), filename)
-    with open(data_filepath) as fp:
-        data = json.load(fp)
+def read_data_file(filename: str = DATA_FILE) -> Dict:
+    """Returns the registry data in use, loading it on first use.
 
-    # check for REGISTRY_DATA_JSON in env and loads the JSON if exists
-    data_json_env = os.getenv("REGISTRY_DATA_JSON")
+    The registry is read from the last snapshot fetched from REGISTRY_DATA_JSON,
+    if there is one, otherwise from the bundled data file, so it never waits on
+    the network. The data is replaced as a whole by refresh_registry.
 
-    if data_json_env:
-        logger.info(
-            f"REGISTRY_DATA_JSON env var exists, trying to load JSON @ {data_json_env}"
-        )
-        data = read_registry_data(data_json_env)
+    Args:
+        filename (str): The data file bundled in app/config.
+    Returns:
+        Dict: The registry data.
+    """
+    data = REGISTRY.get("data")
+    if data is not None:
+        return data
 
-    logger.info(f"Loaded data JSON: {DATA_FILE}")
+    data = None
+    if REGISTRY_DATA_JSON and os.path.exists(REGISTRY_SNAPSHOT_FILE):
+        data = read_registry_file(REGISTRY_SNAPSHOT_FILE)
+
+    if data is None:
+        data = read_registry_file(os.path.join(os.path.dirname(__file__), filename))
+
+    REGISTRY["data"] = data
     return data
 
 
-def read_registry_data(data_json_env):
-    import requests
+def read_registry_file(filepath: str) -> Optional[Dict]:
+    """Reads and validates registry data from a file.
 
+    Args:
+        filepath (str): Path of the JSON file.
+    Returns:
+        Dict: The registry data, None if the file can't be read or is invalid.
+    """
     try:
-        request_data = requests.get(data_json_env)
-        if request_data.status_code == 200:
-            data = request_data.json()
-        else:
-            raise Exception
-    except Exception:
-        logger.info("Registry JSON cannot be retrieved, fallback to default data.json")
+        with open(filepath) as fp:
+            data = json.load(fp)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Registry JSON cannot be read from {filepath}: {e!r}")
+        return None
+
+    if not is_valid_registry(data):
+        logger.warning(f"Registry JSON in {filepath} is invalid")
+        return None
+
+    logger.info(f"Loaded data JSON: {filepath}")
     return data
 
 
+def is_valid_registry(data) -> bool:
+    """Checks that registry data has everything needed to build the index.
+
+    Args:
+        data: The decoded registry JSON.
+    Returns:
+        bool: True if the registry can be used, otherwise False.
+    """
+    if not isinstance(data, dict):
+        return False
+
+    providers = data.get("providers")
+    services = data.get("services")
+    if not isinstance(providers, list) or not isinstance(services, list):
+        return False
+    if not providers or not services:
+        return False
+
+    provider_keys = ("providerId",)
+    service_keys = ("serviceType", "provider", "accessPoint")
+    return all(
+        isinstance(x, dict) and all(isinstance(x.get(k), str) for k in provider_keys)
+        for x in providers
+    ) and all(
+        isinstance(x, dict) and all(isinstance(x.get(k), str) for k in service_keys)
+        for x in services
+    )
+
+
+def write_registry_snapshot(data: Dict) -> None:
+    """Writes the registry data to REGISTRY_SNAPSHOT_FILE.
+
+    The snapshot is written to a temporary file first and moved in place, so a
+    worker starting at the same time never reads a partial file.
+
+    Args:
+        data (Dict): The registry data.
+    """
+    tmp_filepath = f"{REGISTRY_SNAPSHOT_FILE}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_filepath, "w") as fp:
+            json.dump(data, fp)
+        os.replace(tmp_filepath, REGISTRY_SNAPSHOT_FILE)
+    except OSError as e:
+        logger.warning(f"Registry snapshot cannot be written: {e!r}")
+
+
+async def refresh_registry(url: str = None) -> bool:
+    """Fetches the registry data from a URL and swaps it in if it has changed.
+
+    The ETag of the last response is sent back, so an unchanged registry costs a
+    304 response. Invalid or unreachable registries are ignored and the data in
+    use is kept.
+
+    Args:
+        url (str, optional): The registry URL, defaults to REGISTRY_DATA_JSON.
+    Returns:
+        bool: True if new registry data is in use, otherwise False.
+    """
+    from app.client import HttpClient
+
+    url = url or REGISTRY_DATA_JSON
+    headers = {}
+    if REGISTRY.get("etag"):
+        headers["If-None-Match"] = REGISTRY["etag"]
+
+    try:
+        response = await HttpClient.get_client().get(
+            url, headers=headers, timeout=REGISTRY_REQUEST_TIMEOUT
+        )
+    except httpx.HTTPError as e:
+        logger.warning(f"Registry JSON cannot be retrieved from {url}: {e!r}")
+        return False
+
+    if response.status_code == 304:
+        return False
+
+    if response.status_code != 200:
+        logger.warning(
+            f"Registry JSON cannot be retrieved from {url}: {response.status_code}"
+        )
+        return False
+
+    try:
+        data = response.json()
+    except ValueError:
+        data = None
+
+    if not is_valid_registry(data):
+        logger.warning(f"Registry JSON from {url} is invalid, keeping the current one")
+        return False
+
+    REGISTRY["etag"] = response.headers.get("ETag")
+    if data == REGISTRY.get("data"):
+        return False
+
+    # a single assignment, requests in progress keep the index they started with
+    REGISTRY["data"] = data
+    write_registry_snapshot(data)
+    logger.info(f"Loaded data JSON: {url}")
+    return True
+
+
+async def refresh_registry_periodically(
+    url: str = None, interval: float = None
+) -> None:
+    """Refreshes the registry data every interval seconds, until cancelled.
+
+    Args:
+        url (str, optional): The registry URL, defaults to REGISTRY_DATA_JSON.
+        interval (float, optional): Seconds between two refreshes, defaults to
+            REGISTRY_REFRESH_INTERVAL.
+    """
+    interval = interval or REGISTRY_REFRESH_INTERVAL
+    while True:
+        try:
+            await refresh_registry(url)
+        except Exception as e:
+            logger.error(f"Registry refresh failed: {e!r}")
+        await asyncio.sleep(interval)
+
+
+def clear_registry() -> None:
+    """Drops the registry data in use, it is read again on the next lookup."""
+    REGISTRY.clear()
+    REGISTRY_INDEX.clear()
+
+
+# holds the registry data in use and the ETag it was fetched with
+REGISTRY: Dict[str, Any] = {}
+
+PROVIDER_ENUM_KEY = "x-provider-enum"
+
+
+class RegistryIndex:
+    """Lookup tables built once from the registry data.
+
+    The lists held by the index are shared by all the callers and must not be
+    modified.
+    """
+
+    EMPTY: List[Dict] = []
+
+    def __init__(self, data: Dict):
+        self.data = data
+        url_key = "devBaseServiceUrl" if ENV == "DEV" else "baseServiceUrl"
+
+        self.providers: Dict[str, Dict] = {
+            x["providerId"]: x for x in data["providers"]
+        }
+        # providers in PROVIDER_PREFERENCE first, then in the order of the registry
+        self.provider_ranks: Dict[str, int] = {}
+        for provider in PROVIDER_PREFERENCE + list(self.providers):
+            self.provider_ranks.setdefault(provider.lower(), len(self.provider_ranks))
+        self.base_urls: Dict[str, str] = {
+            k: v[url_key] for k, v in self.providers.items() if v.get(url_key)
+        }
+
+        self.services: Dict[str, List[Dict]] = {}
+        self.provider_services: Dict[Tuple[str, str], List[Dict]] = {}
+        self.url_prefixes: Dict[Tuple[str, str], str] = {}
+
+        for service in data["services"]:
+            key = (service["serviceType"], service["provider"])
+            base_url = self.base_urls.get(service["provider"])
+            if base_url is not None:
+                self.url_prefixes[key] = normalise_url(
+                    f"{base_url}/{service['accessPoint']}"
+                )
+
+            if service["provider"] in DISABLED_BEACONS:
+                continue
+            self.services.setdefault(key[0], []).append(service)
+            self.provider_services.setdefault(key, []).append(service)
+
+        self.excluded_services: Dict[Tuple[str, str], List[Dict]] = {
+            (service_type, provider): [x for x in services if x["provider"] != provider]
+            for service_type, services in self.services.items()
+            for provider in {x["provider"] for x in services}
+        }
+
+    @classmethod
+    def get(cls) -> "RegistryIndex":
+        """Returns the index of the current registry data, rebuilt when it changes."""
+        data = read_data_file(DATA_FILE)
+        index = REGISTRY_INDEX.get("current")
+
+        if index is None or index.data is not data:
+            index = cls(data)
+            REGISTRY_INDEX["current"] = index
+
+        return index
+
+
+# holds the RegistryIndex of the loaded registry data
+REGISTRY_INDEX: Dict[str, RegistryIndex] = {}
+
+
+def normalise_url(url: str) -> str:
+    """Removes duplicate slashes from a URL, except the ones after the scheme."""
+    return re.sub(r"([^:])//+", r"\1/", url)
+
+
+def get_param_value(value: Any) -> Any:
+    """Returns the value of a query parameter, the default of a Query which was
+    not resolved by FastAPI, i.e. when a route is called as a function."""
+    return value.default if isinstance(value, Query) else value
+
+
 def get_services(
-    service_type: str = None, provider: Query = None, exclude_provider: Query = None
+    service_type: str = None,
+    provider: Optional[str] = None,
+    exclude_provider: Optional[str] = None,
 ):
     """Returns a list of services available.
 
     Args:
         service_type (str, optional): A type of service.
-        provider (Query, optional): A provider.
-        exclude_provider (Query, optional): Provider to exclude.
+        provider (str, optional): A provider.
+        exclude_provider (str, optional): Provider to exclude.
     Returns:
-        list: A list of services based on the parameters passed.
+        list: A list of services based on the parameters passed. The list is shared
+        and must not be modified.
     """
-    data_file = DATA_FILE
-    data = read_data_file(data_file)
-    results = []
+    # the index is keyed on plain values
+    provider = get_param_value(provider)
+    exclude_provider = get_param_value(exclude_provider)
 
     # assuming all services to be returned when no service_type and provider is passed
     if not service_type and not provider and not exclude_provider:
-        return data["services"]
-
-    # filter services for a service type
-    if service_type:
-        results = list(
-            filter(
-                lambda x: x["serviceType"] == service_type,
-                [x for x in data["services"]],
-            )
-        )
+        return read_data_file(DATA_FILE)["services"]
 
-    # filter services for a provider
-    if provider:
-        results = list(
-            filter(lambda x: x["provider"] == provider, [x for x in results])
-        )
+    if not service_type:
+        return RegistryIndex.EMPTY
 
-    if DISABLED_BEACONS:
-        results = list(
-            filter(
-                lambda x: x["provider"] not in DISABLED_BEACONS, [x for x in results]
-            )
+    index = RegistryIndex.get()
+
+    if provider:
+        if provider == exclude_provider:
+            return RegistryIndex.EMPTY
+        return index.provider_services.get(
+            (service_type, provider), RegistryIndex.EMPTY
         )
 
     if exclude_provider:
-        results = list(
-            filter(lambda x: x["provider"] != exclude_provider, [x for x in results])
+        return index.excluded_services.get(
+            (service_type, exclude_provider),
+            index.services.get(service_type, RegistryIndex.EMPTY),
         )
 
-    return results
+    return index.services.get(service_type, RegistryIndex.EMPTY)
+
+
+def provider_enum(service_type: str) -> Dict:
+    """Marks a query parameter as taking the providers of a service type.
+
+    The enum itself is added when the OpenAPI schema is built, see
+    add_provider_enums, so the registry is not read when routes are declared.
+
+    Args:
+        service_type (str): A type of service.
+    Returns:
+        Dict: Extra JSON schema for the query parameter.
+    """
+    return {PROVIDER_ENUM_KEY: service_type}
+
+
+def add_provider_enums(openapi_schema: Dict) -> Dict:
+    """Replaces the provider_enum markers of an OpenAPI schema with the providers
+    of the registry in use.
+
+    Args:
+        openapi_schema (Dict): The OpenAPI schema, updated in place.
+    Returns:
+        Dict: The OpenAPI schema.
+    """
+    for method_item in openapi_schema.get("paths", {}).values():
+        for operation in method_item.values():
+            for param in operation.get("parameters", []):
+                schema = param.get("schema", {})
+                service_type = schema.pop(PROVIDER_ENUM_KEY, None)
+                if service_type is not None:
+                    schema["enum"] = [x["provider"] for x in get_services(service_type)]
+
+    return openapi_schema
 
 
-@lru_cache(maxsize=None)
 def get_providers():
     data_file = DATA_FILE
     data = read_data_file(data_file)
@@ -107,17 +381,61 @@ def get_providers():
     return data["providers"]
 
 
+def get_provider(provider: str) -> Optional[Dict]:
+    """Returns the registry entry of a provider.
+
+    Args:
+        provider (str): A provider id.
+    Returns:
+        Dict: The provider, None if it is not in the registry.
+    """
+    return RegistryIndex.get().providers.get(provider)
+
+
+def get_provider_rank(provider: Optional[str]) -> int:
+    """Returns the rank of a provider in the preference order, the copy of a
+    model from the provider with the lowest rank is kept when deduplicating.
+
+    Args:
+        provider (str): A provider id, in any case.
+    Returns:
+        int: The rank, providers missing from the registry are ranked last.
+    """
+    ranks = RegistryIndex.get().provider_ranks
+    return ranks.get((provider or "").lower(), len(ranks))
+
+
 def get_base_service_url(provider: str) -> str:
-    url_key = "baseServiceUrl"
+    return RegistryIndex.get().base_urls[provider]
+
+
+def get_service_url(service: Dict, *parts: str) -> str:
+    """Returns the final URL of a service, from the URL prefix prebuilt for it.
+
+    Args:
+        service (Dict): A service from get_services.
+        parts (str): Path segments or query string appended to the access point.
+    Returns:
+        str: The URL, with the version query parameter.
+    """
+    url = RegistryIndex.get().url_prefixes.get(
+        (service.get("serviceType"), service["provider"])
+    )
+    if url is None:
+        url = normalise_url(
+            f"{get_base_service_url(service['provider'])}/{service['accessPoint']}"
+        )
+
+    for part in parts:
+        url = f"{url.rstrip('/')}/{part.lstrip('/')}"
 
-    if ENV == "DEV":
-        url_key = "devBaseServiceUrl"
+    # remove / before query params
+    url = url.replace("/?", "?")
 
-    providers = get_providers()
-    return list(filter(lambda x: x["providerId"] == provider, providers))[0][url_key]
+    separator = "&" if "?" in url else "?"
+    return f"{url}{separator}version={__major__version__}"
 
 
-@lru_cache(maxsize=None)
 def load_data_file():
     data_file = DATA_FILE
     read_data_file(data_file)
@@ -12,6 +12,29 @@ TEMPLATE_DESC = (
     "assembly ID and chain for SMTL entries"
 )
 UNP_CHECKSUM_DESC = "CRC64 checksum of the UniProt sequence"
+STREAM_DESC = (
+    "Stream the response, the structures of each provider are sent as soon as "
+    "they are validated"
+)
+SORT_DESC = (
+    "Rank the structures, the best first: highest coverage, sequence identity or "
+    "average confidence, lowest resolution or most recently created"
+)
+LIMIT_DESC = "Maximum number of structures returned"
+OFFSET_DESC = "Number of structures skipped, to page through the structures"
+DEDUPE_DESC = (
+    "Return a single copy of the models returned by several providers, i.e. "
+    "sharing a model identifier or model URL"
+)
+FIELDS_DESC = (
+    "Comma separated fields of the structures to return, e.g. "
+    "model_identifier,provider,summary.entities.identifier; fields of the summary "
+    "can be given without the summary prefix"
+)
+RESIDUE_FORMAT_DESC = (
+    "Format of the residues of a segment, either a list of objects or, with "
+    "columnar, one array per residue field"
+)
 ENSEMBL_QUAL_DESC = "Ensembl identifier."
 
 # RESPONSE MESSAGES
@@ -1,11 +1,12 @@
 from typing import Any, Dict, List, Optional, Set
 
+from fastapi import Depends
 from fastapi.params import Path, Query
 from fastapi.routing import APIRouter
 from starlette import status
-from starlette.responses import JSONResponse
+from starlette.responses import JSONResponse, Response
 
-from app.config import GIFTS_API, MAX_POST_LIMIT, get_services
+from app.config import GIFTS_API, provider_enum
 from app.constants import ENSEMBL_QUAL_DESC
 from app.ensembl.schema import EnsemblSummary
 from app.uniprot.helper import (
@@ -14,7 +15,7 @@ from app.uniprot.helper import (
     get_uniprot_name,
 )
 from app.uniprot.schema import AccessionListRequest
-from app.utils import clean_args, request_get
+from app.utils import Deadline, clean_args, get_deadline, request_get
 
 ensembl_route = APIRouter()
 
@@ -30,9 +31,9 @@ async def get_ensembl_summary(
     qualifier: Any = Path(
         ..., description=ENSEMBL_QUAL_DESC, example="ENSG00000288864"
     ),
-    provider: Optional[Any] = Query(
-        None, enum=[x["provider"] for x in get_services("summary")]
-    ),
+    provider: Optional[Any] = Query(None, json_schema_extra=provider_enum("summary")),
+    response: Response = None,
+    deadline: Deadline = Depends(get_deadline),
 ):
     f"""Returns summary of experimental and theoretical models for an Ensembl gene ID.
 
@@ -43,10 +44,17 @@ async def get_ensembl_summary(
     Returns:
         Result: A Result summary object with experimental and theoretical models.
     """
-    ensembl_summary = await get_ensembl_summary_helper(qualifier, provider)
+    ensembl_summary = await get_ensembl_summary_helper(
+        qualifier, provider, deadline=deadline
+    )
+    response.headers.update(deadline.headers())
 
     if not ensembl_summary:
-        return JSONResponse(content={}, status_code=status.HTTP_404_NOT_FOUND)
+        return JSONResponse(
+            content={},
+            status_code=status.HTTP_404_NOT_FOUND,
+            headers=deadline.headers(),
+        )
 
     return ensembl_summary
 
@@ -55,6 +63,7 @@ async def get_ensembl_summary(
 async def get_ensembl_summary_helper(
     qualifier: str,
     provider=None,
+    deadline: Optional[Deadline] = None,
 ):
     f"""Returns summary of experimental and theoretical models for a UniProt
     accession or entry name
@@ -62,6 +71,7 @@ async def get_ensembl_summary_helper(
     Args:
         qualifier (str): {ENSEMBL_QUAL_DESC}
         provider (str, optional): Data provider
+        deadline (Deadline, optional): Latency budget for the beacon requests
 
     Returns:
         Result: A Result summary object with experimental and theoretical models.
@@ -77,10 +87,9 @@ async def get_ensembl_summary_helper(
     uniprot_request_list = AccessionListRequest(accessions=[], provider=provider)
     uniprot_set: Set = set()
 
+    # the accessions are limited like a POST /uniprot/summary batch, by the
+    # deadline and BATCH_MAX_STRUCTURES
     for mapping in ensembl_mappings["entryMappings"]:
-        if len(uniprot_set) >= MAX_POST_LIMIT:
-            break
-
         uniprot_accession = mapping["uniprotEntry"]["uniprotAccession"]
         uniprot_set.add(uniprot_accession)
 
@@ -94,14 +103,17 @@ async def get_ensembl_summary_helper(
         transcript_dict[uniprot_accession].append(mapping["ensemblTranscript"])
 
     uniprot_request_list.accessions = list(uniprot_set)
-    uniprot_summary = await get_list_of_uniprot_summary_helper(uniprot_request_list)
-    uniprot_api_response = await get_uniprot_api_results(
-        uniprot_request_list.accessions
+    uniprot_summary = await get_list_of_uniprot_summary_helper(
+        uniprot_request_list, deadline=deadline
     )
-
     if not uniprot_summary:
         return JSONResponse(content={}, status_code=status.HTTP_404_NOT_FOUND)
 
+    # only the accessions with models are looked up in UniProt
+    uniprot_api_response = await get_uniprot_api_results(
+        [x.uniprot_entry.ac for x in uniprot_summary], deadline=deadline
+    )
+
     results = {
         "ensembl_id": qualifier,
         "species": ensembl_mappings["taxonomy"]["species"],
@@ -111,7 +123,14 @@ async def get_ensembl_summary_helper(
 
     for uniprot in uniprot_summary:
         uniprot_response = uniprot_api_response.get(uniprot.uniprot_entry.ac)
-        uniprot.uniprot_entry.description = get_uniprot_name(uniprot_response)
+        # the summaries can be shared by the worker's summary cache, copy them
+        # rather than setting the description in place. Entries UniProt has not
+        # answered for in time are left without a description.
+        if uniprot_response is not None:
+            uniprot_entry = uniprot.uniprot_entry.model_copy(
+                update={"description": get_uniprot_name(uniprot_response)}
+            )
+            uniprot = uniprot.model_copy(update={"uniprot_entry": uniprot_entry})
 
         for ensembl_transcript in transcript_dict[uniprot.uniprot_entry.ac]:
             results["uniprot_mappings"].append(
@@ -1,3 +1,6 @@
+import os
+import shutil
+
 # Gunicorn config variables
 loglevel = "info"
 errorlog = "-"  # stderr
@@ -9,3 +12,22 @@ keepalive = 5
 threads = 10
 workers = 3
 worker_class = "app.app.CustomUvicornWorker"
+
+# the workers write their metrics to this directory and /metrics aggregates them,
+# it must be set before prometheus_client is imported by a worker
+os.environ.setdefault(
+    "PROMETHEUS_MULTIPROC_DIR", os.path.join(worker_tmp_dir, "beacons-metrics")
+)
+
+
+def on_starting(server):
+    # clear the metrics of the workers of a previous run
+    metrics_dir = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
@@ -3,9 +3,10 @@ from fastapi.routing import APIRouter
 from starlette import status
 from starlette.responses import JSONResponse
 
-from app.config import get_base_service_url, get_services
-from app.health.schema import HealthResponse, HealthStatus
-from app.utils import get_final_service_url, send_async_requests
+from app.config import get_service_url, get_services
+from app.health.schema import HealthResponse, HealthStatus, HealthStatusEnum
+from app.utils import send_async_requests
+from app.version import __version__
 
 health_route = APIRouter()
 
@@ -56,16 +57,29 @@ async def health_check():
     services = get_services(service_type="health")
     calls = []
     for service in services:
-        base_url = get_base_service_url(service["provider"])
-        final_url = get_final_service_url(base_url, service["accessPoint"])
+        final_url = get_service_url(service)
 
         calls.append(final_url)
 
-    result = await send_async_requests(calls)
+    result = await send_async_requests(
+        calls, providers=[x["provider"] for x in services]
+    )
     final_result = []
 
     failed = False
-    for beacons_response in result:
+    for service, beacons_response in zip(services, result):
+        if beacons_response is None:
+            # The beacon timed out, errored or its circuit is open
+            failed = True
+            final_result.append(
+                HealthStatus(
+                    status=HealthStatusEnum.FAIL,
+                    service_id=service["provider"],
+                    beacons_api_version=__version__,
+                    output="Service is unreachable!",
+                )
+            )
+            continue
         if beacons_response.status_code != status.HTTP_200_OK:
             # If any service returns a non-200 status, we consider the
             # overall health check as failed
@@ -0,0 +1,141 @@
+import math
+import os
+from collections import deque
+from typing import Deque, Dict, List, Optional
+
+from prometheus_client import Counter, Histogram
+
+from app.config import get_provider
+
+LATENCY_WINDOW = int(os.getenv("LATENCY_WINDOW", 200))
+LATENCY_MIN_SAMPLES = int(os.getenv("LATENCY_MIN_SAMPLES", 20))
+MIN_REQUEST_TIMEOUT = float(os.getenv("MIN_REQUEST_TIMEOUT", 1))
+MAX_REQUEST_TIMEOUT = float(os.getenv("MAX_REQUEST_TIMEOUT", 10))
+REQUEST_TIMEOUT_MARGIN = float(os.getenv("REQUEST_TIMEOUT_MARGIN", 1))
+HEDGE_BUDGET = float(os.getenv("HEDGE_BUDGET", 0.05))
+HEDGE_BURST = float(os.getenv("HEDGE_BURST", 10))
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", 95))
+
+REQUEST_DURATION = Histogram(
+    "beacons_request_duration_seconds",
+    "Duration of the requests made to the beacons.",
+    ["provider"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 3, 5, 7.5, 10),
+)
+HEDGED_REQUESTS = Counter(
+    "beacons_hedged_requests",
+    "Hedged requests sent to the beacons, by the attempt which answered first.",
+    ["provider", "winner"],
+)
+
+
+class LatencyTracker:
+    """LatencyTracker class keeps a rolling window of latencies for each provider
+    and derives the provider's request timeout from it.
+    """
+
+    samples: Dict[str, Deque[float]] = {}
+    # sorted copy of the samples, rebuilt lazily after a new sample is recorded
+    sorted_samples: Dict[str, List[float]] = {}
+
+    @classmethod
+    def record(cls, provider: str, seconds: float) -> None:
+        if provider not in cls.samples:
+            cls.samples[provider] = deque(maxlen=LATENCY_WINDOW)
+        cls.samples[provider].append(seconds)
+        cls.sorted_samples.pop(provider, None)
+        REQUEST_DURATION.labels(provider=provider).observe(seconds)
+
+    @classmethod
+    def percentile(cls, provider: str, q: float) -> Optional[float]:
+        """Returns the q-th percentile latency of a provider.
+
+        Args:
+            provider (str): A provider id.
+            q (float): Percentile in the range of (0, 100].
+
+        Returns:
+            float: Latency in seconds, None until LATENCY_MIN_SAMPLES are recorded.
+        """
+        samples = cls.samples.get(provider)
+        if not samples or len(samples) < LATENCY_MIN_SAMPLES:
+            return None
+
+        if provider not in cls.sorted_samples:
+            cls.sorted_samples[provider] = sorted(samples)
+        ordered = cls.sorted_samples[provider]
+
+        return ordered[math.ceil(q / 100 * len(ordered)) - 1]
+
+    @classmethod
+    def get_timeout(cls, provider: str, default: float) -> float:
+        """Returns the request timeout of a provider.
+
+        A static timeout in the registry takes precedence. Otherwise the timeout
+        is the p99 latency plus REQUEST_TIMEOUT_MARGIN, bounded by
+        MIN_REQUEST_TIMEOUT and MAX_REQUEST_TIMEOUT.
+
+        Args:
+            provider (str): A provider id.
+            default (float): Timeout used until enough latencies are recorded.
+
+        Returns:
+            float: Timeout in seconds.
+        """
+        provider_config = get_provider(provider)
+        if provider_config and provider_config.get("timeout"):
+            return float(provider_config["timeout"])
+
+        p99 = cls.percentile(provider, 99)
+        if p99 is None:
+            return default
+
+        return min(
+            max(p99 + REQUEST_TIMEOUT_MARGIN, MIN_REQUEST_TIMEOUT), MAX_REQUEST_TIMEOUT
+        )
+
+    @classmethod
+    def clear(cls) -> None:
+        cls.samples = {}
+        cls.sorted_samples = {}
+
+
+class HedgeBudget:
+    """HedgeBudget class limits hedged requests to a fraction of all the requests
+    made to the beacons, HEDGE_BUDGET.
+
+    It is a token bucket: every request adds HEDGE_BUDGET tokens, up to
+    HEDGE_BURST, and every hedged request takes one. The cap stops a long healthy
+    period from saving up hedges for a burst on a slowing provider.
+    """
+
+    tokens: float = 0
+
+    @classmethod
+    def record_request(cls) -> None:
+        cls.tokens = min(cls.tokens + HEDGE_BUDGET, HEDGE_BURST)
+
+    @classmethod
+    def acquire(cls) -> bool:
+        """Returns if a hedged request can be sent, and takes a token if so."""
+        if cls.tokens < 1:
+            return False
+        cls.tokens -= 1
+        return True
+
+
+def get_hedge_delay(provider: str) -> Optional[float]:
+    """Returns after how many seconds a request to the provider should be hedged.
+
+    Args:
+        provider (str): A provider id.
+
+    Returns:
+        float: The provider's HEDGE_PERCENTILE latency, None if the provider is not
+        configured with hedge in the registry or has too few latencies recorded.
+    """
+    provider_config = get_provider(provider)
+    if not provider_config or not provider_config.get("hedge"):
+        return None
+
+    return LatencyTracker.percentile(provider, HEDGE_PERCENTILE)
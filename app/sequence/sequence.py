@@ -2,9 +2,10 @@ from typing import List, Optional
 
 import pydantic
 from celery.result import AsyncResult
+from fastapi import Depends
 from fastapi.params import Query
 from fastapi.routing import APIRouter
-from starlette.responses import JSONResponse
+from starlette.responses import JSONResponse, Response
 from starlette.status import (
     HTTP_200_OK,
     HTTP_202_ACCEPTED,
@@ -13,7 +14,7 @@ from starlette.status import (
 )
 
 from app import logger
-from app.config import get_base_service_url, get_services
+from app.config import get_service_url, get_services
 from app.constants import (
     JOB_FAILED_ERROR_MESSAGE,
     JOB_SUBMISSION_ERROR_MESSAGE,
@@ -41,7 +42,11 @@ from app.sequence.schema import (
     SequenceOverview,
     SequenceSummary,
 )
-from app.utils import get_final_service_url, send_async_requests
+from app.utils import (
+    Deadline,
+    get_deadline,
+    send_async_requests,
+)
 from worker.cache.utils import (
     clear_celery_task_id,
     clear_jobdispatcher_id,
@@ -175,16 +180,20 @@ async def sequence_summary_api(
     type: Optional[SequenceIdType] = Query(
         SequenceIdType.SEQUENCE, description="Type of the identifier"
     ),
+    response: Response = None,
+    deadline: Deadline = Depends(get_deadline),
 ):
     """
     Retrieve a summary of experimentally determined and predicted structure "
     "models available for a sequence.
     """
-    result = await fetch_sequence_summary(id, type)
+    result = await fetch_sequence_summary(id, type, deadline=deadline)
+    response.headers.update(deadline.headers())
     if result is None:
         return JSONResponse(
             status_code=HTTP_404_NOT_FOUND,
             content={},
+            headers=deadline.headers(),
         )
     return result
 
@@ -192,18 +201,18 @@ async def sequence_summary_api(
 async def fetch_sequence_summary(
     id: str,
     type: Optional[SequenceIdType] = SequenceIdType.SEQUENCE,
+    deadline: Optional[Deadline] = None,
 ) -> Optional[SequenceSummary]:
     services = get_services(service_type="sequence")
     calls = []
     for service in services:
-        base_url = get_base_service_url(service["provider"])
-        final_url = get_final_service_url(
-            base_url, service["accessPoint"], f"?id={id}&type={type.value}"
-        )
+        final_url = get_service_url(service, f"?id={id}&type={type.value}")
         calls.append(final_url)
     print(calls)
 
-    result = await send_async_requests(calls)
+    result = await send_async_requests(
+        calls, providers=[x["provider"] for x in services], deadline=deadline
+    )
     final_result = []
 
     for x in result:
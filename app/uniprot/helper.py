@@ -1,62 +1,306 @@
 import asyncio
-from typing import Dict, List
+import bisect
+from collections import OrderedDict
+from datetime import date
+import heapq
+import itertools
+import time
+import types
+from typing import (
+    Any,
+    AsyncGenerator,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Type,
+    TypeVar,
+    Union,
+    get_args,
+    get_origin,
+)
 
 import pydantic
+from pydantic import BaseModel, RootModel
 from starlette import status
-from starlette.responses import JSONResponse
 
 from app import logger
-from app.config import MAX_POST_LIMIT, UNIPROT_API, get_base_service_url, get_services
+from app.bulkhead import BATCH_BULKHEAD, Bulkhead
+from app.config import (
+    BATCH_CHUNK_SIZE,
+    BATCH_CONCURRENCY,
+    BATCH_MAX_STRUCTURES,
+    BEACON_CACHE_TTL,
+    SUMMARY_CACHE_TTL,
+    SUMMARY_INDEX_CACHE_SIZE,
+    UNIPROT_API,
+    get_provider_rank,
+    get_service_url,
+    get_services,
+)
 from app.constants import TEMPLATE_DESC, UNIPROT_QUAL_DESC, UNP_CHECKSUM_DESC
 from app.uniprot.schema import (
     AccessionListRequest,
+    Chains,
+    ConfidenceType,
+    Detailed,
+    ModelCategory,
     Overview,
+    Residue,
+    Segment,
+    SummaryItems,
+    SummarySort,
     UniprotEntry,
     UniprotSummary,
 )
-from app.utils import clean_args, get_final_service_url, send_async_requests
+from app.utils import (
+    BATCH_REQUEST_DEADLINE,
+    Deadline,
+    clean_args,
+    dump_json,
+    get_cache_key,
+    get_type_adapter,
+    send_async_requests,
+)
+from worker.cache.utils import get_cached_responses, set_cached_response
 from worker.helper import get_nested_value_from_json
 
+StructureT = TypeVar("StructureT", Overview, Detailed)
+T = TypeVar("T")
 
-async def get_list_of_uniprot_summary_helper(list_request: AccessionListRequest):
+
+async def get_list_of_uniprot_summary_helper(
+    list_request: AccessionListRequest, deadline: Optional[Deadline] = None
+):
     """Returns summary of experimental and theoretical models for a list of UniProt
     accessions
 
     Args:
         list_request (AccessionListRequest): List of UniProt accession objects
+        deadline (Deadline, optional): Latency budget shared by all accessions
 
     Returns:
         Result: A list of Result summary object with experimental and theoretical
-        models for UniProt accessions.
-    """
-    if len(list_request.accessions) > int(MAX_POST_LIMIT):
-        return JSONResponse(
-            content={
-                "message": f"We cannot accept more than {MAX_POST_LIMIT} accessions!"
-            },
-            status_code=status.HTTP_400_BAD_REQUEST,
+        models for UniProt accessions, in the order of the request.
+    """
+    if deadline is None:
+        deadline = Deadline(BATCH_REQUEST_DEADLINE)
+
+    accessions = get_distinct_accessions(list_request.accessions)
+    summaries: Dict[str, Optional[UniprotSummary]] = {}
+    structures = 0
+    batch = iter_uniprot_summaries(list_request, deadline)
+
+    try:
+        async for accession, summary in batch:
+            summaries[accession] = summary
+            structures += len(summary.structures or []) if summary else 0
+            if structures > BATCH_MAX_STRUCTURES:
+                # the summaries are held until the response is sent
+                logger.warning(
+                    f"Batch of {len(accessions)} accessions stopped at "
+                    f"{BATCH_MAX_STRUCTURES} structures"
+                )
+                summaries.pop(accession)
+                deadline.skipped.extend(x for x in accessions if x not in summaries)
+                break
+    finally:
+        await batch.aclose()
+
+    results = [summaries[x] for x in accessions if summaries.get(x)]
+    if not results:
+        return None
+
+    return [prepare_list_summary(x, list_request) for x in results]
+
+
+def prepare_list_summary(
+    summary: UniprotSummary, list_request: AccessionListRequest
+) -> UniprotSummary:
+    """Applies the dedupe and ranking options of a batch to a summary.
+
+    Args:
+        summary (UniprotSummary): The summary of an accession of the batch
+        list_request (AccessionListRequest): List of UniProt accession objects
+
+    Returns:
+        UniprotSummary: The summary to return.
+    """
+    if list_request.dedupe:
+        summary = UniprotSummary.model_construct(
+            uniprot_entry=summary.uniprot_entry,
+            structures=dedupe_structures(summary.structures or []),
         )
 
-    summary_jobs = [
-        asyncio.create_task(
-            get_uniprot_summary_helper(
-                q,
-                list_request.provider,
-                template=None,
-                res_range=None,
-                exclude_provider=list_request.exclude_provider,
-                uniprot_checksum=None,
-            )
+    if list_request.sort or list_request.limit or list_request.offset:
+        summary = rank_structures(
+            summary, list_request.sort, list_request.limit, list_request.offset
         )
-        for q in list_request.accessions
-    ]
 
-    results = await asyncio.gather(*summary_jobs)
+    return summary
+
+
+def get_distinct_accessions(accessions: List[str]) -> List[str]:
+    """Returns the accessions of a batch in upper case, without repeats, in the
+    order of the request."""
+    return list(dict.fromkeys(x.strip().upper() for x in accessions if x.strip()))
+
+
+def get_summary_cache_key(
+    qualifier: str, provider=None, exclude_provider=None, uniprot_checksum=None
+) -> str:
+    """Returns the cache key of the full summary of an accession."""
+    return get_cache_key(
+        "uniprot-summary",
+        qualifier,
+        provider=provider,
+        exclude_provider=exclude_provider,
+        uniprot_checksum=uniprot_checksum,
+    )
+
+
+async def iter_batch(
+    accessions: List[str],
+    get_key: Callable[[str], str],
+    read_cached: Callable[[str, Any], Optional[T]],
+    fetch: Callable[[str, str], Awaitable[Optional[T]]],
+    deadline: Deadline,
+) -> AsyncGenerator[Tuple[str, Optional[T]], None]:
+    """Yields the result of every accession of a batch as soon as it is ready.
+
+    The accessions are read from the cache BATCH_CHUNK_SIZE at a time, with a
+    single round trip to Redis per chunk, and the cached results are yielded
+    right away. The others are fetched while the next chunks are read,
+    BATCH_CONCURRENCY accessions at a time; the slot of an accession is only
+    freed once its result is handed over, so a slow consumer holds at most
+    BATCH_CONCURRENCY results. Accessions still waiting when the deadline runs
+    out are recorded in deadline.skipped.
+
+    Args:
+        accessions (List[str]): Distinct accessions
+        get_key (Callable): Returns the cache key of an accession
+        read_cached (Callable): Returns the result of a key from its cached
+            response, None on a miss
+        fetch (Callable): Returns the result of an accession and its key, and
+            caches it
+        deadline (Deadline): Latency budget of the batch
+
+    Yields:
+        Tuple: An accession and its result, None if there is none.
+    """
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+    fetched: asyncio.Queue = asyncio.Queue()
+
+    async def fetch_accession(accession: str, key: str):
+        await semaphore.acquire()
+        result = None
+        try:
+            if not deadline.remaining():
+                deadline.skipped.append(accession)
+            else:
+                result = await fetch(accession, key)
+        except Exception:
+            logger.error(f"Error while getting {accession}", exc_info=True)
+        finally:
+            fetched.put_nowait((accession, result))
+
+    tasks: List[asyncio.Task] = []
+    received = 0
+
+    try:
+        for start in range(0, len(accessions), BATCH_CHUNK_SIZE):
+            chunk = accessions[start : start + BATCH_CHUNK_SIZE]
+            keys = [get_key(x) for x in chunk]
 
-    if not results or all([x is None for x in results]):
+            for accession, key, cached in zip(chunk, keys, get_cached_responses(keys)):
+                result = read_cached(key, cached)
+                if result is not None:
+                    yield accession, result
+                else:
+                    tasks.append(asyncio.create_task(fetch_accession(accession, key)))
+
+            # let the fetches start, then hand over the results fetched already
+            await asyncio.sleep(0)
+            while not fetched.empty():
+                received += 1
+                item = fetched.get_nowait()
+                semaphore.release()
+                yield item
+
+        while received < len(tasks):
+            received += 1
+            item = await fetched.get()
+            semaphore.release()
+            yield item
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def iter_uniprot_summaries(
+    list_request: AccessionListRequest, deadline: Deadline
+) -> AsyncGenerator[Tuple[str, Optional[UniprotSummary]], None]:
+    """Yields the summary of every accession of a batch as soon as it is ready.
+
+    The summaries are read from the worker and response caches first, the others
+    are requested from the beacons and cached, see iter_batch.
+
+    Args:
+        list_request (AccessionListRequest): List of UniProt accession objects
+        deadline (Deadline): Latency budget of the batch
+
+    Yields:
+        Tuple: An accession and its summary, None if it has no model.
+    """
+    provider, exclude_provider = list_request.provider, list_request.exclude_provider
+    adapter = get_type_adapter(UniprotSummary)
+
+    def get_key(accession: str) -> str:
+        return get_summary_cache_key(accession, provider, exclude_provider)
+
+    def read_cached(key: str, cached: Any) -> Optional[UniprotSummary]:
+        index = SummaryIndexCache.get(key)
+        # the cached summary is shared by the worker, it is never edited in place
+        if index is not None:
+            return index.summary
+        if isinstance(cached, bytes):
+            return adapter.validate_json(cached)
         return None
 
-    return [x for x in results if x]
+    async def fetch(accession: str, key: str) -> Optional[UniprotSummary]:
+        accession_deadline = deadline.split()
+        summary = await get_uniprot_summary_helper(
+            accession,
+            provider,
+            None,
+            None,
+            exclude_provider,
+            None,
+            deadline=accession_deadline,
+            bulkhead=BATCH_BULKHEAD,
+        )
+        deadline.incomplete.extend(accession_deadline.incomplete)
+        # only the summaries every provider answered for are cached
+        if summary and not accession_deadline.incomplete:
+            content = dump_json(summary, UniprotSummary, exclude_unset=True)
+            set_cached_response(key, content, SUMMARY_CACHE_TTL)
+        return summary
+
+    batch = iter_batch(
+        get_distinct_accessions(list_request.accessions),
+        get_key,
+        read_cached,
+        fetch,
+        deadline,
+    )
+    try:
+        async for item in batch:
+            yield item
+    finally:
+        await batch.aclose()
 
 
 @clean_args()
@@ -67,6 +311,8 @@ async def get_uniprot_summary_helper(
     res_range=None,
     exclude_provider=None,
     uniprot_checksum=None,
+    deadline: Optional[Deadline] = None,
+    bulkhead: Optional[Bulkhead] = None,
 ):
     f"""Helper function to get uniprot summary.
 
@@ -77,6 +323,9 @@ async def get_uniprot_summary_helper(
         res_range (str, optional): Residue range
         exclude_provider (str, optional): Provider to exclude
         uniprot_checksum (str, optional): {UNP_CHECKSUM_DESC}
+        deadline (Deadline, optional): Latency budget for the beacon requests
+        bulkhead (Bulkhead, optional): Bulkhead for the beacon requests, defaults
+            to the interactive one
 
     Returns:
         Result: A Result summary object with experimental and theoretical models.
@@ -87,17 +336,16 @@ async def get_uniprot_summary_helper(
     )
     calls = []
     for service in services:
-        base_url = get_base_service_url(service["provider"])
-        final_url = get_final_service_url(
-            base_url, service["accessPoint"], f"{qualifier}.json"
-        )
-
-        if res_range:
-            final_url = f"{final_url}&range={res_range}"
-
-        calls.append(final_url)
+        # the full summary is requested, range and template are applied below
+        calls.append(get_service_url(service, f"{qualifier}.json"))
 
-    result = await send_async_requests(calls)
+    result = await send_async_requests(
+        calls,
+        providers=[x["provider"] for x in services],
+        cache_ttl=BEACON_CACHE_TTL,
+        deadline=deadline,
+        bulkhead=bulkhead,
+    )
     final_result = []
 
     for x in result:
@@ -117,16 +365,16 @@ async def get_uniprot_summary_helper(
         return None
 
     final_structures: List[Overview] = []
-    uniprot_entry: UniprotEntry = UniprotEntry(
-        **get_first_entry_with_checksum(final_result)
+    uniprot_entry: UniprotEntry = get_type_adapter(UniprotEntry).validate_python(
+        get_first_entry_with_checksum(final_result)
     )
+    overview_adapter = get_type_adapter(Overview)
 
     for item in final_result:
         # Remove erroneous responses
         for structure in item["structures"]:
             try:
-                Overview(**structure)
-                final_structures.append(structure)
+                final_structures.append(overview_adapter.validate_python(structure))
             except pydantic.ValidationError:
                 provider = structure.get("provider")
                 if provider:
@@ -139,12 +387,648 @@ async def get_uniprot_summary_helper(
     if not final_structures:
         return None
 
-    api_result: UniprotSummary = UniprotSummary(
-        **{"uniprot_entry": uniprot_entry, "structures": final_structures}
+    # the structures are validated already, don't validate them again
+    api_result: UniprotSummary = UniprotSummary.model_construct(
+        uniprot_entry=uniprot_entry, structures=final_structures
     )
+
+    if res_range or template:
+        return SummaryIndex(api_result).search(res_range, template)
+
     return api_result
 
 
+class SummaryIndex:
+    """Index over the structures of a full summary, answering range and template
+    queries without requesting the beacons again.
+
+    Structures are sorted on uniprot_start, so the ones starting before the end
+    of a range are found with a binary search and only their end is compared.
+    """
+
+    def __init__(self, summary: UniprotSummary):
+        self.summary = summary
+        structures = summary.structures or []
+
+        self.order: List[int] = sorted(
+            range(len(structures)),
+            key=lambda i: structures[i].summary.uniprot_start,
+        )
+        self.starts: List[int] = [
+            structures[i].summary.uniprot_start for i in self.order
+        ]
+        self.ends: List[int] = [structures[i].summary.uniprot_end for i in self.order]
+        self.identifiers: List[str] = [
+            x.summary.model_identifier.lower() for x in structures
+        ]
+
+    def search(
+        self, res_range: Optional[str] = None, template: Optional[str] = None
+    ) -> Optional[UniprotSummary]:
+        """Returns the summary of the structures matching a range and a template.
+
+        Args:
+            res_range (str, optional): Residue range, structures overlapping it
+                are returned
+            template (str, optional): PDB code or SMTL template of the models
+
+        Returns:
+            UniprotSummary: The summary, None if no structure matches.
+        """
+        structures = self.summary.structures or []
+        indices: Sequence[int] = range(len(structures))
+
+        if res_range:
+            start, end = parse_residue_range(res_range)
+            last = bisect.bisect_right(self.starts, end)
+            # keep the order of the structures in the full summary
+            indices = sorted(
+                self.order[i] for i in range(last) if self.ends[i] >= start
+            )
+
+        if template:
+            indices = [
+                i for i in indices if matches_template(self.identifiers[i], template)
+            ]
+
+        if not indices:
+            return None
+
+        return UniprotSummary.model_construct(
+            uniprot_entry=self.summary.uniprot_entry,
+            structures=[structures[i] for i in indices],
+        )
+
+
+class SummaryIndexCache:
+    """SummaryIndexCache class keeps the indexes of the most recently requested
+    summaries of a worker process"""
+
+    indexes: "OrderedDict[str, Tuple[float, SummaryIndex]]" = OrderedDict()
+
+    @classmethod
+    def get(cls, key: str) -> Optional[SummaryIndex]:
+        item = cls.indexes.get(key)
+        if item is None:
+            return None
+
+        expires_at, index = item
+        if expires_at < time.monotonic():
+            del cls.indexes[key]
+            return None
+
+        cls.indexes.move_to_end(key)
+        return index
+
+    @classmethod
+    def set(cls, key: str, index: SummaryIndex, ttl: int) -> None:
+        if ttl <= 0 or SUMMARY_INDEX_CACHE_SIZE <= 0:
+            return
+
+        cls.indexes[key] = (time.monotonic() + ttl, index)
+        cls.indexes.move_to_end(key)
+        while len(cls.indexes) > SUMMARY_INDEX_CACHE_SIZE:
+            cls.indexes.popitem(last=False)
+
+    @classmethod
+    def clear(cls) -> None:
+        cls.indexes.clear()
+
+
+# structures with the smallest key are ranked first
+SORT_DIRECTIONS = {
+    SummarySort.COVERAGE: -1,
+    SummarySort.RESOLUTION: 1,
+    SummarySort.SEQUENCE_IDENTITY: -1,
+    SummarySort.CREATED: -1,
+    SummarySort.CONFIDENCE_AVG_LOCAL_SCORE: -1,
+}
+
+
+def get_sort_key(sort: SummarySort) -> Callable[[Overview], Tuple[bool, float]]:
+    """Returns the key ranking structures on a summary field, the structures
+    without a value last.
+
+    Args:
+        sort (SummarySort): Field to rank on
+
+    Returns:
+        Callable: The key function.
+    """
+    direction = SORT_DIRECTIONS[sort]
+
+    def sort_key(structure: Overview) -> Tuple[bool, float]:
+        value = getattr(structure.summary, sort.value)
+        if sort == SummarySort.CREATED and value is not None:
+            try:
+                value = date.fromisoformat(value[:10]).toordinal()
+            except ValueError:
+                value = None
+
+        if value is None:
+            return True, 0
+        return False, direction * value
+
+    return sort_key
+
+
+def rank_structures(
+    summary: UniprotSummary,
+    sort: Optional[SummarySort] = None,
+    limit: Optional[int] = None,
+    offset: int = 0,
+) -> UniprotSummary:
+    """Returns a page of the structures of a summary, ranked on a field.
+
+    When a limit is given, only the top offset + limit structures are ranked,
+    using a heap.
+
+    Args:
+        summary (UniprotSummary): A summary
+        sort (SummarySort, optional): Field to rank on, the structures keep their
+            order if not given
+        limit (int, optional): Maximum number of structures returned
+        offset (int, optional): Number of structures skipped
+
+    Returns:
+        UniprotSummary: The summary with the page of structures.
+    """
+    structures = summary.structures or []
+    end = offset + limit if limit else None
+
+    if sort:
+        sort_key = get_sort_key(sort)
+        if end is not None and end < len(structures):
+            structures = heapq.nsmallest(end, structures, key=sort_key)
+        else:
+            structures = sorted(structures, key=sort_key)
+
+    return UniprotSummary.model_construct(
+        uniprot_entry=summary.uniprot_entry, structures=structures[offset:end]
+    )
+
+
+def matches_template(model_identifier: str, template: str) -> bool:
+    """Checks if a model identifier is a template, a PDB code matching all its
+    assemblies and chains, e.g. 1t29 matches 1t29.1.A.
+
+    Args:
+        model_identifier (str): Model identifier, in lower case
+        template (str): PDB code or SMTL template
+
+    Returns:
+        bool: True if the model matches the template.
+    """
+    template = template.lower()
+    if model_identifier == template:
+        return True
+
+    return model_identifier.startswith(template) and model_identifier[
+        len(template)
+    ] in (".", "_")
+
+
+def dedupe_structures(structures: List[StructureT]) -> List[StructureT]:
+    """Merges the structures returned by several providers for the same model.
+
+    Structures are the same model when they share a model identifier, compared
+    case-insensitively, or a model URL. A single copy is kept, from the provider
+    ranked first by get_provider_rank, at the position of the first copy.
+
+    Args:
+        structures (List): Structures of a summary or details response
+
+    Returns:
+        List: The structures without duplicates.
+    """
+    # position in kept of the copy of each model identifier and model URL
+    positions: Dict[Tuple[str, str], int] = {}
+    kept: List[StructureT] = []
+
+    for structure in structures:
+        summary = structure.summary
+        keys = [("model_identifier", summary.model_identifier.lower())]
+        if summary.model_url:
+            keys.append(("model_url", summary.model_url))
+
+        position = next((positions[x] for x in keys if x in positions), None)
+        if position is None:
+            position = len(kept)
+            kept.append(structure)
+        elif get_provider_rank(summary.provider) < get_provider_rank(
+            kept[position].summary.provider
+        ):
+            kept[position] = structure
+
+        for key in keys:
+            positions.setdefault(key, position)
+
+    return kept
+
+
+def get_sequence_length(summary: UniprotSummary) -> int:
+    """Returns the length of the UniProt sequence of a summary, the last residue
+    covered by its models if the entry doesn't tell.
+
+    Args:
+        summary (UniprotSummary): A summary
+
+    Returns:
+        int: The sequence length.
+    """
+    entry = summary.uniprot_entry
+    if entry is not None and entry.sequence_length:
+        return entry.sequence_length
+
+    return max((x.summary.uniprot_end for x in summary.structures or []), default=0)
+
+
+def get_residue_coverage(
+    structures: List[Overview], sequence_length: int
+) -> Dict[str, List[int]]:
+    """Returns the number of models covering each residue, by model category.
+
+    Every model adds 1 at its first residue and removes 1 after its last residue
+    of a difference array, whose running sum is the coverage, in O(n + L) for n
+    models and a sequence of length L.
+
+    Args:
+        structures (List[Overview]): Structures of a summary
+        sequence_length (int): Length of the UniProt sequence, models are clipped
+            to it
+
+    Returns:
+        Dict[str, List[int]]: The coverage of residues 1 to sequence_length, for
+        each model category.
+    """
+    differences = {x.value: [0] * (sequence_length + 1) for x in ModelCategory}
+
+    for structure in structures:
+        summary = structure.summary
+        start = max(summary.uniprot_start, 1)
+        end = min(summary.uniprot_end, sequence_length)
+        if start > end:
+            continue
+
+        difference = differences[summary.model_category.value]
+        difference[start - 1] += 1
+        difference[end] -= 1
+
+    return {
+        k: list(itertools.accumulate(itertools.islice(v, sequence_length)))
+        for k, v in differences.items()
+    }
+
+
+# resolution, in Angstrom, up to which experimental models are not penalised
+COVER_RESOLUTION = 2.0
+
+
+def get_model_quality(summary: SummaryItems) -> float:
+    """Returns the quality of a model, in the range of [0,1], used to choose
+    between models covering the same residues.
+
+    The quality is the sequence identity, scaled by COVER_RESOLUTION over the
+    resolution of the model and by its average confidence, when known.
+
+    Args:
+        summary (SummaryItems): Summary of a model
+
+    Returns:
+        float: The quality, higher is better.
+    """
+    quality = summary.sequence_identity
+
+    if summary.resolution:
+        quality *= min(1.0, COVER_RESOLUTION / summary.resolution)
+
+    confidence = summary.confidence_avg_local_score
+    if confidence is not None:
+        if summary.confidence_type == ConfidenceType.pLDDT:
+            confidence /= 100
+        quality *= min(1.0, max(0.0, confidence))
+
+    return quality
+
+
+def select_covering_set(
+    structures: List[Overview], sequence_length: int
+) -> Tuple[List[Overview], List[Tuple[int, int]]]:
+    """Selects the fewest models covering all the residues covered by any model.
+
+    The residues are swept from the first one: of the models starting at or before
+    the first residue left uncovered, the one reaching the furthest is selected,
+    which gives the smallest set, and the best quality model among those
+    reaching as far. O(n log n) for n models.
+
+    Args:
+        structures (List[Overview]): Structures of a summary
+        sequence_length (int): Length of the UniProt sequence, models are clipped
+            to it
+
+    Returns:
+        Tuple: The selected structures, in the order of their first residue, and
+        the (start, end) ranges of residues not covered by any model.
+    """
+    candidates = []
+    for structure in structures:
+        summary = structure.summary
+        start = max(summary.uniprot_start, 1)
+        end = min(summary.uniprot_end, sequence_length)
+        if start <= end:
+            candidates.append((start, end, get_model_quality(summary), structure))
+    candidates.sort(key=lambda x: x[0])
+
+    selected: List[Overview] = []
+    gaps: List[Tuple[int, int]] = []
+    position, i = 1, 0
+
+    while position <= sequence_length:
+        best = None
+        while i < len(candidates) and candidates[i][0] <= position:
+            candidate = candidates[i]
+            if candidate[1] >= position and (
+                best is None or candidate[1:3] > best[1:3]
+            ):
+                best = candidate
+            i += 1
+
+        if best is None:
+            # no model covers the residue, skip to the next model
+            next_start = candidates[i][0] if i < len(candidates) else None
+            gap_end = next_start - 1 if next_start is not None else sequence_length
+            gaps.append((position, gap_end))
+            position = gap_end + 1
+            continue
+
+        selected.append(best[3])
+        position = best[1] + 1
+
+    return selected, gaps
+
+
+def parse_residue_range(res_range: Optional[str]) -> Optional[Tuple[int, int]]:
+    """Returns the first and the last residue of a range such as 10-200.
+
+    Args:
+        res_range (str, optional): Residue range
+
+    Returns:
+        Tuple[int, int]: The first and last UniProt residue, None if there is no
+        range.
+    """
+    if not res_range:
+        return None
+
+    start, end = res_range.split("-")
+    return int(start), int(end)
+
+
+def get_uniprot_residue_number(residue: Residue) -> int:
+    return residue.uniprot_residue_number
+
+
+def slice_alignment(segment: Segment, start: int, end: int) -> Dict[str, Any]:
+    """Trims the aligned sequences of a segment to a UniProt range.
+
+    The UniProt sequence is cut at the alignment columns of the first and last
+    residues of the range, skipping the gaps. The model sequence is cut at the
+    same columns when it is aligned with it, i.e. has the same length.
+
+    Args:
+        segment (Segment): A segment overlapping the range
+        start (int): First UniProt residue of the range
+        end (int): Last UniProt residue of the range
+
+    Returns:
+        Dict: The uniprot and seqres fields of the trimmed segment.
+    """
+    uniprot, seqres = segment.uniprot, segment.seqres
+    first, last = max(start, uniprot.from_), min(end, uniprot.to)
+
+    columns = [i for i, x in enumerate(uniprot.aligned_sequence) if x != "-"]
+    if not columns:
+        return {}
+    first_column = columns[min(first - uniprot.from_, len(columns) - 1)]
+    last_column = columns[min(last - uniprot.from_, len(columns) - 1)] + 1
+
+    update: Dict[str, Any] = {
+        "uniprot": uniprot.model_copy(
+            update={
+                "aligned_sequence": uniprot.aligned_sequence[first_column:last_column],
+                "from_": first,
+                "to": last,
+            }
+        )
+    }
+
+    if len(seqres.aligned_sequence) == len(uniprot.aligned_sequence):
+        aligned_sequence = seqres.aligned_sequence[first_column:last_column]
+        seqres_from = seqres.from_ + sum(
+            x != "-" for x in seqres.aligned_sequence[:first_column]
+        )
+        update["seqres"] = seqres.model_copy(
+            update={
+                "aligned_sequence": aligned_sequence,
+                "from_": seqres_from,
+                "to": seqres_from + sum(x != "-" for x in aligned_sequence) - 1,
+            }
+        )
+
+    return update
+
+
+def slice_segment(segment: Segment, start: int, end: int) -> Optional[Segment]:
+    """Trims the residues and the aligned sequences of a segment to a UniProt
+    range.
+
+    Residues are listed in the order of the UniProt sequence, so the range is
+    found with a binary search.
+
+    Args:
+        segment (Segment): A segment
+        start (int): First UniProt residue of the range
+        end (int): Last UniProt residue of the range
+
+    Returns:
+        Segment: The segment with the residues in the range, None if the segment
+        does not overlap the range.
+    """
+    if segment.uniprot.to < start or segment.uniprot.from_ > end:
+        return None
+
+    if segment.uniprot.from_ >= start and segment.uniprot.to <= end:
+        return segment
+
+    residues = segment.residues
+    first = bisect.bisect_left(residues, start, key=get_uniprot_residue_number)
+    last = bisect.bisect_right(residues, end, lo=first, key=get_uniprot_residue_number)
+
+    return segment.model_copy(
+        update={
+            "residues": residues[first:last],
+            **slice_alignment(segment, start, end),
+        }
+    )
+
+
+def slice_structures(structures: List[Detailed], res_range: str) -> List[Detailed]:
+    """Trims structures to a UniProt residue range.
+
+    Segments outside the range are dropped, as are the chains without any
+    segment in the range and the structures left without any chain.
+
+    Args:
+        structures (List[Detailed]): Validated structures
+        res_range (str): Residue range
+
+    Returns:
+        List[Detailed]: The structures overlapping the range.
+    """
+    start, end = parse_residue_range(res_range)
+    sliced_structures = []
+
+    for structure in structures:
+        chains = []
+        for chain in structure.chains.root:
+            segments = [slice_segment(x, start, end) for x in chain.segments or []]
+            segments = [x for x in segments if x is not None]
+            if segments:
+                chains.append(chain.model_copy(update={"segments": segments}))
+
+        if chains:
+            sliced_structures.append(
+                structure.model_copy(
+                    update={"chains": Chains.model_construct(root=chains)}
+                )
+            )
+
+    return sliced_structures
+
+
+def get_field_type(
+    model: Type[BaseModel], name: str
+) -> Tuple[bool, Optional[Type[BaseModel]]]:
+    """Returns the model held by a field, looking through lists and root models.
+
+    Args:
+        model (Type[BaseModel]): A model
+        name (str): Name of a field of the model
+
+    Returns:
+        Tuple[bool, Type[BaseModel]]: If the field is a list, and the model it holds,
+        None if it holds a scalar.
+    """
+    annotation = model.model_fields[name].annotation
+    is_list = False
+
+    while True:
+        if get_origin(annotation) in (Union, types.UnionType):
+            annotation = next(x for x in get_args(annotation) if x is not type(None))
+        elif get_origin(annotation) is list:
+            is_list = True
+            annotation = get_args(annotation)[0]
+        elif isinstance(annotation, type) and issubclass(annotation, RootModel):
+            annotation = annotation.model_fields["root"].annotation
+        else:
+            break
+
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return is_list, annotation
+    return is_list, None
+
+
+def get_field_projection(fields: str, model: Type[BaseModel]) -> Dict:
+    """Returns the include argument of the serializer keeping only some fields of
+    the structures.
+
+    Fields are comma separated dotted paths in a structure, e.g.
+    summary.entities.identifier. Paths which don't start with a field of the
+    structure are looked up in its summary, e.g. provider for summary.provider.
+
+    Args:
+        fields (str): Comma separated field paths
+        model (Type[BaseModel]): Model of the structures
+
+    Returns:
+        Dict: The fields to include, keyed by field name.
+
+    Raises:
+        ValueError: If a path is not a field of the structures.
+    """
+    projection: Dict = {}
+
+    for path in get_field_paths(fields):
+        parts = path.split(".")
+        if parts[0] not in model.model_fields:
+            parts.insert(0, "summary")
+
+        node, current = projection, model
+        for i, part in enumerate(parts):
+            names = {}
+            if current is not None:
+                names = {x.alias or k: k for k, x in current.model_fields.items()}
+                names.update({k: k for k in current.model_fields})
+            if part not in names:
+                raise ValueError(f"Unknown field {path}")
+
+            name = names[part]
+            is_list, current = get_field_type(current, name)
+
+            if i == len(parts) - 1:
+                node[name] = True
+                break
+
+            if node.get(name) is True:
+                # the whole field is included already
+                break
+
+            node = node.setdefault(name, {})
+            if is_list:
+                node = node.setdefault("__all__", {})
+
+    return projection
+
+
+def get_field_paths(fields: Optional[str]) -> List[str]:
+    """Returns the distinct field paths of a fields parameter, sorted.
+
+    Args:
+        fields (str, optional): Comma separated field paths
+
+    Returns:
+        List[str]: The field paths.
+    """
+    if not fields:
+        return []
+    return sorted({x.strip() for x in fields.split(",") if x.strip()})
+
+
+def get_response_projection(
+    fields: Optional[str], model: Type[BaseModel]
+) -> Optional[Dict]:
+    """Returns the include argument of the serializer for a summary or details
+    response, the uniprot_entry is kept whole.
+
+    Args:
+        fields (str, optional): Comma separated field paths of the structures
+        model (Type[BaseModel]): Model of the structures
+
+    Returns:
+        Dict: The fields to include, None to include all of them.
+
+    Raises:
+        ValueError: If a path is not a field of the structures.
+    """
+    if not get_field_paths(fields):
+        return None
+
+    return {
+        "uniprot_entry": True,
+        "structures": {"__all__": get_field_projection(fields, model)},
+    }
+
+
 def filter_on_checksum(in_result, checksum: str):
     checksum_filtered_list = []
 
@@ -168,8 +1052,27 @@ def get_first_entry_with_checksum(in_result: List):
     return None
 
 
-async def get_uniprot_api_results(accessions: List[str]):
-    result = await send_async_requests([f"{UNIPROT_API}{x}" for x in accessions])
+async def get_uniprot_api_results(
+    accessions: List[str], deadline: Optional[Deadline] = None
+):
+    """Returns the UniProt API entries of the accessions, keyed by accession.
+
+    Args:
+        accessions (List[str]): A list of UniProt accessions
+        deadline (Deadline, optional): Latency budget, UniProt is listed in its
+            incomplete providers if it has not answered for every accession
+
+    Returns:
+        Dict: The entries which could be fetched.
+    """
+    uniprot_deadline = deadline.split() if deadline else None
+    result = await send_async_requests(
+        [f"{UNIPROT_API}{x}" for x in accessions],
+        deadline=uniprot_deadline,
+        bulkhead=BATCH_BULKHEAD,
+    )
+    if deadline and uniprot_deadline and uniprot_deadline.incomplete:
+        deadline.incomplete.append("uniprot")
 
     final_result = {}
 
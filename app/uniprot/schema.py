@@ -5,9 +5,16 @@
 from __future__ import annotations
 
 from enum import Enum
-from typing import List, Optional
+from typing import Dict, List, Optional
 
-from pydantic import BaseModel, Field, RootModel
+from pydantic import (
+    BaseModel,
+    Field,
+    RootModel,
+    SerializationInfo,
+    SerializerFunctionWrapHandler,
+    field_serializer,
+)
 
 
 class StrictBaseModel(BaseModel):
@@ -444,6 +451,11 @@ class Residue(StrictBaseModel):
     )
 
 
+class ResidueFormat(str, Enum):
+    OBJECT = "object"
+    COLUMNAR = "columnar"
+
+
 class Segment(StrictBaseModel):
     templates: Optional[List[Template]] = Field(
         None, description="Information on the template(s) used for the model"
@@ -452,6 +464,24 @@ class Segment(StrictBaseModel):
     uniprot: Uniprot
     residues: List[Residue]
 
+    @field_serializer("residues", mode="wrap")
+    def serialize_residues(
+        self,
+        residues: List[Residue],
+        handler: SerializerFunctionWrapHandler,
+        info: SerializationInfo,
+    ):
+        """Serializes the residues as parallel arrays, one per field, when the
+        columnar ResidueFormat is requested in the serialization context."""
+        if (info.context or {}).get("residue_format") != ResidueFormat.COLUMNAR:
+            return handler(residues)
+
+        return {
+            "confidence": [x.confidence for x in residues],
+            "model_residue_label": [x.model_residue_label for x in residues],
+            "uniprot_residue_number": [x.uniprot_residue_number for x in residues],
+        }
+
 
 class Chain(StrictBaseModel):
     chain_id: str
@@ -656,6 +686,71 @@ class PdbSummary(StrictBaseModel):
     structures: Optional[List[Overview]] = None
 
 
+class UniprotCoverage(StrictBaseModel):
+    uniprot_entry: Optional[UniprotEntry] = None
+    sequence_length: int = Field(
+        ...,
+        description="Number of residues covered by the lists, the length of the "
+        "UniProt sequence if known, otherwise the last residue of the models",
+        json_schema_extra={"example": 4},
+    )
+    total: List[int] = Field(
+        ...,
+        description="Number of models covering each residue, from the first residue",
+        json_schema_extra={"example": [1, 2, 2, 0]},
+    )
+    coverage: Dict[str, List[int]] = Field(
+        ...,
+        description="Number of models covering each residue, by model category",
+        json_schema_extra={
+            "example": {
+                "EXPERIMENTALLY DETERMINED": [0, 1, 1, 0],
+                "TEMPLATE-BASED": [1, 1, 1, 0],
+                "AB-INITIO": [0, 0, 0, 0],
+                "CONFORMATIONAL ENSEMBLE": [0, 0, 0, 0],
+            }
+        },
+    )
+
+
+class ResidueRange(StrictBaseModel):
+    start: int = Field(
+        ..., description="First residue of the range", json_schema_extra={"example": 1}
+    )
+    end: int = Field(
+        ..., description="Last residue of the range", json_schema_extra={"example": 28}
+    )
+
+
+class UniprotCoveringSet(StrictBaseModel):
+    uniprot_entry: Optional[UniprotEntry] = None
+    sequence_length: int = Field(
+        ...,
+        description="Length of the UniProt sequence if known, otherwise the last "
+        "residue of the models",
+        json_schema_extra={"example": 413},
+    )
+    covered: int = Field(
+        ...,
+        description="Number of residues covered by the selected models",
+        json_schema_extra={"example": 337},
+    )
+    structures: List[Overview] = Field(
+        ..., description="The selected models, in the order of their first residue"
+    )
+    gaps: List[ResidueRange] = Field(
+        ..., description="Ranges of residues not covered by any model"
+    )
+
+
+class SummarySort(str, Enum):
+    COVERAGE = "coverage"
+    RESOLUTION = "resolution"
+    SEQUENCE_IDENTITY = "sequence_identity"
+    CREATED = "created"
+    CONFIDENCE_AVG_LOCAL_SCORE = "confidence_avg_local_score"
+
+
 class AccessionListRequest(StrictBaseModel):
     accessions: List[str] = Field(
         ...,
@@ -663,10 +758,76 @@ class AccessionListRequest(StrictBaseModel):
         json_schema_extra={"example": ["P00734", "P38398"]},
     )
     provider: Optional[str] = Field(
-        None,
+        default=None,
         description="Name of the model provider",
         json_schema_extra={"example": "swissmodel"},
     )
     exclude_provider: Optional[str] = Field(
-        None, description="Provider to exclude.", json_schema_extra={"example": "pdbe"}
+        default=None,
+        description="Provider to exclude.",
+        json_schema_extra={"example": "pdbe"},
+    )
+    sort: Optional[SummarySort] = Field(
+        default=None,
+        description="Rank the structures of every accession, the best first",
+        json_schema_extra={"example": "coverage"},
+    )
+    limit: Optional[int] = Field(
+        default=None,
+        gt=0,
+        description="Maximum number of structures returned for every accession",
+        json_schema_extra={"example": 10},
+    )
+    offset: int = Field(
+        default=0,
+        ge=0,
+        description="Number of structures skipped for every accession",
+        json_schema_extra={"example": 0},
+    )
+    dedupe: bool = Field(
+        default=False,
+        description="Return a single copy of the models returned by several "
+        "providers",
+        json_schema_extra={"example": True},
+    )
+    fields: Optional[str] = Field(
+        default=None,
+        description="Comma separated fields of the structures to return",
+        json_schema_extra={"example": "model_identifier,provider,coverage"},
+    )
+
+
+class DetailsListRequest(StrictBaseModel):
+    accessions: List[str] = Field(
+        ...,
+        description="A list of UniProt accessions",
+        json_schema_extra={"example": ["P00734", "P38398"]},
+    )
+    provider: Optional[str] = Field(
+        default=None,
+        description="Name of the model provider",
+        json_schema_extra={"example": "swissmodel"},
+    )
+    res_range: Optional[str] = Field(
+        default=None,
+        alias="range",
+        pattern="^[0-9]+-[0-9]+$",
+        description="UniProt sequence residue range, applied to every accession",
+        json_schema_extra={"example": "1-100"},
+    )
+    residue_format: ResidueFormat = Field(
+        default=ResidueFormat.OBJECT,
+        description="Format of the residues of the segments",
+        json_schema_extra={"example": "columnar"},
+    )
+    dedupe: bool = Field(
+        default=False,
+        description="Return a single copy of the models returned by several "
+        "providers",
+        json_schema_extra={"example": True},
+    )
+    fields: Optional[str] = Field(
+        default=None,
+        description="Comma separated fields of the structures to return",
+        json_schema_extra={"example": "model_identifier,provider,chains.chain_id"},
     )
@@ -1,33 +1,98 @@
-from typing import Any, List, Optional
+from typing import (
+    Any,
+    AsyncGenerator,
+    AsyncIterator,
+    Dict,
+    List,
+    Optional,
+    Set,
+    Tuple,
+)
 
+import httpx
 import pydantic
+from fastapi import Depends
 from fastapi.params import Path, Query
 from fastapi.routing import APIRouter
 from starlette import status
-from starlette.responses import JSONResponse
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
 
 from app import logger
-from app.config import get_base_service_url, get_services
+from app.bulkhead import BATCH_BULKHEAD, Bulkhead
+from app.config import (
+    BEACON_CACHE_TTL,
+    DETAILS_CACHE_TTL,
+    SUMMARY_CACHE_TTL,
+    get_provider_rank,
+    get_service_url,
+    get_services,
+    provider_enum,
+)
 from app.constants import (
+    DEDUPE_DESC,
+    FIELDS_DESC,
+    LIMIT_DESC,
+    OFFSET_DESC,
     QUERY_DESC,
+    RESIDUE_FORMAT_DESC,
+    SORT_DESC,
+    STREAM_DESC,
     TEMPLATE_DESC,
     UNIPROT_QUAL_DESC,
     UNP_CHECKSUM_DESC,
 )
 from app.uniprot.helper import (
+    dedupe_structures,
     filter_on_checksum,
-    get_first_entry_with_checksum,
+    get_first_entry_with_checksum,  # noqa: F401
     get_list_of_uniprot_summary_helper,
+    get_field_paths,
+    get_residue_coverage,
+    get_response_projection,
+    get_sequence_length,
+    get_distinct_accessions,
+    get_summary_cache_key,
+    iter_batch,
+    iter_uniprot_summaries,
+    prepare_list_summary,
     get_uniprot_summary_helper,
+    rank_structures,
+    select_covering_set,
+    slice_structures,
+    SummaryIndex,
+    SummaryIndexCache,
 )
 from app.uniprot.schema import (
     AccessionListRequest,
     Detailed,
+    DetailsListRequest,
+    Overview,
+    ResidueFormat,
+    ResidueRange,
+    SummarySort,
+    UniprotCoverage,
+    UniprotCoveringSet,
     UniprotDetails,
     UniprotEntry,
     UniprotSummary,
 )
-from app.utils import clean_args, get_final_service_url, send_async_requests
+from app.utils import (
+    Deadline,
+    clean_args,
+    get_cache_key,
+    dump_json,
+    get_batch_deadline,
+    get_deadline,
+    get_type_adapter,
+    NDJSON_MEDIA_TYPE,
+    accepts_ndjson,
+    iter_async_requests,
+    json_bytes_response,
+    send_async_requests,
+)
+from worker.cache.utils import get_cached_response, set_cached_response
+from worker.helper import get_nested_value_from_json
 
 uniprot_route = APIRouter()
 
@@ -49,9 +114,7 @@ uniprot_route = APIRouter()
 )
 async def get_uniprot_summary(
     qualifier: Any = Path(..., description=QUERY_DESC, example="P38398"),
-    provider: Optional[Any] = Query(
-        None, enum=[x["provider"] for x in get_services("summary")]
-    ),
+    provider: Optional[Any] = Query(None, json_schema_extra=provider_enum("summary")),
     template: Optional[Any] = Query(
         None,
         description=TEMPLATE_DESC,
@@ -65,9 +128,15 @@ async def get_uniprot_summary(
     exclude_provider: Optional[str] = Query(
         None,
         description="Provider to exclude.",
-        enum=[x["provider"] for x in get_services("summary")],
+        json_schema_extra=provider_enum("summary"),
     ),
     uniprot_checksum: Optional[str] = Query(None, description=UNP_CHECKSUM_DESC),
+    sort: Optional[SummarySort] = Query(None, description=SORT_DESC),
+    limit: Optional[int] = Query(None, gt=0, description=LIMIT_DESC),
+    offset: int = Query(0, ge=0, description=OFFSET_DESC),
+    dedupe: bool = Query(False, description=DEDUPE_DESC),
+    fields: Optional[str] = Query(None, description=FIELDS_DESC),
+    deadline: Deadline = Depends(get_deadline),
 ):
     f"""Returns summary of experimental and theoretical models for a UniProt
     accession or entry name
@@ -79,23 +148,319 @@ async def get_uniprot_summary(
         res_range (str, optional): Residue range
         exclude_provider (str, optional): Provider to exclude
         uniport_checksum (str, optional): {UNP_CHECKSUM_DESC}
+        sort (SummarySort, optional): {SORT_DESC}
+        limit (int, optional): {LIMIT_DESC}
+        offset (int, optional): {OFFSET_DESC}
+        dedupe (bool, optional): {DEDUPE_DESC}
+        fields (str, optional): {FIELDS_DESC}
 
     Returns:
         Result: A Result summary object with experimental and theoretical models.
     """
+    try:
+        include = get_response_projection(fields, Overview)
+    except ValueError as e:
+        return JSONResponse(
+            content={"message": str(e)}, status_code=status.HTTP_400_BAD_REQUEST
+        )
+
+    # the full summary is returned as cached when no other parameter applies
+    full_summary = not any([res_range, template, sort, limit, offset, dedupe, include])
+
+    if full_summary:
+        content, headers = await get_summary_bytes(
+            qualifier, provider, exclude_provider, uniprot_checksum, deadline=deadline
+        )
+        if content is None:
+            return JSONResponse(
+                content={}, status_code=status.HTTP_404_NOT_FOUND, headers=headers
+            )
+        return json_bytes_response(content, headers=headers)
+
+    index, headers = await get_summary_index(
+        qualifier, provider, exclude_provider, uniprot_checksum, deadline=deadline
+    )
+    if index is None:
+        return JSONResponse(
+            content={}, status_code=status.HTTP_404_NOT_FOUND, headers=headers
+        )
+
+    results = index.search(res_range, template)
+    if not results:
+        return JSONResponse(
+            content={}, status_code=status.HTTP_404_NOT_FOUND, headers=headers
+        )
+
+    if dedupe:
+        results = UniprotSummary.model_construct(
+            uniprot_entry=results.uniprot_entry,
+            structures=dedupe_structures(results.structures),
+        )
+
+    if sort or limit or offset:
+        headers = {**headers, "X-Total-Count": str(len(results.structures))}
+        results = rank_structures(results, sort, limit, offset)
+
+    return json_bytes_response(
+        dump_json(results, UniprotSummary, exclude_unset=True, include=include),
+        headers=headers,
+    )
+
+
+async def get_summary_index(
+    qualifier: str,
+    provider=None,
+    exclude_provider=None,
+    uniprot_checksum=None,
+    *,
+    deadline: Deadline,
+) -> Tuple[Optional[SummaryIndex], Dict[str, str]]:
+    """Returns the index of the full summary of a UniProt accession.
+
+    A single full summary is cached per accession, ranges, templates and the
+    other views of the summary are computed from it. The index is looked up in
+    the worker first, then in the response cache, and the beacons are requested
+    last.
+
+    Args:
+        qualifier (str): UniProt accession
+        provider (str, optional): Data provider
+        exclude_provider (str, optional): Provider to exclude
+        uniprot_checksum (str, optional): UniProt checksum
+        deadline (Deadline): Latency budget for the beacon requests
+
+    Returns:
+        Tuple: The index, None if there is no model, and the response headers.
+    """
+    cache_key = get_summary_cache_key(
+        qualifier, provider, exclude_provider, uniprot_checksum
+    )
+    headers = {"X-Cache": "HIT"}
+    index = SummaryIndexCache.get(cache_key)
+    if index is not None:
+        return index, headers
+
+    cached = get_cached_response(cache_key)
+    if isinstance(cached, bytes):
+        summary = get_type_adapter(UniprotSummary).validate_json(cached)
+        index = SummaryIndex(summary)
+        SummaryIndexCache.set(cache_key, index, SUMMARY_CACHE_TTL)
+        return index, headers
+
+    index, _, headers = await request_summary_index(
+        cache_key, qualifier, provider, exclude_provider, uniprot_checksum, deadline
+    )
+    return index, headers
+
+
+async def get_summary_bytes(
+    qualifier: str,
+    provider=None,
+    exclude_provider=None,
+    uniprot_checksum=None,
+    *,
+    deadline: Deadline,
+) -> Tuple[Optional[bytes], Dict[str, str]]:
+    """Returns the full summary of a UniProt accession as JSON bytes.
+
+    Like get_summary_index, but a summary found in the response cache is
+    returned as it is rather than validated.
+
+    Args:
+        qualifier (str): UniProt accession
+        provider (str, optional): Data provider
+        exclude_provider (str, optional): Provider to exclude
+        uniprot_checksum (str, optional): UniProt checksum
+        deadline (Deadline): Latency budget for the beacon requests
+
+    Returns:
+        Tuple: The JSON bytes, None if there is no model, and the response headers.
+    """
+    cache_key = get_summary_cache_key(
+        qualifier, provider, exclude_provider, uniprot_checksum
+    )
+    headers = {"X-Cache": "HIT"}
+    index = SummaryIndexCache.get(cache_key)
+    if index is not None:
+        return dump_json(index.summary, UniprotSummary, exclude_unset=True), headers
+
+    cached = get_cached_response(cache_key)
+    if isinstance(cached, bytes):
+        return cached, headers
+
+    _, content, headers = await request_summary_index(
+        cache_key, qualifier, provider, exclude_provider, uniprot_checksum, deadline
+    )
+    return content, headers
+
+
+async def request_summary_index(
+    cache_key: str,
+    qualifier: str,
+    provider,
+    exclude_provider,
+    uniprot_checksum,
+    deadline: Deadline,
+) -> Tuple[Optional[SummaryIndex], Optional[bytes], Dict[str, str]]:
+    """Requests the full summary of a UniProt accession from the beacons, and
+    caches it unless a beacon did not answer in time.
+
+    Returns:
+        Tuple: The index and the JSON bytes, None if there is no model, and the
+        response headers.
+    """
     results = await get_uniprot_summary_helper(
         qualifier,
         provider,
-        template,
-        res_range,
+        None,
+        None,
         exclude_provider,
         uniprot_checksum,
+        deadline=deadline,
     )
-
+    headers = {"X-Cache": "MISS", **deadline.headers()}
     if not results:
-        return JSONResponse(content={}, status_code=status.HTTP_404_NOT_FOUND)
-    else:
-        return results
+        return None, None, headers
+
+    content = dump_json(results, UniprotSummary, exclude_unset=True)
+    index = SummaryIndex(results)
+    if not deadline.incomplete:
+        set_cached_response(cache_key, content, SUMMARY_CACHE_TTL)
+        SummaryIndexCache.set(cache_key, index, SUMMARY_CACHE_TTL)
+
+    return index, content, headers
+
+
+@uniprot_route.get(
+    "/coverage/{qualifier}.json",
+    status_code=status.HTTP_200_OK,
+    response_model=UniprotCoverage,
+    response_model_exclude_unset=True,
+    tags=["UniProt"],
+    description="""
+    Retrieve the number of structure models covering each residue of a UniProtKB
+    accession, in total and by model category.
+    """,
+)
+async def get_uniprot_coverage(
+    qualifier: Any = Path(..., description=QUERY_DESC, example="P38398"),
+    provider: Optional[Any] = Query(None, json_schema_extra=provider_enum("summary")),
+    exclude_provider: Optional[str] = Query(
+        None,
+        description="Provider to exclude.",
+        json_schema_extra=provider_enum("summary"),
+    ),
+    uniprot_checksum: Optional[str] = Query(None, description=UNP_CHECKSUM_DESC),
+    dedupe: bool = Query(False, description=DEDUPE_DESC),
+    deadline: Deadline = Depends(get_deadline),
+):
+    f"""Returns the per-residue coverage of the models of a UniProt accession
+
+    Args:
+        qualifier (str): {QUERY_DESC}
+        provider (str, optional): Data provider
+        exclude_provider (str, optional): Provider to exclude
+        uniprot_checksum (str, optional): {UNP_CHECKSUM_DESC}
+        dedupe (bool, optional): {DEDUPE_DESC}
+
+    Returns:
+        UniprotCoverage: The number of models covering each residue.
+    """
+    index, headers = await get_summary_index(
+        qualifier, provider, exclude_provider, uniprot_checksum, deadline=deadline
+    )
+    if index is None:
+        return JSONResponse(
+            content={}, status_code=status.HTTP_404_NOT_FOUND, headers=headers
+        )
+
+    structures = index.summary.structures or []
+    if dedupe:
+        structures = dedupe_structures(structures)
+
+    sequence_length = get_sequence_length(index.summary)
+    coverage = get_residue_coverage(structures, sequence_length)
+    result = UniprotCoverage.model_construct(
+        uniprot_entry=index.summary.uniprot_entry,
+        sequence_length=sequence_length,
+        total=[sum(x) for x in zip(*coverage.values())],
+        coverage=coverage,
+    )
+
+    return json_bytes_response(
+        dump_json(result, UniprotCoverage, exclude_unset=True), headers=headers
+    )
+
+
+@uniprot_route.get(
+    "/covering-set/{qualifier}.json",
+    status_code=status.HTTP_200_OK,
+    response_model=UniprotCoveringSet,
+    response_model_exclude_unset=True,
+    tags=["UniProt"],
+    description="""
+    Retrieve the smallest set of structure models covering the residues of a
+    UniProtKB accession, preferring the models of better quality, and the residues
+    left uncovered.
+    """,
+)
+async def get_uniprot_covering_set(
+    qualifier: Any = Path(..., description=QUERY_DESC, example="P38398"),
+    provider: Optional[Any] = Query(None, json_schema_extra=provider_enum("summary")),
+    exclude_provider: Optional[str] = Query(
+        None,
+        description="Provider to exclude.",
+        json_schema_extra=provider_enum("summary"),
+    ),
+    uniprot_checksum: Optional[str] = Query(None, description=UNP_CHECKSUM_DESC),
+    fields: Optional[str] = Query(None, description=FIELDS_DESC),
+    deadline: Deadline = Depends(get_deadline),
+):
+    f"""Returns the smallest set of models covering a UniProt accession
+
+    Args:
+        qualifier (str): {QUERY_DESC}
+        provider (str, optional): Data provider
+        exclude_provider (str, optional): Provider to exclude
+        uniprot_checksum (str, optional): {UNP_CHECKSUM_DESC}
+        fields (str, optional): {FIELDS_DESC}
+
+    Returns:
+        UniprotCoveringSet: The selected models and the uncovered residues.
+    """
+    try:
+        include = get_response_projection(fields, Overview)
+    except ValueError as e:
+        return JSONResponse(
+            content={"message": str(e)}, status_code=status.HTTP_400_BAD_REQUEST
+        )
+
+    index, headers = await get_summary_index(
+        qualifier, provider, exclude_provider, uniprot_checksum, deadline=deadline
+    )
+    if index is None:
+        return JSONResponse(
+            content={}, status_code=status.HTTP_404_NOT_FOUND, headers=headers
+        )
+
+    sequence_length = get_sequence_length(index.summary)
+    structures, gaps = select_covering_set(
+        index.summary.structures or [], sequence_length
+    )
+    result = UniprotCoveringSet.model_construct(
+        uniprot_entry=index.summary.uniprot_entry,
+        sequence_length=sequence_length,
+        covered=sequence_length - sum(end - start + 1 for start, end in gaps),
+        structures=structures,
+        gaps=[ResidueRange.model_construct(start=x, end=y) for x, y in gaps],
+    )
+    if include:
+        include = {**include, "sequence_length": True, "covered": True, "gaps": True}
+
+    return json_bytes_response(
+        dump_json(result, UniprotCoveringSet, exclude_unset=True, include=include),
+        headers=headers,
+    )
 
 
 @uniprot_route.post(
@@ -104,27 +469,151 @@ async def get_uniprot_summary(
     response_model=List[UniprotSummary],
     response_model_exclude_unset=True,
     description="Returns summary of experimental and theoretical models for a "
-    "list of UniProt accessions",
+    "list of UniProt accessions. With Accept: application/x-ndjson, one summary "
+    "is streamed per line as soon as it is ready.",
     tags=["UniProt"],
+    responses={200: {"content": {NDJSON_MEDIA_TYPE: {}}}},
 )
-async def get_list_of_uniprot_summary(list_request: AccessionListRequest):
+async def get_list_of_uniprot_summary(
+    list_request: AccessionListRequest,
+    request: Request,
+    deadline: Deadline = Depends(get_batch_deadline),
+):
     """Returns summary of experimental and theoretical models for a list of UniProt
     accessions
 
+    Batches of any size are accepted, they are bounded by the deadline and by
+    BATCH_MAX_STRUCTURES, see get_list_of_uniprot_summary_helper. Streamed
+    batches are bounded by the deadline only, as no summary is held.
+
     Args:
         list_request (AccessionListRequest): List of UniProt accession objects
+        request (Request): The API request, its Accept header chooses the format
 
     Returns:
         Result: A list of Result summary object with experimental and theoretical
         models for UniProt accessions.
     """
+    try:
+        include = get_response_projection(list_request.fields, Overview)
+    except ValueError as e:
+        return JSONResponse(
+            content={"message": str(e)}, status_code=status.HTTP_400_BAD_REQUEST
+        )
 
-    results = await get_list_of_uniprot_summary_helper(list_request)
+    if accepts_ndjson(request):
+        lines = iter_uniprot_summaries_ndjson(list_request, deadline, include)
+        return StreamingResponse(lines, media_type=NDJSON_MEDIA_TYPE)
+
+    results = await get_list_of_uniprot_summary_helper(list_request, deadline=deadline)
 
     if not results:
-        return JSONResponse(content={}, status_code=status.HTTP_404_NOT_FOUND)
+        return JSONResponse(
+            content={},
+            status_code=status.HTTP_404_NOT_FOUND,
+            headers=deadline.headers(),
+        )
+
+    return json_bytes_response(
+        dump_json(
+            list(results),
+            List[UniprotSummary],
+            exclude_unset=True,
+            include={"__all__": include} if include else None,
+        ),
+        headers=deadline.headers(),
+    )
+
+
+async def iter_uniprot_summaries_ndjson(
+    list_request: AccessionListRequest,
+    deadline: Deadline,
+    include: Optional[Dict] = None,
+) -> AsyncGenerator[bytes, None]:
+    """Yields the summaries of a batch as newline delimited JSON, in the order they
+    are ready.
+
+    Args:
+        list_request (AccessionListRequest): List of UniProt accession objects
+        deadline (Deadline): Latency budget of the batch
+        include (Dict, optional): Fields to include, see get_response_projection
+
+    Yields:
+        bytes: A summary and a newline.
+    """
+    batch = iter_uniprot_summaries(list_request, deadline)
+    try:
+        async for _, summary in batch:
+            if not summary:
+                continue
+
+            summary = prepare_list_summary(summary, list_request)
+            content = dump_json(
+                summary, UniprotSummary, exclude_unset=True, include=include
+            )
+            yield content + b"\n"
+    finally:
+        await batch.aclose()
+
+
+def get_details_cache_key(
+    qualifier: str,
+    provider=None,
+    res_range=None,
+    uniprot_checksum=None,
+    residue_format: ResidueFormat = ResidueFormat.OBJECT,
+    dedupe: bool = False,
+    fields: Optional[str] = None,
+) -> str:
+    """Returns the cache key of the details of an accession, as serialized."""
+    return get_cache_key(
+        "uniprot-details",
+        qualifier,
+        provider=provider,
+        range=res_range,
+        uniprot_checksum=uniprot_checksum,
+        residue_format=residue_format.value,
+        dedupe=dedupe,
+        fields=",".join(get_field_paths(fields)),
+    )
+
+
+async def get_uniprot_details_responses(
+    qualifier: str,
+    provider=None,
+    deadline: Optional[Deadline] = None,
+    bulkhead: Optional[Bulkhead] = None,
+) -> List[httpx.Response]:
+    """Requests the details of a UniProt accession from the beacons.
+
+    The full-length details are requested and residue ranges are applied by the
+    hub, see slice_structures, so the beacon responses cached for an accession
+    serve every range.
+
+    Args:
+        qualifier (str): UniProt accession, in upper case
+        provider (str, optional): Data provider
+        deadline (Deadline, optional): Latency budget for the beacon requests
+        bulkhead (Bulkhead, optional): Bulkhead for the beacon requests, defaults
+            to the interactive one
+
+    Returns:
+        List[httpx.Response]: The successful beacon responses.
+    """
+    services = get_services(service_type="uniprot", provider=provider)
+    calls = []
+    for service in services:
+        calls.append(get_service_url(service, f"{qualifier}.json"))
 
-    return list(results)
+    result = await send_async_requests(
+        calls,
+        providers=[x["provider"] for x in services],
+        cache_ttl=BEACON_CACHE_TTL,
+        deadline=deadline,
+        bulkhead=bulkhead,
+    )
+
+    return [x for x in result if x and x.status_code == status.HTTP_200_OK]
 
 
 @clean_args()
@@ -134,6 +623,9 @@ async def get_uniprot_helper(
     template=None,
     res_range=None,
     uniprot_checksum=None,
+    deadline: Optional[Deadline] = None,
+    dedupe: bool = False,
+    bulkhead: Optional[Bulkhead] = None,
 ):
     f"""Helper function to get uniprot details.
 
@@ -143,33 +635,25 @@ async def get_uniprot_helper(
         template (str, optional): {TEMPLATE_DESC}
         res_range (str, optional): Residue range
         uniprot_checksum (str, optional): {UNP_CHECKSUM_DESC}
+        deadline (Deadline, optional): Latency budget for the beacon requests
+        dedupe (bool, optional): {DEDUPE_DESC}
+        bulkhead (Bulkhead, optional): Bulkhead for the beacon requests, defaults
+            to the interactive one
 
     Returns:
         Result: A Result object with experimental and theoretical models.
     """
     qualifier = qualifier.upper()
-    services = get_services(service_type="uniprot", provider=provider)
-    calls = []
-    for service in services:
-        base_url = get_base_service_url(service["provider"])
-        final_url = get_final_service_url(
-            base_url, service["accessPoint"], f"{qualifier}.json"
-        )
-
-        if res_range:
-            final_url = f"{final_url}&range={res_range}"
-
-        calls.append(final_url)
-
-    result = await send_async_requests(calls)
+    result = await get_uniprot_details_responses(
+        qualifier, provider, deadline=deadline, bulkhead=bulkhead
+    )
     final_result = []
 
     for x in result:
-        if x and x.status_code == status.HTTP_200_OK:
-            try:
-                final_result.append(dict(x.json()))
-            except Exception:
-                logger.error(f"Error parsing response from {x.url}")
+        try:
+            final_result.append(dict(x.json()))
+        except Exception:
+            logger.error(f"Error parsing response from {x.url}")
 
     # filter out beacons results where there are no structures
     final_result = list(filter(lambda x: x.get("structures"), final_result))
@@ -180,19 +664,17 @@ async def get_uniprot_helper(
     if not final_result:
         return None
 
-    final_structures: List[Detailed] = []
-    uniprot_entry: UniprotEntry = UniprotEntry(
-        **get_first_entry_with_checksum(final_result)
-    )
+    details_adapter = get_type_adapter(UniprotDetails)
+    valid_result: List[UniprotDetails] = []
 
     for item in final_result:
-        # Remove erroneous responses
+        # Remove erroneous responses, each provider response is validated once
         try:
-            Detailed(**item["structures"][0])
-            UniprotEntry(**item["uniprot_entry"])
-            final_structures.extend(item["structures"])
+            valid_result.append(details_adapter.validate_python(item))
         except pydantic.ValidationError:
-            provider = item["structures"][0].get("provider")
+            provider = get_nested_value_from_json(
+                item, "structures[0].summary.provider"
+            )
             if provider:
                 logger.warning(
                     f"{provider} returned an erroneous response for {qualifier}"
@@ -200,16 +682,230 @@ async def get_uniprot_helper(
         except Exception:
             pass
 
+    final_structures: List[Detailed] = [
+        structure for item in valid_result for structure in item.structures
+    ]
+    if res_range:
+        final_structures = slice_structures(final_structures, res_range)
+    if dedupe:
+        final_structures = dedupe_structures(final_structures)
+
     if not final_structures:
         return None
 
-    api_result: UniprotDetails = UniprotDetails(
-        **{"uniprot_entry": uniprot_entry, "structures": final_structures}
+    entries = [x.uniprot_entry for x in valid_result if x.uniprot_entry]
+    uniprot_entry: Optional[UniprotEntry] = next(
+        (x for x in entries if x.uniprot_checksum), entries[0] if entries else None
+    )
+
+    # the structures are validated already, don't validate them again
+    api_result: UniprotDetails = UniprotDetails.model_construct(
+        uniprot_entry=uniprot_entry, structures=final_structures
     )
 
     return api_result
 
 
+@clean_args()
+async def stream_uniprot_helper(
+    qualifier: str,
+    provider=None,
+    template=None,
+    res_range=None,
+    uniprot_checksum=None,
+    deadline: Optional[Deadline] = None,
+    residue_format: ResidueFormat = ResidueFormat.OBJECT,
+    include: Optional[Dict] = None,
+    dedupe: bool = False,
+) -> Optional[AsyncGenerator[bytes, None]]:
+    f"""Helper function to stream uniprot details.
+
+    Args:
+        qualifier (str): {UNIPROT_QUAL_DESC}
+        provider (str, optional): Data provider
+        template (str, optional): {TEMPLATE_DESC}
+        res_range (str, optional): Residue range
+        uniprot_checksum (str, optional): {UNP_CHECKSUM_DESC}
+        deadline (Deadline, optional): Latency budget for the beacon requests
+        residue_format (ResidueFormat, optional): Format of the residues
+        include (Dict, optional): Fields to include, see get_response_projection
+        dedupe (bool, optional): {DEDUPE_DESC}
+
+    Returns:
+        AsyncGenerator[bytes]: The pieces of the JSON document, None if no beacon
+        returned a valid response.
+    """
+    qualifier = qualifier.upper()
+    responses = iter_uniprot_details_responses(qualifier, provider, deadline=deadline)
+    if dedupe:
+        responses = iter_in_preference_order(responses)
+
+    chunks = iter_uniprot_details_json(
+        responses,
+        qualifier,
+        uniprot_checksum,
+        res_range=res_range,
+        residue_format=residue_format,
+        include=include,
+        dedupe=dedupe,
+    )
+    # the first piece holds the first valid response, if there is one
+    try:
+        first_chunk = await chunks.__anext__()
+    except StopAsyncIteration:
+        return None
+
+    return prepend_chunk(first_chunk, chunks)
+
+
+async def iter_uniprot_details_responses(
+    qualifier: str,
+    provider=None,
+    deadline: Optional[Deadline] = None,
+) -> AsyncGenerator[Tuple[str, httpx.Response], None]:
+    """Requests the details of a UniProt accession from the beacons, and yields
+    the successful responses as soon as they arrive, see
+    get_uniprot_details_responses.
+
+    Yields:
+        Tuple: The provider id and its response.
+    """
+    services = get_services(service_type="uniprot", provider=provider)
+    providers = [x["provider"] for x in services]
+    responses = iter_async_requests(
+        [get_service_url(x, f"{qualifier}.json") for x in services],
+        providers=providers,
+        cache_ttl=BEACON_CACHE_TTL,
+        deadline=deadline,
+    )
+
+    try:
+        async for i, x in responses:
+            if x and x.status_code == status.HTTP_200_OK:
+                yield providers[i], x
+    finally:
+        await responses.aclose()
+
+
+async def iter_in_preference_order(
+    responses: AsyncGenerator[Tuple[str, httpx.Response], None],
+) -> AsyncGenerator[Tuple[str, httpx.Response], None]:
+    """Yields the beacon responses in the preference order of their providers,
+    once all of them have arrived."""
+    received = [x async for x in responses]
+    received.sort(key=lambda x: get_provider_rank(x[0]))
+    for item in received:
+        yield item
+
+
+async def prepend_chunk(
+    first_chunk: bytes, chunks: AsyncGenerator[bytes, None]
+) -> AsyncGenerator[bytes, None]:
+    """Yields a piece read ahead of a stream, then the rest of the stream."""
+    yield first_chunk
+    try:
+        async for chunk in chunks:
+            yield chunk
+    finally:
+        await chunks.aclose()
+
+
+async def iter_uniprot_details_json(
+    responses: AsyncIterator[Tuple[str, httpx.Response]],
+    qualifier: str,
+    uniprot_checksum=None,
+    res_range=None,
+    residue_format: ResidueFormat = ResidueFormat.OBJECT,
+    include: Optional[Dict] = None,
+    dedupe: bool = False,
+) -> AsyncGenerator[bytes, None]:
+    """Yields the JSON document of the details of a UniProt accession in pieces.
+
+    Each beacon response is validated once, straight from its body, and its
+    structures are written as soon as it arrives, so a single response is held as
+    models at any time. The uniprot_entry is written last, once all the responses
+    are read, so it is chosen like in get_uniprot_helper.
+
+    When deduplicating, the responses must come in the preference order of their
+    providers, see iter_in_preference_order, so the first copy of a model written
+    is the one to keep.
+
+    Args:
+        responses (AsyncIterator): Provider ids and their successful responses.
+        qualifier (str): UniProt accession
+        uniprot_checksum (str, optional): Keep the responses with this checksum
+        res_range (str, optional): Residue range
+        residue_format (ResidueFormat, optional): Format of the residues
+        include (Dict, optional): Fields to include, see get_response_projection
+        dedupe (bool, optional): Leave out the models written already
+
+    Yields:
+        bytes: A piece of the JSON document, nothing if no response is valid.
+    """
+    details_adapter = get_type_adapter(UniprotDetails)
+    entries: List[UniprotEntry] = []
+    separator = b'{"structures":['
+    # model identifiers and model URLs written already
+    written: Set[str] = set()
+
+    async for provider, x in responses:
+        try:
+            details = details_adapter.validate_json(x.content)
+        except pydantic.ValidationError:
+            logger.warning(f"{provider} returned an erroneous response for {qualifier}")
+            continue
+
+        # filter out beacons results where there are no structures
+        if not details.structures:
+            continue
+
+        if details.uniprot_entry is None:
+            logger.warning(f"{provider} returned an erroneous response for {qualifier}")
+            continue
+
+        if (
+            uniprot_checksum
+            and details.uniprot_entry.uniprot_checksum != uniprot_checksum
+        ):
+            continue
+
+        entries.append(details.uniprot_entry)
+        final_structures = details.structures
+        if res_range:
+            final_structures = slice_structures(final_structures, res_range)
+            if not final_structures:
+                continue
+
+        if dedupe:
+            final_structures = [
+                structure
+                for structure in dedupe_structures(final_structures)
+                if structure.summary.model_identifier.lower() not in written
+                and structure.summary.model_url not in written
+            ]
+            if not final_structures:
+                continue
+            for structure in final_structures:
+                written.add(structure.summary.model_identifier.lower())
+                written.add(structure.summary.model_url)
+
+        # the structures without the brackets of the list
+        structures = dump_json(
+            final_structures,
+            List[Detailed],
+            context={"residue_format": residue_format},
+            include=include["structures"] if include else None,
+        )
+        yield separator + structures[1:-1]
+        separator = b","
+
+    if separator == b",":
+        uniprot_entry = next((x for x in entries if x.uniprot_checksum), entries[0])
+        yield b"".join(
+            [b'],"uniprot_entry":', dump_json(uniprot_entry, UniprotEntry), b"}"]
+        )
+
+
 @uniprot_route.get(
     "/{qualifier}.json",
     status_code=status.HTTP_200_OK,
@@ -230,9 +926,7 @@ async def get_uniprot(
         description=QUERY_DESC,
         example="P38398",
     ),
-    provider: Optional[Any] = Query(
-        None, enum=[x["provider"] for x in get_services("uniprot")]
-    ),
+    provider: Optional[Any] = Query(None, json_schema_extra=provider_enum("uniprot")),
     template: Optional[Any] = Query(
         None,
         description="Template is 4 letter PDB code, or 4 letter code with "
@@ -245,6 +939,13 @@ async def get_uniprot(
         alias="range",
     ),
     uniprot_checksum: Optional[str] = Query(None, description=UNP_CHECKSUM_DESC),
+    stream: bool = Query(False, description=STREAM_DESC),
+    residue_format: ResidueFormat = Query(
+        ResidueFormat.OBJECT, description=RESIDUE_FORMAT_DESC
+    ),
+    dedupe: bool = Query(False, description=DEDUPE_DESC),
+    fields: Optional[str] = Query(None, description=FIELDS_DESC),
+    deadline: Deadline = Depends(get_deadline),
 ):
     f"""Returns experimental and theoretical models for a UniProt accession or entry name
 
@@ -255,10 +956,50 @@ async def get_uniprot(
         res_range (str, optional): Residue range
         exclude_provider (str, optional): Provider to exclude
         uniprot_checksum (str, optional): {UNP_CHECKSUM_DESC}
+        stream (bool, optional): {STREAM_DESC}
+        residue_format (ResidueFormat, optional): {RESIDUE_FORMAT_DESC}
+        dedupe (bool, optional): {DEDUPE_DESC}
+        fields (str, optional): {FIELDS_DESC}
 
     Returns:
         Result: A Result object with experimental and theoretical models.
     """
+    try:
+        include = get_response_projection(fields, Detailed)
+    except ValueError as e:
+        return JSONResponse(
+            content={"message": str(e)}, status_code=status.HTTP_400_BAD_REQUEST
+        )
+
+    cache_key = get_details_cache_key(
+        qualifier, provider, res_range, uniprot_checksum, residue_format, dedupe, fields
+    )
+    cached = get_cached_response(cache_key)
+
+    if isinstance(cached, bytes):
+        return json_bytes_response(cached, headers={"X-Cache": "HIT"})
+
+    if stream:
+        # streamed responses are never held in full, so they are not cached
+        chunks = await stream_uniprot_helper(
+            qualifier,
+            provider,
+            template,
+            res_range,
+            uniprot_checksum,
+            deadline=deadline,
+            residue_format=residue_format,
+            include=include,
+            dedupe=dedupe,
+        )
+        headers = {"X-Cache": "MISS", **deadline.headers()}
+
+        if chunks is None:
+            return JSONResponse(
+                content={}, status_code=status.HTTP_404_NOT_FOUND, headers=headers
+            )
+
+        return StreamingResponse(chunks, media_type="application/json", headers=headers)
 
     results = await get_uniprot_helper(
         qualifier,
@@ -266,9 +1007,167 @@ async def get_uniprot(
         template,
         res_range,
         uniprot_checksum,
+        deadline=deadline,
+        dedupe=dedupe,
     )
+    headers = {"X-Cache": "MISS", **deadline.headers()}
 
     if not results:
-        return JSONResponse(content={}, status_code=status.HTTP_404_NOT_FOUND)
-    else:
-        return results
+        return JSONResponse(
+            content={}, status_code=status.HTTP_404_NOT_FOUND, headers=headers
+        )
+
+    content = dump_json(
+        results,
+        UniprotDetails,
+        context={"residue_format": residue_format},
+        include=include,
+    )
+    if not deadline.incomplete:
+        set_cached_response(cache_key, content, DETAILS_CACHE_TTL)
+
+    return json_bytes_response(content, headers=headers)
+
+
+@uniprot_route.post(
+    "/details",
+    status_code=status.HTTP_200_OK,
+    response_model=List[UniprotDetails],
+    description="Returns experimental and theoretical models for a list of UniProt "
+    "accessions. The details are streamed as soon as they are ready, as a JSON "
+    "list, or one per line with Accept: application/x-ndjson.",
+    tags=["UniProt"],
+    responses={200: {"content": {NDJSON_MEDIA_TYPE: {}}}},
+)
+async def get_list_of_uniprot_details(
+    list_request: DetailsListRequest,
+    request: Request,
+    deadline: Deadline = Depends(get_batch_deadline),
+):
+    """Returns experimental and theoretical models for a list of UniProt accessions
+
+    Args:
+        list_request (DetailsListRequest): List of UniProt accessions and options
+        request (Request): The API request, its Accept header chooses the format
+
+    Returns:
+        Result: The details of every accession with models, streamed, 404 if no
+        accession has models.
+    """
+    try:
+        include = get_response_projection(list_request.fields, Detailed)
+    except ValueError as e:
+        return JSONResponse(
+            content={"message": str(e)}, status_code=status.HTTP_400_BAD_REQUEST
+        )
+
+    ndjson = accepts_ndjson(request)
+    chunks = iter_uniprot_details_batch(list_request, deadline, include, ndjson)
+
+    # wait for the first result, like POST /uniprot/summary answers 404 when no
+    # accession has models
+    try:
+        first_chunk = await chunks.__anext__()
+    except StopAsyncIteration:
+        return JSONResponse(
+            content={},
+            status_code=status.HTTP_404_NOT_FOUND,
+            headers=deadline.headers(),
+        )
+
+    return StreamingResponse(
+        prepend_chunk(first_chunk, chunks),
+        media_type=NDJSON_MEDIA_TYPE if ndjson else "application/json",
+    )
+
+
+async def iter_uniprot_details_batch(
+    list_request: DetailsListRequest,
+    deadline: Deadline,
+    include: Optional[Dict] = None,
+    ndjson: bool = False,
+) -> AsyncGenerator[bytes, None]:
+    """Yields the details of the accessions of a batch, in the order they are ready.
+
+    The details are read from the response cache of /uniprot/{qualifier}.json
+    first, the others are requested from the beacons and cached, see iter_batch.
+    Every result is serialized as soon as it is ready, so the batch holds at most
+    BATCH_CONCURRENCY results.
+
+    Args:
+        list_request (DetailsListRequest): List of UniProt accessions and options
+        deadline (Deadline): Latency budget of the batch
+        include (Dict, optional): Fields to include, see get_response_projection
+        ndjson (bool, optional): Yield one result per line rather than a JSON list
+
+    Yields:
+        bytes: A piece of the response, nothing if no accession has models.
+    """
+    provider, res_range = list_request.provider, list_request.res_range
+    residue_format, dedupe = list_request.residue_format, list_request.dedupe
+
+    def get_key(accession: str) -> str:
+        return get_details_cache_key(
+            accession,
+            provider,
+            res_range,
+            None,
+            residue_format,
+            dedupe,
+            list_request.fields,
+        )
+
+    def read_cached(key: str, cached: Any) -> Optional[bytes]:
+        return cached if isinstance(cached, bytes) else None
+
+    async def fetch(accession: str, key: str) -> Optional[bytes]:
+        accession_deadline = deadline.split()
+        result = await get_uniprot_helper(
+            accession,
+            provider,
+            None,
+            res_range,
+            None,
+            deadline=accession_deadline,
+            dedupe=dedupe,
+            bulkhead=BATCH_BULKHEAD,
+        )
+        deadline.incomplete.extend(accession_deadline.incomplete)
+        if not result:
+            return None
+
+        content = dump_json(
+            result,
+            UniprotDetails,
+            context={"residue_format": residue_format},
+            include=include,
+        )
+        # only the details every provider answered for are cached
+        if not accession_deadline.incomplete:
+            set_cached_response(key, content, DETAILS_CACHE_TTL)
+        return content
+
+    batch = iter_batch(
+        get_distinct_accessions(list_request.accessions),
+        get_key,
+        read_cached,
+        fetch,
+        deadline,
+    )
+    separator = b"["
+
+    try:
+        async for _, content in batch:
+            if content is None:
+                continue
+
+            if ndjson:
+                yield content + b"\n"
+            else:
+                yield separator + content
+                separator = b","
+    finally:
+        await batch.aclose()
+
+    if not ndjson and separator == b",":
+        yield b"]"
@@ -3,13 +3,39 @@ import functools
 import os
 import re
 import time
+from typing import Any, AsyncGenerator, Dict, List, Optional, Tuple
 
 import httpx
+from fastapi import Header, Query
+from pydantic import TypeAdapter
+from starlette.requests import Request
+from starlette.responses import Response
 
 from app import logger
+from app.bulkhead import INTERACTIVE_BULKHEAD, Bulkhead
+from app.circuit_breaker import CircuitBreaker
+from app.client import HttpClient
+from app.latency import (
+    HEDGED_REQUESTS,
+    MAX_REQUEST_TIMEOUT,
+    HedgeBudget,
+    LatencyTracker,
+    get_hedge_delay,
+)
 from app.version import __major__version__
+from worker.cache.utils import get_cached_responses, set_cached_response
 
 REQUEST_TIMEOUT = 5
+# leaves room for the adaptive timeouts of slow providers
+REQUEST_DEADLINE = float(os.getenv("REQUEST_DEADLINE", MAX_REQUEST_TIMEOUT))
+MAX_REQUEST_DEADLINE = float(os.getenv("MAX_REQUEST_DEADLINE", 30))
+BATCH_REQUEST_DEADLINE = float(os.getenv("BATCH_REQUEST_DEADLINE", 60))
+MAX_BATCH_REQUEST_DEADLINE = float(os.getenv("MAX_BATCH_REQUEST_DEADLINE", 300))
+
+# requests currently in flight in this process, keyed on the URL
+IN_FLIGHT_REQUESTS: Dict[str, asyncio.Future] = {}
+# number of callers awaiting each in-flight request
+IN_FLIGHT_WAITERS: Dict[asyncio.Future, int] = {}
 
 
 def timeit(fn):
@@ -24,54 +50,375 @@ def timeit(fn):
     return wrapper
 
 
+class Deadline:
+    """Latency budget of an API request, shared by all its beacon fan-outs.
+
+    Beacons which have not answered when the budget runs out are cancelled and
+    recorded in incomplete, so a partial result can be returned. Accessions of a
+    batch left out because it ran out of time or memory are recorded in skipped.
+    """
+
+    def __init__(self, budget: float):
+        self.expires_at = time.monotonic() + budget
+        self.incomplete: List[str] = []
+        self.skipped: List[str] = []
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def split(self) -> "Deadline":
+        """Returns a deadline expiring at the same time with its own incomplete
+        and skipped lists, to track one accession of a batch."""
+        deadline = Deadline(0)
+        deadline.expires_at = self.expires_at
+        return deadline
+
+    def headers(self) -> Dict[str, str]:
+        """Returns the response headers reporting the providers and accessions
+        left out."""
+        headers = {}
+        if self.incomplete:
+            headers["X-3DBeacons-Incomplete"] = ",".join(sorted(set(self.incomplete)))
+        if self.skipped:
+            headers["X-3DBeacons-Skipped"] = str(len(self.skipped))
+        return headers
+
+
+def get_deadline(
+    timeout: Optional[float] = Query(
+        None,
+        gt=0,
+        description="Seconds to wait for the beacons; providers which have not "
+        "answered by then are left out and listed in the X-3DBeacons-Incomplete "
+        "response header.",
+    ),
+    x_3dbeacons_timeout: Optional[float] = Header(None, gt=0, include_in_schema=False),
+) -> Deadline:
+    """FastAPI dependency returning the Deadline of a request.
+
+    The budget is taken from the timeout query parameter, the X-3DBeacons-Timeout
+    header or REQUEST_DEADLINE, in that order, capped at MAX_REQUEST_DEADLINE.
+    """
+    budget = timeout or x_3dbeacons_timeout or REQUEST_DEADLINE
+    return Deadline(min(budget, MAX_REQUEST_DEADLINE))
+
+
+def get_batch_deadline(
+    timeout: Optional[float] = Query(
+        None,
+        gt=0,
+        description="Seconds to wait for the whole batch; accessions which have "
+        "not been processed by then are left out and counted in the "
+        "X-3DBeacons-Skipped response header.",
+    ),
+    x_3dbeacons_timeout: Optional[float] = Header(None, gt=0, include_in_schema=False),
+) -> Deadline:
+    """FastAPI dependency returning the Deadline of a batch request.
+
+    As get_deadline, with BATCH_REQUEST_DEADLINE and MAX_BATCH_REQUEST_DEADLINE.
+    """
+    budget = timeout or x_3dbeacons_timeout or BATCH_REQUEST_DEADLINE
+    return Deadline(min(budget, MAX_BATCH_REQUEST_DEADLINE))
+
+
 # @timeit
-async def request_get(url: str):
+async def request_get(
+    url: str, timeout: float = REQUEST_TIMEOUT, provider: Optional[str] = None
+):
     """Makes an HTTP/HTTPS request and returns a response.
 
     Args:
         url (str): A request URL.
+        timeout (float, optional): Timeout in seconds.
+        provider (str, optional): Provider id, records the latency of the request
+            for the provider when passed.
 
     Returns:
         Response: A Response object.
     """
     response = None
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(url, timeout=REQUEST_TIMEOUT)
-        except httpx.TimeoutException:
-            logger.error(f"Timeout for {url}")
-        except httpx.HTTPError:
-            logger.error(f"Error while making a request to {url}", exc_info=True)
-        except Exception:
-            logger.error(
-                f"Unknown error while making a request to {url}", exc_info=True
-            )
-        finally:
-            await client.aclose()
-            return response
+    start = time.monotonic()
+    try:
+        hedge_delay = None
+        if provider:
+            HedgeBudget.record_request()
+            hedge_delay = get_hedge_delay(provider)
+
+        if hedge_delay is not None:
+            response = await hedged_get(url, timeout, provider, hedge_delay)
+        else:
+            response = await HttpClient.get_client().get(url, timeout=timeout)
+
+        if provider:
+            LatencyTracker.record(provider, time.monotonic() - start)
+    except asyncio.CancelledError:
+        # cut by a deadline, the request took at least this long
+        if provider:
+            LatencyTracker.record(provider, time.monotonic() - start)
+        raise
+    except httpx.TimeoutException:
+        if provider:
+            LatencyTracker.record(provider, timeout)
+        logger.error(f"Timeout for {url}")
+    except httpx.HTTPError as e:
+        logger.error(f"Error while making a request to {url}: {e!r}")
+    except Exception:
+        logger.error(f"Unknown error while making a request to {url}", exc_info=True)
+    finally:
+        HttpClient.update_pool_metrics()
+
+    return response
 
 
 async def request_post(url: str, data):
     response = None
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.post(url, timeout=REQUEST_TIMEOUT, data=data)
-        except httpx.TimeoutException:
-            logger.error(f"Timeout for {url}")
-        except httpx.HTTPError:
-            logger.error(f"Error while making a request to {url}", exc_info=True)
-        except Exception:
-            logger.error(
-                f"Unknown error while making a request to {url}", exc_info=True
+    try:
+        response = await HttpClient.get_client().post(
+            url, timeout=REQUEST_TIMEOUT, data=data
+        )
+    except httpx.TimeoutException:
+        logger.error(f"Timeout for {url}")
+    except httpx.HTTPError:
+        logger.error(f"Error while making a request to {url}", exc_info=True)
+    except Exception:
+        logger.error(f"Unknown error while making a request to {url}", exc_info=True)
+    finally:
+        HttpClient.update_pool_metrics()
+
+    return response
+
+
+async def hedged_get(url: str, timeout: float, provider: str, hedge_delay: float):
+    """Makes a GET request, sending a second identical one if the first has not
+    answered after hedge_delay seconds, and returns the first successful response.
+
+    Args:
+        url (str): A request URL.
+        timeout (float): Timeout of each attempt in seconds.
+        provider (str): Provider id of the URL.
+        hedge_delay (float): Seconds to wait before hedging.
+
+    Returns:
+        Response: A Response object.
+    """
+    client = HttpClient.get_client()
+    attempts = [asyncio.ensure_future(client.get(url, timeout=timeout))]
+    done, pending = await asyncio.wait(attempts, timeout=hedge_delay)
+
+    if done or not HedgeBudget.acquire():
+        return await attempts[0]
+
+    attempts.append(asyncio.ensure_future(client.get(url, timeout=timeout)))
+    pending = set(attempts)
+
+    try:
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for attempt in done:
+                if attempt.exception() is None:
+                    winner = "hedge" if attempt is attempts[1] else "first"
+                    HEDGED_REQUESTS.labels(provider=provider, winner=winner).inc()
+                    return attempt.result()
+
+        # both attempts failed, raise the error of the first one
+        return attempts[0].result()
+    finally:
+        for attempt in attempts:
+            attempt.cancel()
+
+
+async def bulkhead_request_get(
+    url: str, timeout: float, provider: Optional[str], bulkhead: Bulkhead
+):
+    """Makes an HTTP/HTTPS request once the bulkhead has a free slot for it."""
+    async with bulkhead.slot(provider):
+        return await request_get(url, timeout, provider)
+
+
+def forget_request(url: str, future: asyncio.Future) -> None:
+    """Removes a request from the in-flight requests, unless a newer request for
+    the URL replaced it."""
+    if IN_FLIGHT_REQUESTS.get(url) is future:
+        del IN_FLIGHT_REQUESTS[url]
+
+
+async def coalesced_request_get(
+    url: str,
+    timeout: float = REQUEST_TIMEOUT,
+    provider: Optional[str] = None,
+    bulkhead: Optional[Bulkhead] = None,
+):
+    """Makes an HTTP/HTTPS request, sharing it with concurrent callers.
+
+    Concurrent callers asking for the same URL await a single upstream request
+    instead of sending one each. The upstream request is cancelled once all its
+    callers have been cancelled.
+
+    Args:
+        url (str): A request URL.
+        timeout (float, optional): Timeout in seconds.
+        provider (str, optional): Provider id of the URL.
+        bulkhead (Bulkhead, optional): Bulkhead limiting the concurrent requests,
+            defaults to the interactive one.
+
+    Returns:
+        Response: A Response object.
+    """
+    future = IN_FLIGHT_REQUESTS.get(url)
+
+    if future is None:
+        future = asyncio.ensure_future(
+            bulkhead_request_get(
+                url, timeout, provider, bulkhead or INTERACTIVE_BULKHEAD
+            )
+        )
+        IN_FLIGHT_REQUESTS[url] = future
+        future.add_done_callback(functools.partial(forget_request, url))
+
+    IN_FLIGHT_WAITERS[future] = IN_FLIGHT_WAITERS.get(future, 0) + 1
+    try:
+        # a cancelled caller must not cancel the request for the others
+        return await asyncio.shield(future)
+    finally:
+        IN_FLIGHT_WAITERS[future] -= 1
+        if not IN_FLIGHT_WAITERS[future]:
+            del IN_FLIGHT_WAITERS[future]
+            if not future.done():
+                # nobody waits for it anymore, free its bulkhead slot and
+                # connection instead of running it to the timeout
+                forget_request(url, future)
+                future.cancel()
+
+
+async def iter_async_requests(
+    endpoints: List[str],
+    providers: Optional[List[str]] = None,
+    cache_ttl: int = 0,
+    deadline: Optional[Deadline] = None,
+    bulkhead: Optional[Bulkhead] = None,
+) -> AsyncGenerator[Tuple[int, Optional[httpx.Response]], None]:
+    """Requests all the endpoints concurrently and yields the responses as soon as
+    they arrive, so the consumer can release each of them before the next.
+
+    Args:
+        endpoints (List[str]): A list of request URLs.
+        providers (List[str], optional): The provider id of each endpoint. When
+            passed, providers with an open circuit are not requested.
+        cache_ttl (int, optional): Seconds to cache successful responses for,
+            keyed on the URL. Cached URLs are not requested again. Defaults to 0,
+            which disables the cache.
+        deadline (Deadline, optional): Latency budget. Requests still pending when
+            it expires are cancelled and their providers added to its incomplete
+            list.
+        bulkhead (Bulkhead, optional): Bulkhead limiting the concurrent requests,
+            defaults to the interactive one.
+
+    Yields:
+        Tuple: The position of an endpoint and its response, None for a failure.
+        The endpoints with an open circuit or left out by the deadline are not
+        yielded.
+    """
+    keys = [f"beacon-response:{x}" for x in endpoints]
+    missing = list(range(len(endpoints)))
+
+    if cache_ttl:
+        missing = []
+        for i, content in enumerate(get_cached_responses(keys)):
+            if content is None:
+                missing.append(i)
+            else:
+                yield (
+                    i,
+                    httpx.Response(
+                        200, content=content, request=httpx.Request("GET", endpoints[i])
+                    ),
+                )
+
+    if providers:
+        allowed = CircuitBreaker.allow_requests([providers[i] for i in missing])
+        missing = [i for i, allow in zip(missing, allowed) if allow]
+
+    tasks = {
+        asyncio.create_task(
+            coalesced_request_get(
+                endpoints[i],
+                LatencyTracker.get_timeout(providers[i], REQUEST_TIMEOUT),
+                providers[i],
+                bulkhead,
+            )
+            if providers
+            else coalesced_request_get(endpoints[i], bulkhead=bulkhead)
+        ): i
+        for i in missing
+    }
+    pending = set(tasks)
+
+    try:
+        while pending:
+            done, pending = await asyncio.wait(
+                pending,
+                timeout=deadline.remaining() if deadline is not None else None,
+                return_when=asyncio.FIRST_COMPLETED,
             )
-        finally:
-            await client.aclose()
-            return response
+            if not done:
+                # the deadline expired
+                deadline.incomplete.extend(
+                    providers[tasks[x]] if providers else endpoints[tasks[x]]
+                    for x in sorted(pending, key=tasks.__getitem__)
+                )
+                break
+
+            for task in sorted(done, key=tasks.__getitem__):
+                i = tasks[task]
+                response = task.result()
 
+                if providers:
+                    CircuitBreaker.record_result(
+                        providers[i],
+                        response is not None and response.status_code < 500,
+                    )
 
-async def send_async_requests(endpoints):
-    tasks = [asyncio.create_task(request_get(call)) for call in endpoints]
-    return await asyncio.gather(*tasks)
+                if cache_ttl and response is not None and response.status_code == 200:
+                    set_cached_response(keys[i], response.content, cache_ttl)
+
+                yield i, response
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def send_async_requests(
+    endpoints: List[str],
+    providers: Optional[List[str]] = None,
+    cache_ttl: int = 0,
+    deadline: Optional[Deadline] = None,
+    bulkhead: Optional[Bulkhead] = None,
+):
+    """Requests all the endpoints concurrently.
+
+    Args:
+        endpoints (List[str]): A list of request URLs.
+        providers (List[str], optional): The provider id of each endpoint, see
+            iter_async_requests.
+        cache_ttl (int, optional): Seconds to cache successful responses for,
+            see iter_async_requests.
+        deadline (Deadline, optional): Latency budget, see iter_async_requests.
+        bulkhead (Bulkhead, optional): Bulkhead limiting the concurrent requests,
+            defaults to the interactive one.
+
+    Returns:
+        List[Response]: Responses in the order of the endpoints, None for failures.
+    """
+    results: List[Optional[httpx.Response]] = [None] * len(endpoints)
+
+    async for i, response in iter_async_requests(
+        endpoints, providers, cache_ttl, deadline, bulkhead
+    ):
+        results[i] = response
+
+    return results
 
 
 def get_final_service_url(*parts):
@@ -89,6 +436,96 @@ def get_final_service_url(*parts):
         return url + f"?version={__major__version__}"
 
 
+def get_cache_key(prefix: str, qualifier: str, **params) -> str:
+    """Returns a canonical cache key for a qualifier and its query parameters.
+
+    Args:
+        prefix (str): A key prefix, e.g. the name of the endpoint.
+        qualifier (str): An accession or identifier.
+
+    Returns:
+        str: A key which does not depend on the order or case of the parameters.
+    """
+    parts = [prefix, str(qualifier).strip().upper()]
+    parts.extend(f"{k}={'' if v is None else v}" for k, v in sorted(params.items()))
+    return ":".join(parts)
+
+
+@functools.lru_cache(maxsize=None)
+def get_type_adapter(type_: Any) -> TypeAdapter:
+    """Returns a pydantic TypeAdapter for a type, built once per type.
+
+    Args:
+        type_ (Any): A model or a generic type such as List[model].
+    Returns:
+        TypeAdapter: The adapter validating and serializing the type.
+    """
+    return TypeAdapter(type_)
+
+
+def dump_json(
+    content: Any,
+    type_: Any,
+    exclude_unset: bool = False,
+    context: Optional[Dict] = None,
+    include: Optional[Dict] = None,
+) -> bytes:
+    """Serializes validated content straight to JSON bytes, using the field
+    aliases like FastAPI does.
+
+    Args:
+        content (Any): An instance of type_.
+        type_ (Any): The type content was validated as.
+        exclude_unset (bool, optional): Leave out the fields which were not set.
+        context (Dict, optional): Context passed to the model serializers.
+        include (Dict, optional): Fields to include, all of them by default.
+    Returns:
+        bytes: The JSON document.
+    """
+    return get_type_adapter(type_).dump_json(
+        content,
+        by_alias=True,
+        exclude_unset=exclude_unset,
+        context=context,
+        include=include,
+    )
+
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+def accepts_ndjson(request: Request) -> bool:
+    """Checks if the client asked for newline delimited JSON.
+
+    Args:
+        request (Request): The API request.
+    Returns:
+        bool: True if the Accept header lists application/x-ndjson.
+    """
+    accept = request.headers.get("accept", "")
+    return any(x.split(";")[0].strip() == NDJSON_MEDIA_TYPE for x in accept.split(","))
+
+
+def json_bytes_response(
+    content: bytes, status_code: int = 200, headers: Optional[Dict] = None
+) -> Response:
+    """Returns a response for a JSON document which is already serialized.
+
+    Args:
+        content (bytes): The JSON document.
+        status_code (int, optional): The HTTP status code.
+        headers (Dict, optional): Response headers.
+    Returns:
+        Response: The response.
+    """
+    return Response(
+        content=content,
+        status_code=status_code,
+        headers=headers,
+        media_type="application/json",
+    )
+
+
 def clean_args():
     def wrapper(func):
         @functools.wraps(func)
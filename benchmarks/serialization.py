@@ -0,0 +1,99 @@
+"""Compares the validation and serialization of a large UniProt details response.
+
+The "previous" path validates the first structure of every Beacon response, then
+the whole response again in UniprotDetails and encodes it with jsonable_encoder,
+as the API did before. The "current" path validates every response once with a
+cached TypeAdapter and dumps the result straight to JSON bytes.
+
+Usage:
+    python benchmarks/serialization.py [--providers 10] [--structures 20]
+"""
+
+import argparse
+import copy
+import json
+import os
+import sys
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+
+from app.uniprot.schema import Detailed, UniprotDetails, UniprotEntry  # noqa: E402
+from app.utils import dump_json, get_type_adapter  # noqa: E402
+
+
+def build_responses(providers: int, structures: int, residues: int):
+    with open(os.path.join(ROOT, "tests", "stubs", "uniprot.json")) as fp:
+        stub = json.load(fp)
+
+    structure = stub["structures"][0]
+    segment = structure["chains"][0]["segments"][0]
+    segment["residues"] = [
+        {
+            "model_residue_label": i,
+            "uniprot_residue_number": i,
+        }
+        for i in range(1, residues + 1)
+    ]
+    structure["chains"][0]["segments"] = [segment]
+
+    return [
+        {
+            "uniprot_entry": stub["uniprot_entry"],
+            "structures": [copy.deepcopy(structure) for _ in range(structures)],
+        }
+        for _ in range(providers)
+    ]
+
+
+def previous(responses):
+    final_structures = []
+    for item in responses:
+        Detailed(**item["structures"][0])
+        UniprotEntry(**item["uniprot_entry"])
+        final_structures.extend(item["structures"])
+
+    result = UniprotDetails(
+        uniprot_entry=UniprotEntry(**responses[0]["uniprot_entry"]),
+        structures=final_structures,
+    )
+    return json.dumps(
+        jsonable_encoder(result), ensure_ascii=False, separators=(",", ":")
+    ).encode()
+
+
+def current(responses):
+    adapter = get_type_adapter(UniprotDetails)
+    valid_result = [adapter.validate_python(item) for item in responses]
+
+    result = UniprotDetails.model_construct(
+        uniprot_entry=valid_result[0].uniprot_entry,
+        structures=[x for item in valid_result for x in item.structures],
+    )
+    return dump_json(result, UniprotDetails)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--providers", type=int, default=10)
+    parser.add_argument("--structures", type=int, default=20)
+    parser.add_argument("--residues", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    responses = build_responses(args.providers, args.structures, args.residues)
+    assert previous(responses) == current(responses)
+    print(f"response size: {len(current(responses)) / 1024:.0f} KiB")
+
+    for fn in (previous, current):
+        elapsed = min(
+            timeit.repeat(lambda: fn(responses), number=1, repeat=args.repeat)
+        )
+        print(f"{fn.__name__:>9}: {elapsed * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Measures the cold-start time of a worker, i.e. importing the application.
+
+Every run imports app.app in a fresh interpreter, with REGISTRY_DATA_JSON
+pointing to an address which never answers, so a registry read at import time
+would show up as a timeout rather than as a fast start.
+
+Usage:
+    python benchmarks/startup.py [--runs 10]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# non-routable address, requests to it hang until they time out
+UNREACHABLE_REGISTRY = "http://10.255.255.1/data.json"
+
+STARTUP_SCRIPT = """
+import time
+start = time.perf_counter()
+from app.app import app
+imported = time.perf_counter()
+app.openapi()
+print(imported - start, time.perf_counter() - imported)
+"""
+
+
+def run_once(timeout: float):
+    env = {
+        **os.environ,
+        "REGISTRY_DATA_JSON": UNREACHABLE_REGISTRY,
+        "REGISTRY_SNAPSHOT_FILE": os.path.join(ROOT, ".benchmark-registry.json"),
+    }
+    output = subprocess.run(
+        [sys.executable, "-c", STARTUP_SCRIPT],
+        cwd=ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+        timeout=timeout,
+        check=True,
+    )
+    import_time, openapi_time = output.stdout.split()[-2:]
+    return float(import_time), float(openapi_time)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--timeout", type=float, default=60)
+    args = parser.parse_args()
+
+    results = [run_once(args.timeout) for _ in range(args.runs)]
+    for name, values in zip(["import", "openapi"], zip(*results)):
+        print(
+            f"{name:>8}: median {statistics.median(values) * 1000:.1f} ms, "
+            f"max {max(values) * 1000:.1f} ms over {args.runs} runs"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,7 @@ from typing import List
 
 import pytest
 
+from app.uniprot.helper import SummaryIndexCache
 from app.uniprot.schema import UniprotSummary
 from tests.utils import StubResponse
 
@@ -17,6 +18,12 @@ class AsyncResult:
         return self.result
 
 
+@pytest.fixture(autouse=True)
+def clear_summary_indexes():
+    yield
+    SummaryIndexCache.clear()
+
+
 @pytest.fixture(scope="session")
 def invalid_uniprot():
     return "X0"
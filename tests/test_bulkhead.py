@@ -0,0 +1,84 @@
+import asyncio
+
+import pytest
+
+from app.bulkhead import Bulkhead
+
+
+async def run_requests(bulkhead: Bulkhead, providers):
+    in_flight = {"total": 0, "max": 0}
+
+    async def request(provider):
+        async with bulkhead.slot(provider):
+            in_flight["total"] += 1
+            in_flight["max"] = max(in_flight["max"], in_flight["total"])
+            await asyncio.sleep(0.01)
+            in_flight["total"] -= 1
+
+    await asyncio.gather(*[request(x) for x in providers])
+    return in_flight["max"]
+
+
+@pytest.fixture(autouse=True)
+def no_registry_limits(mocker):
+    mocker.patch("app.bulkhead.get_provider", return_value=None)
+
+
+@pytest.mark.asyncio
+async def test_bulkhead_total_limit():
+    bulkhead = Bulkhead("test", 3, 10)
+
+    assert await run_requests(bulkhead, ["a", "b", "c", None] * 3) == 3
+
+
+@pytest.mark.asyncio
+async def test_bulkhead_provider_limit():
+    bulkhead = Bulkhead("test", 10, 2)
+
+    assert await run_requests(bulkhead, ["pdbe"] * 6) == 2
+
+
+@pytest.mark.asyncio
+async def test_bulkhead_registry_limit(mocker):
+    mocker.patch("app.bulkhead.get_provider", return_value={"maxConcurrency": 1})
+    bulkhead = Bulkhead("test", 10, 5)
+
+    assert await run_requests(bulkhead, ["pdbe"] * 3) == 1
+
+
+@pytest.mark.asyncio
+async def test_bulkhead_saturated_provider_does_not_block_others():
+    bulkhead = Bulkhead("test", 3, 2)
+    release = asyncio.Event()
+
+    async def slow_request():
+        async with bulkhead.slot("slow"):
+            await release.wait()
+
+    slow = [asyncio.create_task(slow_request()) for _ in range(5)]
+    await asyncio.sleep(0)
+
+    async def fast_request():
+        async with bulkhead.slot("fast"):
+            pass
+
+    try:
+        # the queued slow requests must not hold the last total slot
+        await asyncio.wait_for(fast_request(), timeout=1)
+    finally:
+        release.set()
+        await asyncio.gather(*slow)
+
+
+@pytest.mark.asyncio
+async def test_bulkhead_registry_limit_change(mocker):
+    get_provider = mocker.patch(
+        "app.bulkhead.get_provider", return_value={"maxConcurrency": 1}
+    )
+    bulkhead = Bulkhead("test", 10, 5)
+
+    assert await run_requests(bulkhead, ["pdbe"] * 3) == 1
+
+    get_provider.return_value = {"maxConcurrency": 3}
+
+    assert await run_requests(bulkhead, ["pdbe"] * 3) == 3
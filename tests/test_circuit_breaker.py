@@ -0,0 +1,112 @@
+import pytest
+
+from app import circuit_breaker
+from app.circuit_breaker import CircuitBreaker
+
+
+@pytest.fixture(autouse=True)
+def local_circuits(mocker):
+    mocker.patch("worker.cache.utils.RedisCache.redis_client", None)
+    CircuitBreaker.circuits = {}
+
+
+@pytest.fixture
+def shared_circuits(mocker):
+    """Replaces Redis with a dict holding the circuit breaker hash and keys."""
+    store = {}
+    redis_mock = mocker.patch("worker.cache.utils.RedisCache.redis_client")
+
+    def hincrby(name, key, amount):
+        store[key] = int(store.get(key, 0)) + amount
+        return store[key]
+
+    def set_key(key, value, ex=None, nx=False):
+        if nx and key in store:
+            return None
+        store[key] = value
+        return True
+
+    redis_mock.hmget.side_effect = lambda name, keys: [store.get(x) for x in keys]
+    redis_mock.hincrby.side_effect = hincrby
+    redis_mock.hset.side_effect = lambda name, key, value: set_key(key, value)
+    redis_mock.hdel.side_effect = lambda name, *keys: len(
+        [store.pop(x) for x in keys if x in store]
+    )
+    redis_mock.set.side_effect = set_key
+    redis_mock.delete.side_effect = lambda key: int(store.pop(key, None) is not None)
+    return store
+
+
+def fail(provider, times):
+    for _ in range(times):
+        CircuitBreaker.record_result(provider, False)
+
+
+def test_circuit_closed_by_default():
+    assert CircuitBreaker.allow_requests(["pdbe", "alphafold"]) == [True, True]
+
+
+def test_circuit_opens_after_consecutive_failures():
+    fail("pdbe", circuit_breaker.CIRCUIT_FAILURE_THRESHOLD - 1)
+    assert CircuitBreaker.allow_requests(["pdbe"]) == [True]
+
+    fail("pdbe", 1)
+    assert CircuitBreaker.allow_requests(["pdbe", "alphafold"]) == [False, True]
+
+
+def test_circuit_success_resets_failures():
+    fail("pdbe", circuit_breaker.CIRCUIT_FAILURE_THRESHOLD - 1)
+    CircuitBreaker.record_result("pdbe", True)
+    fail("pdbe", 1)
+
+    assert CircuitBreaker.allow_requests(["pdbe"]) == [True]
+
+
+def test_circuit_half_open_allows_single_probe(mocker):
+    fail("pdbe", circuit_breaker.CIRCUIT_FAILURE_THRESHOLD)
+    mocker.patch("app.circuit_breaker.CIRCUIT_COOL_DOWN", 0)
+    assert CircuitBreaker.allow_requests(["pdbe"]) == [True]
+
+    mocker.patch("app.circuit_breaker.CIRCUIT_COOL_DOWN", 30)
+    assert CircuitBreaker.allow_requests(["pdbe"]) == [False]
+
+    CircuitBreaker.record_result("pdbe", True)
+    assert CircuitBreaker.allow_requests(["pdbe"]) == [True]
+
+
+def test_circuit_state_shared_through_redis(mocker):
+    mocker.patch(
+        "app.circuit_breaker.get_circuit_states",
+        return_value=[{"failures": 100, "opened_at": 1e12}],
+    )
+
+    assert CircuitBreaker.allow_requests(["pdbe"]) == [False]
+
+
+def test_circuit_failures_summed_across_workers(shared_circuits):
+    threshold = circuit_breaker.CIRCUIT_FAILURE_THRESHOLD
+
+    # every failure is counted once, whichever worker sees it
+    for _ in range(threshold - 1):
+        CircuitBreaker.circuits = {}
+        fail("pdbe", 1)
+    assert shared_circuits["pdbe:failures"] == threshold - 1
+    assert CircuitBreaker.allow_requests(["pdbe"]) == [True]
+
+    CircuitBreaker.circuits = {}
+    fail("pdbe", 1)
+    assert CircuitBreaker.allow_requests(["pdbe"]) == [False]
+
+
+def test_circuit_probe_claimed_by_single_worker(mocker, shared_circuits):
+    fail("pdbe", circuit_breaker.CIRCUIT_FAILURE_THRESHOLD)
+    mocker.patch("app.circuit_breaker.CIRCUIT_COOL_DOWN", 0)
+
+    # the second worker sees the half-open circuit but not the probe
+    assert CircuitBreaker.allow_requests(["pdbe"]) == [True]
+    CircuitBreaker.circuits = {}
+    assert CircuitBreaker.allow_requests(["pdbe"]) == [False]
+
+    CircuitBreaker.record_result("pdbe", True)
+    assert not shared_circuits
+    assert CircuitBreaker.allow_requests(["pdbe"]) == [True]
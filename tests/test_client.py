@@ -0,0 +1,75 @@
+import httpx
+import pytest
+
+from app.client import POOL_CONNECTIONS, HttpClient
+from app.utils import request_get
+
+
+@pytest.mark.asyncio
+async def test_http_client_is_shared():
+    HttpClient.init_client()
+    client = HttpClient.get_client()
+
+    HttpClient.init_client()
+    assert HttpClient.get_client() is client
+
+    await HttpClient.close_client()
+    assert HttpClient.client is None
+
+
+@pytest.mark.asyncio
+async def test_http_client_pool_stats_without_client():
+    await HttpClient.close_client()
+    assert HttpClient.pool_stats() == {"active": 0, "idle": 0}
+
+
+@pytest.mark.asyncio
+async def test_request_get_uses_shared_client(mocker):
+    response = httpx.Response(200, json={})
+    get_mock = mocker.patch.object(
+        httpx.AsyncClient, "get", return_value=response, autospec=True
+    )
+
+    assert await request_get("http://test") is response
+    assert await request_get("http://test") is response
+    assert len({call.args[0] for call in get_mock.call_args_list}) == 1
+
+    await HttpClient.close_client()
+
+
+@pytest.mark.asyncio
+async def test_request_get_timeout(mocker):
+    mocker.patch.object(
+        httpx.AsyncClient, "get", side_effect=httpx.ReadTimeout("timeout")
+    )
+
+    assert await request_get("http://test") is None
+
+    await HttpClient.close_client()
+
+
+@pytest.mark.asyncio
+async def test_http_client_pool_stats(mocker):
+    class Connection:
+        def __init__(self, idle):
+            self.idle = idle
+
+        def is_idle(self):
+            return self.idle
+
+    HttpClient.init_client()
+    pool = mocker.patch.object(HttpClient.client._transport, "_pool")
+    pool.connections = [Connection(True), Connection(False), Connection(False)]
+
+    assert HttpClient.pool_stats() == {"active": 2, "idle": 1}
+
+    HttpClient.update_pool_metrics()
+    assert POOL_CONNECTIONS.labels(state="active")._value.get() == 2
+
+    # the pool internals are private, missing attributes count as no connections
+    del HttpClient.client._transport
+    assert HttpClient.pool_stats() == {"active": 0, "idle": 0}
+
+    HttpClient.client = None
+    HttpClient.update_pool_metrics()
+    assert POOL_CONNECTIONS.labels(state="active")._value.get() == 0
@@ -0,0 +1,133 @@
+import copy
+import json
+
+import httpx
+import pytest
+
+from app.client import HttpClient
+from app.config import (
+    REGISTRY,
+    add_provider_enums,
+    clear_registry,
+    get_services,
+    is_valid_registry,
+    provider_enum,
+    read_data_file,
+    refresh_registry,
+)
+
+REGISTRY_URL = "http://registry.example.com/data.json"
+
+
+@pytest.fixture
+def snapshot_file(mocker, tmp_path):
+    filepath = str(tmp_path / "registry.json")
+    mocker.patch("app.config.REGISTRY_SNAPSHOT_FILE", filepath)
+    mocker.patch("app.config.REGISTRY_DATA_JSON", REGISTRY_URL)
+    clear_registry()
+    yield filepath
+    clear_registry()
+
+
+def mock_registry_server(mocker, handler):
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    mocker.patch.object(HttpClient, "client", client)
+
+
+def test_is_valid_registry(registry):
+    assert is_valid_registry(registry)
+    assert not is_valid_registry([])
+    assert not is_valid_registry({"providers": registry["providers"]})
+    assert not is_valid_registry({**registry, "services": [{"provider": "x"}]})
+
+
+def test_read_data_file_from_snapshot(snapshot_file, registry):
+    with open(snapshot_file, "w") as fp:
+        json.dump(registry, fp)
+
+    assert read_data_file() == registry
+
+
+def test_read_data_file_invalid_snapshot(snapshot_file):
+    with open(snapshot_file, "w") as fp:
+        fp.write("{")
+
+    # falls back to the bundled data file
+    assert read_data_file()["services"]
+
+
+@pytest.mark.asyncio
+async def test_refresh_registry(mocker, snapshot_file, registry):
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        if request.headers.get("If-None-Match") == '"v1"':
+            return httpx.Response(304)
+        return httpx.Response(200, json=registry, headers={"ETag": '"v1"'})
+
+    mock_registry_server(mocker, handler)
+    read_data_file()
+
+    assert await refresh_registry()
+    assert read_data_file() == registry
+    assert [x["provider"] for x in get_services("serviceOne")] == [
+        "providerOne",
+        "providerTwo",
+    ]
+    with open(snapshot_file) as fp:
+        assert json.load(fp) == registry
+
+    # revalidated with the ETag and kept as is
+    data = read_data_file()
+    assert not await refresh_registry()
+    assert requests[-1].headers["If-None-Match"] == '"v1"'
+    assert read_data_file() is data
+
+
+@pytest.mark.asyncio
+async def test_refresh_registry_invalid(mocker, snapshot_file):
+    mock_registry_server(mocker, lambda request: httpx.Response(200, json={}))
+    data = read_data_file()
+
+    assert not await refresh_registry()
+    assert read_data_file() is data
+    assert "etag" not in REGISTRY
+
+
+@pytest.mark.asyncio
+async def test_refresh_registry_unreachable(mocker, snapshot_file):
+    def handler(request):
+        raise httpx.ConnectError("unreachable")
+
+    mock_registry_server(mocker, handler)
+    data = read_data_file()
+
+    assert not await refresh_registry()
+    assert read_data_file() is data
+
+
+def test_add_provider_enums(mocker, registry):
+    mocker.patch("app.config.read_data_file", return_value=registry)
+    param = {"name": "provider", "schema": {"title": "Provider"}}
+    param["schema"].update(provider_enum("serviceOne"))
+
+    add_provider_enums({"paths": {"/test": {"get": {"parameters": [param]}}}})
+
+    assert param["schema"] == {
+        "title": "Provider",
+        "enum": ["providerOne", "providerTwo"],
+    }
+
+
+def test_openapi_rebuilt_on_registry_change(mocker, registry):
+    from app.app import app
+
+    read_data_file = mocker.patch("app.config.read_data_file", return_value=registry)
+    app.openapi_schema = None
+    schema = app.openapi()
+    assert app.openapi() is schema
+
+    read_data_file.return_value = copy.deepcopy(registry)
+    assert app.openapi() is not schema
+    app.openapi_schema = None
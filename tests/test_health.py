@@ -17,13 +17,11 @@ def client():
 
 @pytest.mark.asyncio
 @patch("app.health.health.get_services")
-@patch("app.health.health.get_base_service_url")
-@patch("app.health.health.get_final_service_url")
+@patch("app.health.health.get_service_url")
 @patch("app.health.health.send_async_requests", new_callable=AsyncMock)
 async def test_health_check_success(
     mock_send_async_requests,
-    mock_get_final_service_url,
-    mock_get_base_service_url,
+    mock_get_service_url,
     mock_get_services,
     client,
 ):
@@ -31,8 +29,7 @@ async def test_health_check_success(
     mock_get_services.return_value = [
         {"provider": "pdbe", "accessPoint": "/api/health"}
     ]
-    mock_get_base_service_url.return_value = "http://mocked"
-    mock_get_final_service_url.return_value = "http://mocked/api/health"
+    mock_get_service_url.return_value = "http://mocked/api/health"
 
     # Mock response from downstream service
     class MockResponse:
@@ -65,21 +62,18 @@ async def test_health_check_success(
 
 @pytest.mark.asyncio
 @patch("app.health.health.get_services")
-@patch("app.health.health.get_base_service_url")
-@patch("app.health.health.get_final_service_url")
+@patch("app.health.health.get_service_url")
 @patch("app.health.health.send_async_requests", new_callable=AsyncMock)
 async def test_health_check_failure(
     mock_send_async_requests,
-    mock_get_final_service_url,
-    mock_get_base_service_url,
+    mock_get_service_url,
     mock_get_services,
     client,
 ):
     mock_get_services.return_value = [
         {"provider": "pdbe", "accessPoint": "/api/health"}
     ]
-    mock_get_base_service_url.return_value = "http://mocked"
-    mock_get_final_service_url.return_value = "http://mocked/api/health"
+    mock_get_service_url.return_value = "http://mocked/api/health"
 
     class MockResponse:
         status_code = status.HTTP_500_INTERNAL_SERVER_ERROR
@@ -107,3 +101,25 @@ async def test_health_check_failure(
             "output": "Service is unhealthy, not able to reach the backend!",
         }
     ]
+
+
+@pytest.mark.asyncio
+@patch("app.health.health.get_services")
+@patch("app.health.health.get_service_url")
+@patch("app.health.health.send_async_requests", new_callable=AsyncMock)
+async def test_health_check_unreachable(
+    mock_send_async_requests,
+    mock_get_service_url,
+    mock_get_services,
+    client,
+):
+    mock_get_services.return_value = [
+        {"provider": "pdbe", "accessPoint": "/api/health"}
+    ]
+    mock_get_service_url.return_value = "http://mocked/api/health"
+    mock_send_async_requests.return_value = [None]
+
+    response = client.get("/health/")
+    assert response.status_code == status.HTTP_500_INTERNAL_SERVER_ERROR
+    assert response.json()[0]["status"] == "fail"
+    assert response.json()[0]["service_id"] == "pdbe"
@@ -1,10 +1,15 @@
 import asyncio
+import json
 
 import pytest
 from async_asgi_testclient import TestClient
 from starlette import status
 
 from app.app import app
+from app.ensembl.ensembl import get_ensembl_summary_helper
+from app.uniprot.helper import SummaryIndex, SummaryIndexCache, get_summary_cache_key
+from app.uniprot.schema import UniprotDetails, UniprotSummary
+from app.utils import Deadline, dump_json
 
 client = TestClient(app)
 
@@ -14,14 +19,12 @@ client = TestClient(app)
 async def test_get_uniprot_api(mocker, valid_uniprot, uniprot_details, registry):
     async with TestClient(app) as client:
         future = asyncio.Future()
-        future.set_result(uniprot_details)
+        future.set_result(UniprotDetails(**uniprot_details))
         mocker.patch(
             "app.uniprot.helper.get_services", return_value=registry["services"]
         )
         mocker.patch("app.uniprot.uniprot.get_uniprot_helper", return_value=future)
-        mocker.patch(
-            "app.uniprot.helper.get_base_service_url", return_value="http://test"
-        )
+        mocker.patch("app.uniprot.helper.get_service_url", return_value="http://test")
         response = await client.get(f"/uniprot/{valid_uniprot}.json")
         assert response.status_code == status.HTTP_200_OK
 
@@ -31,10 +34,10 @@ async def test_get_uniprot_summary_api(
     mocker, valid_uniprot, uniprot_summary, registry
 ):
     future = asyncio.Future()
-    future.set_result(uniprot_summary)
+    future.set_result(UniprotSummary(**uniprot_summary))
     mocker.patch("app.uniprot.helper.get_services", return_value=registry["services"])
     mocker.patch("app.uniprot.uniprot.get_uniprot_summary_helper", return_value=future)
-    mocker.patch("app.uniprot.helper.get_base_service_url", return_value="http://test")
+    mocker.patch("app.uniprot.helper.get_service_url", return_value="http://test")
     response = await client.get(f"/uniprot/summary/{valid_uniprot}.json")
     assert response.status_code == status.HTTP_200_OK
 
@@ -47,7 +50,7 @@ async def test_get_uniprot_summaries_api(mocker, uniprot_summary_obj_list, regis
     mocker.patch(
         "app.uniprot.uniprot.get_list_of_uniprot_summary_helper", return_value=future
     )
-    mocker.patch("app.uniprot.helper.get_base_service_url", return_value="http://test")
+    mocker.patch("app.uniprot.helper.get_service_url", return_value="http://test")
     response = await client.post(
         "/uniprot/summary", json={"accessions": ["P12345", "P23456"]}
     )
@@ -79,6 +82,71 @@ async def test_get_ensembl_summaries_api(
     assert response.status_code == status.HTTP_200_OK
 
 
+@pytest.mark.asyncio
+async def test_get_ensembl_summaries_api_cached_summary(
+    mocker, valid_gifts_response, uniprot_summary
+):
+    summary = UniprotSummary(**{**uniprot_summary, "structures": []})
+    summary.uniprot_entry.ac = "A0A8I5KS94"
+    SummaryIndexCache.set(
+        get_summary_cache_key("A0A8I5KS94"), SummaryIndex(summary), 60
+    )
+    mocker.patch(
+        "app.ensembl.ensembl.get_ensembl_mappings", return_value=valid_gifts_response
+    )
+    mocker.patch(
+        "app.uniprot.helper.get_cached_responses",
+        side_effect=lambda keys: [None] * len(keys),
+    )
+    mocker.patch(
+        "app.uniprot.helper.get_uniprot_summary_helper",
+        new=mocker.AsyncMock(return_value=None),
+    )
+    mocker.patch(
+        "app.ensembl.ensembl.get_uniprot_api_results",
+        new=mocker.AsyncMock(
+            return_value={
+                "A0A8I5KS94": {
+                    "protein": {"recommendedName": {"fullName": {"value": "NAME"}}}
+                }
+            }
+        ),
+    )
+
+    result = await get_ensembl_summary_helper("ENSG00000288864")
+
+    entry = result["uniprot_mappings"][0]["uniprot_accession"].uniprot_entry
+    assert entry.description == "NAME"
+    # the summary cached by the worker is left untouched
+    assert summary.uniprot_entry.description is None
+    assert "description" not in summary.uniprot_entry.model_fields_set
+
+
+@pytest.mark.asyncio
+async def test_get_ensembl_summary_uniprot_lookups(
+    mocker, valid_gifts_response, uniprot_summary_obj_list
+):
+    mocker.patch(
+        "app.ensembl.ensembl.get_ensembl_mappings", return_value=valid_gifts_response
+    )
+    mocker.patch(
+        "app.ensembl.ensembl.get_list_of_uniprot_summary_helper",
+        new=mocker.AsyncMock(return_value=uniprot_summary_obj_list[:1]),
+    )
+    api_mock = mocker.patch(
+        "app.ensembl.ensembl.get_uniprot_api_results",
+        new=mocker.AsyncMock(return_value={}),
+    )
+    deadline = Deadline(1)
+
+    result = await get_ensembl_summary_helper("ENSG00000288864", deadline=deadline)
+
+    # only the accession with models is looked up, within the deadline
+    api_mock.assert_called_once_with(["A0A8I5KS94"], deadline=deadline)
+    entry = result["uniprot_mappings"][0]["uniprot_accession"].uniprot_entry
+    assert "description" not in entry.model_fields_set
+
+
 @pytest.mark.asyncio
 async def test_annotations_api(
     mocker, valid_annotation_response, registry, valid_uniprot
@@ -92,7 +160,357 @@ async def test_annotations_api(
         "app.annotations.annotations.get_annotations_api_helper", return_value=future
     )
     mocker.patch(
-        "app.annotations.annotations.get_base_service_url", return_value="http://test"
+        "app.annotations.annotations.get_service_url", return_value="http://test"
     )
     response = await client.get(f"/annotations/{valid_uniprot}.json?type=DOMAIN")
     assert response.status_code == status.HTTP_200_OK
+
+
+@pytest.mark.asyncio
+async def test_get_uniprot_summary_api_cache_hit(mocker, valid_uniprot):
+    mocker.patch(
+        "app.uniprot.uniprot.get_cached_response",
+        return_value=b'{"uniprot_entry": {"ac": "%s"}, "structures": []}'
+        % valid_uniprot.encode(),
+    )
+    helper_mock = mocker.patch("app.uniprot.uniprot.get_uniprot_summary_helper")
+
+    response = await client.get(f"/uniprot/summary/{valid_uniprot}.json")
+
+    helper_mock.assert_not_called()
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["X-Cache"] == "HIT"
+    assert response.json()["uniprot_entry"]["ac"] == valid_uniprot
+
+
+@pytest.mark.asyncio
+async def test_get_uniprot_summary_api_cache_miss(
+    mocker, valid_uniprot, uniprot_summary
+):
+    future = asyncio.Future()
+    future.set_result(UniprotSummary(**uniprot_summary))
+    mocker.patch("app.uniprot.uniprot.get_cached_response", return_value=None)
+    set_mock = mocker.patch("app.uniprot.uniprot.set_cached_response")
+    mocker.patch("app.uniprot.uniprot.get_uniprot_summary_helper", return_value=future)
+
+    response = await client.get(
+        f"/uniprot/summary/{valid_uniprot}.json?provider=pdbe&range=1-50"
+    )
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["X-Cache"] == "MISS"
+    set_mock.assert_called_once()
+    # the full summary is cached, whatever the range
+    assert set_mock.call_args.args[0] == (
+        f"uniprot-summary:{valid_uniprot}:exclude_provider=:provider=pdbe:"
+        "uniprot_checksum="
+    )
+
+
+@pytest.mark.asyncio
+async def test_get_uniprot_summary_api_incomplete(
+    mocker, valid_uniprot, uniprot_summary
+):
+    async def summary_helper(*args, deadline=None):
+        deadline.incomplete.extend(["ped", "alphafold"])
+        return UniprotSummary(**uniprot_summary)
+
+    mocker.patch("app.uniprot.uniprot.get_cached_response", return_value=None)
+    set_mock = mocker.patch("app.uniprot.uniprot.set_cached_response")
+    mocker.patch(
+        "app.uniprot.uniprot.get_uniprot_summary_helper", side_effect=summary_helper
+    )
+
+    response = await client.get(
+        f"/uniprot/summary/{valid_uniprot}.json", headers={"X-3DBeacons-Timeout": "1"}
+    )
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["X-3DBeacons-Incomplete"] == "alphafold,ped"
+    set_mock.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_annotations_api_incomplete(
+    mocker, valid_annotation_response, valid_uniprot
+):
+    async def annotations_helper(*args, deadline=None):
+        deadline.incomplete.append("pdbe")
+        return valid_annotation_response
+
+    mocker.patch(
+        "app.annotations.annotations.get_annotations_api_helper",
+        side_effect=annotations_helper,
+    )
+
+    response = await client.get(
+        f"/annotations/{valid_uniprot}.json?type=DOMAIN&timeout=2"
+    )
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["X-3DBeacons-Incomplete"] == "pdbe"
+
+
+@pytest.mark.asyncio
+async def test_get_uniprot_api_stream(mocker, valid_uniprot):
+    async def stream_helper(*args, **kwargs):
+        return iter([b'{"uniprot_entry":{},', b'"structures":[]}'])
+
+    mocker.patch("app.uniprot.uniprot.get_cached_response", return_value=None)
+    set_mock = mocker.patch("app.uniprot.uniprot.set_cached_response")
+    mocker.patch("app.uniprot.uniprot.stream_uniprot_helper", side_effect=stream_helper)
+
+    response = await client.get(f"/uniprot/{valid_uniprot}.json?stream=true")
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == {"uniprot_entry": {}, "structures": []}
+    set_mock.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_get_uniprot_summary_api_ranges(mocker, valid_uniprot, uniprot_summary):
+    future = asyncio.Future()
+    future.set_result(UniprotSummary(**uniprot_summary))
+    mocker.patch("app.uniprot.uniprot.get_cached_response", return_value=None)
+    set_mock = mocker.patch("app.uniprot.uniprot.set_cached_response")
+    helper_mock = mocker.patch(
+        "app.uniprot.uniprot.get_uniprot_summary_helper", return_value=future
+    )
+
+    url = f"/uniprot/summary/{valid_uniprot}.json"
+    first = await client.get(f"{url}?range=300-360")
+    second = await client.get(f"{url}?range=350-360")
+    third = await client.get(f"{url}?range=400-500")
+
+    # one fan-out and one cached summary for all the ranges
+    helper_mock.assert_called_once()
+    set_mock.assert_called_once()
+    assert first.headers["X-Cache"] == "MISS"
+    assert len(first.json()["structures"]) == 2
+    assert second.headers["X-Cache"] == "HIT"
+    assert [x["summary"]["model_identifier"] for x in second.json()["structures"]] == [
+        "6mxt"
+    ]
+    assert third.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.asyncio
+async def test_get_uniprot_summary_api_cached_template(
+    mocker, valid_uniprot, uniprot_summary
+):
+    cached = dump_json(
+        UniprotSummary(**uniprot_summary), UniprotSummary, exclude_unset=True
+    )
+    mocker.patch("app.uniprot.uniprot.get_cached_response", return_value=cached)
+    helper_mock = mocker.patch("app.uniprot.uniprot.get_uniprot_summary_helper")
+
+    response = await client.get(f"/uniprot/summary/{valid_uniprot}.json?template=4lde")
+
+    helper_mock.assert_not_called()
+    assert response.headers["X-Cache"] == "HIT"
+    assert [
+        x["summary"]["model_identifier"] for x in response.json()["structures"]
+    ] == ["4lde"]
+
+
+@pytest.mark.asyncio
+async def test_get_uniprot_summary_api_page(mocker, valid_uniprot, uniprot_summary):
+    cached = dump_json(
+        UniprotSummary(**uniprot_summary), UniprotSummary, exclude_unset=True
+    )
+    mocker.patch("app.uniprot.uniprot.get_cached_response", return_value=cached)
+
+    response = await client.get(
+        f"/uniprot/summary/{valid_uniprot}.json?sort=coverage&limit=1"
+    )
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["X-Total-Count"] == "2"
+    assert len(response.json()["structures"]) == 1
+
+
+@pytest.mark.asyncio
+async def test_get_uniprot_summary_api_fields(mocker, valid_uniprot, uniprot_summary):
+    cached = dump_json(
+        UniprotSummary(**uniprot_summary), UniprotSummary, exclude_unset=True
+    )
+    mocker.patch("app.uniprot.uniprot.get_cached_response", return_value=cached)
+
+    response = await client.get(
+        f"/uniprot/summary/{valid_uniprot}.json?fields=model_identifier,provider"
+    )
+    invalid = await client.get(f"/uniprot/summary/{valid_uniprot}.json?fields=foo")
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == {
+        "uniprot_entry": uniprot_summary["uniprot_entry"],
+        "structures": [
+            {
+                "summary": {
+                    "model_identifier": x["summary"]["model_identifier"],
+                    "provider": x["summary"]["provider"],
+                }
+            }
+            for x in uniprot_summary["structures"]
+        ],
+    }
+    assert invalid.status_code == status.HTTP_400_BAD_REQUEST
+    assert invalid.json() == {"message": "Unknown field foo"}
+
+
+@pytest.mark.asyncio
+async def test_get_uniprot_api_fields(mocker, valid_uniprot, uniprot_details):
+    future = asyncio.Future()
+    future.set_result(UniprotDetails(**uniprot_details))
+    mocker.patch("app.uniprot.uniprot.get_cached_response", return_value=None)
+    set_mock = mocker.patch("app.uniprot.uniprot.set_cached_response")
+    mocker.patch("app.uniprot.uniprot.get_uniprot_helper", return_value=future)
+
+    response = await client.get(
+        f"/uniprot/{valid_uniprot}.json?fields=chains.chain_id, model_identifier"
+    )
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["structures"] == [
+        {
+            "summary": {"model_identifier": x["summary"]["model_identifier"]},
+            "chains": [{"chain_id": y["chain_id"]} for y in x["chains"]],
+        }
+        for x in uniprot_details["structures"]
+    ]
+    # the fields are part of the cache key
+    assert "chains.chain_id,model_identifier" in set_mock.call_args.args[0]
+
+
+@pytest.mark.asyncio
+async def test_get_uniprot_summary_api_dedupe(mocker, valid_uniprot, uniprot_summary):
+    copy = {**uniprot_summary["structures"][0]}
+    copy["summary"] = {**copy["summary"], "provider": "swissmodel"}
+    summary = UniprotSummary(
+        uniprot_entry=uniprot_summary["uniprot_entry"],
+        structures=[copy, *uniprot_summary["structures"]],
+    )
+    cached = dump_json(summary, UniprotSummary, exclude_unset=True)
+    mocker.patch("app.uniprot.uniprot.get_cached_response", return_value=cached)
+
+    response = await client.get(f"/uniprot/summary/{valid_uniprot}.json?dedupe=true")
+
+    assert response.status_code == status.HTTP_200_OK
+    assert [
+        (x["summary"]["model_identifier"], x["summary"]["provider"])
+        for x in response.json()["structures"]
+    ] == [("4lde", "PDBe"), ("6mxt", "PDBe")]
+
+
+@pytest.mark.asyncio
+async def test_get_uniprot_coverage_api(mocker, valid_uniprot, uniprot_summary):
+    cached = dump_json(
+        UniprotSummary(**uniprot_summary), UniprotSummary, exclude_unset=True
+    )
+    mocker.patch("app.uniprot.uniprot.get_cached_response", return_value=cached)
+
+    response = await client.get(f"/uniprot/coverage/{valid_uniprot}.json")
+
+    assert response.status_code == status.HTTP_200_OK
+    content = response.json()
+    assert content["sequence_length"] == 413
+    assert content["total"] == [0] * 28 + [2] * 320 + [1] * 17 + [0] * 48
+    assert content["coverage"]["EXPERIMENTALLY DETERMINED"] == content["total"]
+    assert content["coverage"]["TEMPLATE-BASED"] == [0] * 413
+
+
+@pytest.mark.asyncio
+async def test_get_uniprot_covering_set_api(mocker, valid_uniprot, uniprot_summary):
+    cached = dump_json(
+        UniprotSummary(**uniprot_summary), UniprotSummary, exclude_unset=True
+    )
+    mocker.patch("app.uniprot.uniprot.get_cached_response", return_value=cached)
+
+    response = await client.get(
+        f"/uniprot/covering-set/{valid_uniprot}.json?fields=model_identifier"
+    )
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == {
+        "uniprot_entry": uniprot_summary["uniprot_entry"],
+        "sequence_length": 413,
+        "covered": 337,
+        "structures": [{"summary": {"model_identifier": "6mxt"}}],
+        "gaps": [{"start": 1, "end": 28}, {"start": 366, "end": 413}],
+    }
+
+
+@pytest.mark.asyncio
+async def test_get_uniprot_summaries_api_ndjson(mocker, uniprot_summary):
+    summary = UniprotSummary(**uniprot_summary)
+    mocker.patch(
+        "app.uniprot.helper.get_uniprot_summary_helper",
+        new=mocker.AsyncMock(side_effect=[summary, None, summary]),
+    )
+
+    response = await client.post(
+        "/uniprot/summary",
+        json={"accessions": ["P1", "P2", "P3"], "limit": 1},
+        headers={"Accept": "application/x-ndjson"},
+    )
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"] == "application/x-ndjson"
+    lines = response.content.splitlines()
+    # one summary per line, accessions without models are left out
+    assert len(lines) == 2
+    assert [len(json.loads(x)["structures"]) for x in lines] == [1, 1]
+
+
+@pytest.mark.asyncio
+async def test_get_uniprot_details_batch_api(mocker, uniprot_details):
+    details = UniprotDetails(**uniprot_details)
+    cached = dump_json(details, UniprotDetails)
+    mocker.patch(
+        "app.uniprot.helper.get_cached_responses",
+        side_effect=lambda keys: [cached if ":P1:" in x else None for x in keys],
+    )
+    set_mock = mocker.patch("app.uniprot.uniprot.set_cached_response")
+    helper_mock = mocker.patch(
+        "app.uniprot.uniprot.get_uniprot_helper",
+        new=mocker.AsyncMock(side_effect=lambda q, *args, **kwargs: details),
+    )
+    body = {"accessions": ["P1", "P2", "p1"], "range": "1-500"}
+
+    response = await client.post("/uniprot/details", json=body)
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == [json.loads(cached)] * 2
+    # the cached accession is not requested again
+    assert [x.args[0] for x in helper_mock.call_args_list] == ["P2"]
+    assert helper_mock.call_args.args[3] == "1-500"
+    assert set_mock.call_count == 1
+
+    response = await client.post(
+        "/uniprot/details",
+        json={**body, "fields": "model_identifier"},
+        headers={"Accept": "application/x-ndjson"},
+    )
+
+    assert response.headers["content-type"] == "application/x-ndjson"
+    lines = [json.loads(x) for x in response.content.splitlines()]
+    assert len(lines) == 2
+    assert {"structures": [{"summary": {"model_identifier": "4lde"}}]} in [
+        {"structures": x["structures"]} for x in lines
+    ]
+
+
+@pytest.mark.asyncio
+async def test_get_uniprot_details_batch_api_empty(mocker):
+    mocker.patch(
+        "app.uniprot.uniprot.get_uniprot_helper",
+        new=mocker.AsyncMock(return_value=None),
+    )
+
+    response = await client.post("/uniprot/details", json={"accessions": ["P1"]})
+    invalid = await client.post(
+        "/uniprot/details", json={"accessions": ["P1"], "fields": "foo"}
+    )
+
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+    assert invalid.status_code == status.HTTP_400_BAD_REQUEST
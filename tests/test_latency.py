@@ -0,0 +1,140 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app.latency import HedgeBudget, LatencyTracker, get_hedge_delay
+from app.utils import hedged_get, request_get
+
+
+@pytest.fixture(autouse=True)
+def clear_latencies(mocker):
+    mocker.patch("app.latency.get_provider", return_value=None)
+    LatencyTracker.clear()
+
+
+def test_percentile_needs_min_samples():
+    LatencyTracker.record("pdbe", 0.1)
+
+    assert LatencyTracker.percentile("pdbe", 99) is None
+    assert LatencyTracker.get_timeout("pdbe", 5) == 5
+
+
+def test_timeout_from_p99():
+    for i in range(1, 101):
+        LatencyTracker.record("pdbe", i / 100)
+
+    assert LatencyTracker.percentile("pdbe", 50) == 0.5
+    assert LatencyTracker.percentile("pdbe", 99) == 0.99
+    assert LatencyTracker.get_timeout("pdbe", 5) == pytest.approx(1.99)
+
+
+def test_timeout_bounds(mocker):
+    mocker.patch("app.latency.MIN_REQUEST_TIMEOUT", 2)
+    for _ in range(100):
+        LatencyTracker.record("fast", 0.01)
+        LatencyTracker.record("slow", 60)
+
+    assert LatencyTracker.get_timeout("fast", 5) == 2
+    assert LatencyTracker.get_timeout("slow", 5) == 10
+
+
+def test_timeout_registry_override(mocker):
+    mocker.patch("app.latency.get_provider", return_value={"timeout": 20})
+    for _ in range(100):
+        LatencyTracker.record("pdbe", 0.01)
+
+    assert LatencyTracker.get_timeout("pdbe", 5) == 20
+
+
+@pytest.mark.asyncio
+async def test_request_get_records_timeout(mocker):
+    mocker.patch.object(
+        httpx.AsyncClient, "get", side_effect=httpx.ReadTimeout("timeout")
+    )
+
+    assert await request_get("http://test", timeout=3, provider="pdbe") is None
+    assert list(LatencyTracker.samples["pdbe"]) == [3]
+
+
+@pytest.mark.asyncio
+async def test_request_get_records_cancelled(mocker):
+    async def slow_get(*args, **kwargs):
+        await asyncio.sleep(1)
+
+    mocker.patch.object(httpx.AsyncClient, "get", side_effect=slow_get)
+
+    task = asyncio.create_task(request_get("http://test", provider="pdbe"))
+    await asyncio.sleep(0.05)
+    task.cancel()
+
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    # the time waited until the deadline is recorded as a latency
+    assert 0.05 <= LatencyTracker.samples["pdbe"][0] < 1
+
+
+def test_hedge_budget(mocker):
+    mocker.patch.object(HedgeBudget, "tokens", 0)
+
+    for _ in range(40):
+        HedgeBudget.record_request()
+
+    assert HedgeBudget.acquire()
+    assert HedgeBudget.acquire()
+    assert not HedgeBudget.acquire()
+
+
+def test_hedge_budget_burst(mocker):
+    mocker.patch.object(HedgeBudget, "tokens", 0)
+
+    # a long healthy period without hedges
+    for _ in range(100000):
+        HedgeBudget.record_request()
+
+    hedges = 0
+    for _ in range(100):
+        HedgeBudget.record_request()
+        hedges += HedgeBudget.acquire()
+
+    # the burst is capped, then hedges follow HEDGE_BUDGET of the requests
+    assert 10 <= hedges <= 15
+
+
+def test_get_hedge_delay(mocker):
+    for i in range(1, 101):
+        LatencyTracker.record("pdbe", i / 100)
+
+    assert get_hedge_delay("pdbe") is None
+
+    mocker.patch("app.latency.get_provider", return_value={"hedge": True})
+    assert get_hedge_delay("pdbe") == 0.95
+
+
+@pytest.mark.asyncio
+async def test_hedged_get_returns_first_success(mocker):
+    mocker.patch("app.utils.HedgeBudget.acquire", return_value=True)
+    calls = []
+
+    async def get(self, url, timeout):
+        calls.append(url)
+        await asyncio.sleep(1 if len(calls) == 1 else 0)
+        return httpx.Response(200, content=str(len(calls)).encode())
+
+    mocker.patch.object(httpx.AsyncClient, "get", get)
+
+    response = await hedged_get("http://test", 5, "pdbe", 0.01)
+
+    assert len(calls) == 2
+    assert response.content == b"2"
+
+
+@pytest.mark.asyncio
+async def test_hedged_get_without_budget(mocker):
+    mocker.patch("app.utils.HedgeBudget.acquire", return_value=False)
+    get_mock = mocker.patch.object(
+        httpx.AsyncClient, "get", return_value=httpx.Response(200)
+    )
+
+    assert (await hedged_get("http://test", 5, "pdbe", 0)).status_code == 200
+    get_mock.assert_called_once()
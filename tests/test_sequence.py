@@ -147,14 +147,9 @@ async def test_submit_sequence_search_job_invalid(mocker, sample_sequence):
                     {"provider": "test_provider", "accessPoint": "test_access"}
                 ],
             )
-            # Mock get_base_service_url to return a base url
+            # Mock get_service_url to return a final url
             mocker.patch(
-                "app.sequence.sequence.get_base_service_url",
-                return_value="http://test-service",
-            )
-            # Mock get_final_service_url to return a final url
-            mocker.patch(
-                "app.sequence.sequence.get_final_service_url",
+                "app.sequence.sequence.get_service_url",
                 return_value="http://test-service/test_access?id=abc&type=sequence",
             )
             # Prepare a valid response
@@ -209,11 +204,7 @@ async def test_submit_sequence_search_job_invalid(mocker, sample_sequence):
                 ],
             )
             mocker.patch(
-                "app.sequence.sequence.get_base_service_url",
-                return_value="http://test-service",
-            )
-            mocker.patch(
-                "app.sequence.sequence.get_final_service_url",
+                "app.sequence.sequence.get_service_url",
                 return_value="http://test-service/test_access?id=abc&type=sequence",
             )
 
@@ -240,11 +231,7 @@ async def test_submit_sequence_search_job_invalid(mocker, sample_sequence):
                 ],
             )
             mocker.patch(
-                "app.sequence.sequence.get_base_service_url",
-                return_value="http://test-service",
-            )
-            mocker.patch(
-                "app.sequence.sequence.get_final_service_url",
+                "app.sequence.sequence.get_service_url",
                 return_value="http://test-service/test_access?id=abc&type=sequence",
             )
             # Prepare a response with an invalid structure (will raise ValidationError)
@@ -0,0 +1,666 @@
+import asyncio
+import copy
+import json
+
+import httpx
+import pytest
+from fastapi.encoders import jsonable_encoder
+
+from app.uniprot.helper import (
+    SummaryIndex,
+    dedupe_structures,
+    get_field_projection,
+    get_list_of_uniprot_summary_helper,
+    get_model_quality,
+    get_residue_coverage,
+    get_sequence_length,
+    get_uniprot_summary_helper,
+    matches_template,
+    rank_structures,
+    select_covering_set,
+    slice_segment,
+    slice_structures,
+)
+from app.uniprot.schema import (
+    AccessionListRequest,
+    ConfidenceType,
+    Detailed,
+    ModelCategory,
+    Overview,
+    ResidueFormat,
+    Segment,
+    SummarySort,
+    UniprotDetails,
+    UniprotSummary,
+)
+from app.uniprot.uniprot import get_uniprot_helper, stream_uniprot_helper
+from app.utils import Deadline, dump_json
+
+
+def to_json(content) -> bytes:
+    # serialized the way JSONResponse does
+    return json.dumps(content, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+def beacon_responses(*payloads):
+    request = httpx.Request("GET", "http://test")
+    return [httpx.Response(200, json=x, request=request) for x in payloads]
+
+
+def mock_beacon_requests(mocker, responses):
+    async def iter_async_requests(*args, **kwargs):
+        for item in enumerate(responses):
+            yield item
+
+    mocker.patch("app.uniprot.uniprot.send_async_requests", return_value=responses)
+    mocker.patch("app.uniprot.uniprot.iter_async_requests", new=iter_async_requests)
+
+
+async def read_stream(*args, **kwargs):
+    return [x async for x in await stream_uniprot_helper(*args, **kwargs)]
+
+
+@pytest.mark.asyncio
+async def test_get_uniprot_summary_helper(mocker, registry, uniprot_summary):
+    invalid = copy.deepcopy(uniprot_summary)
+    invalid["structures"][0]["summary"].pop("model_identifier")
+    mocker.patch("app.uniprot.helper.get_services", return_value=registry["services"])
+    mocker.patch("app.uniprot.helper.get_service_url", return_value="http://test")
+    mocker.patch(
+        "app.uniprot.helper.send_async_requests",
+        return_value=beacon_responses(uniprot_summary, invalid),
+    )
+
+    result = await get_uniprot_summary_helper("P0DTD1")
+
+    # only the erroneous structure is left out
+    expected = UniprotSummary(
+        uniprot_entry=uniprot_summary["uniprot_entry"],
+        structures=uniprot_summary["structures"] + invalid["structures"][1:],
+    )
+    assert dump_json(result, UniprotSummary, exclude_unset=True) == to_json(
+        jsonable_encoder(expected, exclude_unset=True)
+    )
+
+
+@pytest.mark.asyncio
+async def test_get_uniprot_helper(mocker, registry, uniprot_details):
+    invalid = copy.deepcopy(uniprot_details)
+    invalid["structures"][0].pop("chains")
+    mocker.patch(
+        "app.uniprot.uniprot.get_services", return_value=registry["services"][:2]
+    )
+    mocker.patch("app.uniprot.uniprot.get_service_url", return_value="http://test")
+    mock_beacon_requests(mocker, beacon_responses(invalid, uniprot_details))
+
+    result = await get_uniprot_helper("P0DTD1")
+
+    # the erroneous response is left out, the other one is returned as is
+    assert dump_json(result, UniprotDetails) == to_json(
+        jsonable_encoder(UniprotDetails(**uniprot_details))
+    )
+
+
+@pytest.mark.asyncio
+async def test_stream_uniprot_helper(mocker, registry, uniprot_details):
+    invalid = copy.deepcopy(uniprot_details)
+    invalid["structures"][0].pop("chains")
+    other = copy.deepcopy(uniprot_details)
+    other["structures"][0]["summary"]["provider"] = "other"
+    responses = beacon_responses(invalid, uniprot_details, other)
+    mocker.patch("app.uniprot.uniprot.get_services", return_value=registry["services"])
+    mocker.patch("app.uniprot.uniprot.get_service_url", return_value="http://test")
+    mock_beacon_requests(mocker, responses)
+
+    chunks = await read_stream("P0DTD1")
+
+    # one piece per valid response and the end of the document
+    assert len(chunks) == 3
+    assert json.loads(b"".join(chunks)) == json.loads(
+        dump_json(await get_uniprot_helper("P0DTD1"), UniprotDetails)
+    )
+
+
+@pytest.mark.asyncio
+async def test_stream_uniprot_helper_no_valid_response(
+    mocker, registry, uniprot_details
+):
+    invalid = copy.deepcopy(uniprot_details)
+    invalid["structures"][0].pop("chains")
+    mocker.patch(
+        "app.uniprot.uniprot.get_services", return_value=registry["services"][:1]
+    )
+    mocker.patch("app.uniprot.uniprot.get_service_url", return_value="http://test")
+    mock_beacon_requests(mocker, beacon_responses(invalid))
+
+    assert await stream_uniprot_helper("P0DTD1") is None
+
+
+def test_columnar_residues(uniprot_details):
+    details = UniprotDetails(**uniprot_details)
+    segment = uniprot_details["structures"][0]["chains"][0]["segments"][0]
+
+    content = json.loads(
+        dump_json(
+            details,
+            UniprotDetails,
+            context={"residue_format": ResidueFormat.COLUMNAR},
+        )
+    )
+
+    residues = content["structures"][0]["chains"][0]["segments"][0]["residues"]
+    assert residues == {
+        "confidence": [x.get("confidence") for x in segment["residues"]],
+        "model_residue_label": [x["model_residue_label"] for x in segment["residues"]],
+        "uniprot_residue_number": [
+            x["uniprot_residue_number"] for x in segment["residues"]
+        ],
+    }
+    # the rest of the response is left as is
+    expected = json.loads(dump_json(details, UniprotDetails))
+    assert content["uniprot_entry"] == expected["uniprot_entry"]
+    assert content["structures"][0]["summary"] == expected["structures"][0]["summary"]
+
+
+@pytest.mark.asyncio
+async def test_stream_uniprot_helper_columnar(mocker, registry, uniprot_details):
+    mocker.patch(
+        "app.uniprot.uniprot.get_services", return_value=registry["services"][:1]
+    )
+    mocker.patch("app.uniprot.uniprot.get_service_url", return_value="http://test")
+    mock_beacon_requests(mocker, beacon_responses(uniprot_details))
+
+    chunks = await read_stream("P0DTD1", residue_format=ResidueFormat.COLUMNAR)
+
+    assert json.loads(b"".join(chunks)) == json.loads(
+        dump_json(
+            UniprotDetails(**uniprot_details),
+            UniprotDetails,
+            context={"residue_format": ResidueFormat.COLUMNAR},
+        )
+    )
+
+
+def test_slice_segment(uniprot_details):
+    segment = Segment(
+        **uniprot_details["structures"][0]["chains"][0]["segments"][0]
+        | {
+            "uniprot": {"aligned_sequence": "A" * 100, "from": 11, "to": 110},
+            "residues": [
+                {"model_residue_label": i - 10, "uniprot_residue_number": i}
+                for i in range(11, 111)
+            ],
+        }
+    )
+
+    sliced = slice_segment(segment, 50, 60)
+    assert [x.uniprot_residue_number for x in sliced.residues] == list(range(50, 61))
+    # the sequences are trimmed with the residues
+    assert (sliced.uniprot.from_, sliced.uniprot.to) == (50, 60)
+    assert sliced.uniprot.aligned_sequence == "A" * 11
+    assert slice_segment(segment, 1, 200) is segment
+    assert slice_segment(segment, 111, 200) is None
+    assert slice_segment(segment, 1, 10) is None
+
+
+def test_slice_segment_gapped_alignment(uniprot_details):
+    segment = Segment(
+        **uniprot_details["structures"][0]["chains"][0]["segments"][0]
+        | {
+            "seqres": {"aligned_sequence": "ABC-DEFG", "from": 1, "to": 7},
+            "uniprot": {"aligned_sequence": "KLMNOP-Q", "from": 11, "to": 17},
+            "residues": [],
+        }
+    )
+
+    sliced = slice_segment(segment, 13, 17)
+
+    assert sliced.uniprot.model_dump(by_alias=True) == {
+        "aligned_sequence": "MNOP-Q",
+        "from": 13,
+        "to": 17,
+    }
+    assert sliced.seqres.model_dump(by_alias=True) == {
+        "aligned_sequence": "C-DEFG",
+        "from": 3,
+        "to": 7,
+    }
+
+
+def test_slice_structures(uniprot_details):
+    structures = UniprotDetails(**uniprot_details).structures
+
+    sliced = slice_structures(structures, "30-264")
+    segments = sliced[0].chains.root[0].segments
+    assert [[x.uniprot_residue_number for x in y.residues] for y in segments] == [
+        [30],
+        [264],
+    ]
+
+    sliced = slice_structures(structures, "29-235")
+    assert len(sliced[0].chains.root[0].segments) == 1
+    assert slice_structures(structures, "240-260") == []
+
+    # chains without segments don't overlap any range
+    chains = uniprot_details["structures"][0]["chains"]
+    structure = {
+        **uniprot_details["structures"][0],
+        "chains": chains + [{"chain_id": "B"}],
+    }
+    sliced = slice_structures(
+        UniprotDetails(structures=[structure]).structures, "30-264"
+    )
+    assert [x.chain_id for x in sliced[0].chains.root] == ["A"]
+
+
+@pytest.mark.asyncio
+async def test_get_uniprot_helper_range(mocker, registry, uniprot_details):
+    mocker.patch(
+        "app.uniprot.uniprot.get_services", return_value=registry["services"][:1]
+    )
+    url_mock = mocker.patch(
+        "app.uniprot.uniprot.get_service_url", return_value="http://test"
+    )
+    mock_beacon_requests(mocker, beacon_responses(uniprot_details))
+
+    result = await get_uniprot_helper("P0DTD1", None, None, "264-300")
+    chunks = await read_stream("P0DTD1", None, None, "264-300")
+
+    # the full-length details are requested and sliced by the hub
+    assert url_mock.call_args.args[1:] == ("P0DTD1.json",)
+    segments = result.structures[0].chains.root[0].segments
+    assert [[x.uniprot_residue_number for x in y.residues] for y in segments] == [
+        [264, 265]
+    ]
+    assert json.loads(b"".join(chunks)) == json.loads(dump_json(result, UniprotDetails))
+    assert await get_uniprot_helper("P0DTD1", None, None, "240-260") is None
+
+
+def summary_with_ranges(uniprot_summary, *ranges):
+    structure = uniprot_summary["structures"][0]
+    structures = []
+    for i, (start, end) in enumerate(ranges):
+        item = copy.deepcopy(structure)
+        item["summary"].update(
+            model_identifier=f"{i}abc.1.A", uniprot_start=start, uniprot_end=end
+        )
+        structures.append(item)
+
+    return UniprotSummary(
+        uniprot_entry=uniprot_summary["uniprot_entry"], structures=structures
+    )
+
+
+def test_summary_index_search(uniprot_summary):
+    summary = summary_with_ranges(
+        uniprot_summary, (50, 100), (1, 400), (120, 130), (90, 95)
+    )
+    index = SummaryIndex(summary)
+
+    def identifiers(result):
+        return [x.summary.model_identifier for x in result.structures]
+
+    assert identifiers(index.search("90-120")) == [
+        "0abc.1.A",
+        "1abc.1.A",
+        "2abc.1.A",
+        "3abc.1.A",
+    ]
+    assert identifiers(index.search("101-119")) == ["1abc.1.A"]
+    assert identifiers(index.search("96-100", "0ABC")) == ["0abc.1.A"]
+    assert identifiers(index.search(template="3abc.1.A")) == ["3abc.1.A"]
+    assert index.search("401-500") is None
+    assert index.search(template="0ab") is None
+    assert index.search("1-1000").uniprot_entry == summary.uniprot_entry
+
+
+def test_matches_template():
+    assert matches_template("1t29", "1T29")
+    assert matches_template("1t29.1.a", "1t29")
+    assert not matches_template("1t290", "1t29")
+    assert not matches_template("1t2", "1t29")
+
+
+def test_rank_structures(uniprot_summary):
+    summary = summary_with_ranges(
+        uniprot_summary, (1, 100), (1, 100), (1, 100), (1, 100)
+    )
+    for structure, (coverage, resolution, created) in zip(
+        summary.structures,
+        [
+            (0.5, 2.0, "2021-01-01"),
+            (0.9, None, "2022-06-01"),
+            (0.7, 1.5, "2020-01-01"),
+            (0.9, 3.0, None),
+        ],
+    ):
+        structure.summary.coverage = coverage
+        structure.summary.resolution = resolution
+        structure.summary.created = created
+
+    def identifiers(result):
+        return [x.summary.model_identifier[0] for x in result.structures]
+
+    assert identifiers(rank_structures(summary, SummarySort.COVERAGE)) == list("1320")
+    assert identifiers(rank_structures(summary, SummarySort.RESOLUTION)) == list("2031")
+    assert identifiers(rank_structures(summary, SummarySort.CREATED)) == list("1023")
+    # top-k from a heap, same order as a full sort
+    assert identifiers(rank_structures(summary, SummarySort.COVERAGE, limit=2)) == [
+        "1",
+        "3",
+    ]
+    assert identifiers(
+        rank_structures(summary, SummarySort.COVERAGE, limit=1, offset=2)
+    ) == ["2"]
+    assert identifiers(rank_structures(summary, limit=2, offset=1)) == ["1", "2"]
+    assert identifiers(rank_structures(summary, offset=5)) == []
+
+
+@pytest.mark.asyncio
+async def test_get_list_of_uniprot_summary_helper_limit(mocker, uniprot_summary):
+    summary = UniprotSummary(**uniprot_summary)
+    mocker.patch(
+        "app.uniprot.helper.get_uniprot_summary_helper",
+        new=mocker.AsyncMock(return_value=summary),
+    )
+
+    results = await get_list_of_uniprot_summary_helper(
+        AccessionListRequest(accessions=["P0DTD1", "P00734"], sort="coverage", limit=1)
+    )
+
+    assert [len(x.structures) for x in results] == [1, 1]
+
+
+def test_get_field_projection():
+    assert get_field_projection(
+        "provider, summary.entities.identifier,model_identifier", Overview
+    ) == {
+        "summary": {
+            "entities": {"__all__": {"identifier": True}},
+            "model_identifier": True,
+            "provider": True,
+        }
+    }
+    assert get_field_projection("chains.chain_id,coverage", Detailed) == {
+        "chains": {"__all__": {"chain_id": True}},
+        "summary": {"coverage": True},
+    }
+    # the alias of a field is accepted as well
+    assert get_field_projection("chains.segments.uniprot.from", Detailed) == {
+        "chains": {"__all__": {"segments": {"__all__": {"uniprot": {"from_": True}}}}}
+    }
+
+    with pytest.raises(ValueError, match="Unknown field unknown"):
+        get_field_projection("unknown", Overview)
+    with pytest.raises(ValueError, match="Unknown field provider.name"):
+        get_field_projection("provider.name", Overview)
+
+
+@pytest.mark.asyncio
+async def test_stream_uniprot_helper_fields(mocker, registry, uniprot_details):
+    mocker.patch(
+        "app.uniprot.uniprot.get_services", return_value=registry["services"][:1]
+    )
+    mocker.patch("app.uniprot.uniprot.get_service_url", return_value="http://test")
+    mock_beacon_requests(mocker, beacon_responses(uniprot_details))
+    include = {
+        "uniprot_entry": True,
+        "structures": {"__all__": get_field_projection("provider", Detailed)},
+    }
+
+    chunks = await read_stream("P0DTD1", include=include)
+
+    content = json.loads(b"".join(chunks))
+    expected = json.loads(dump_json(UniprotDetails(**uniprot_details), UniprotDetails))
+    assert content["uniprot_entry"] == expected["uniprot_entry"]
+    assert content["structures"] == [
+        {"summary": {"provider": x["summary"]["provider"]}}
+        for x in uniprot_details["structures"]
+    ]
+
+
+def copy_structure(structure, provider, **summary):
+    item = copy.deepcopy(structure)
+    item["summary"].update(provider=provider, **summary)
+    return item
+
+
+def test_dedupe_structures(uniprot_summary):
+    first, second = uniprot_summary["structures"]
+    structures = UniprotSummary(
+        uniprot_entry=uniprot_summary["uniprot_entry"],
+        structures=[
+            copy_structure(first, "swissmodel"),
+            second,
+            copy_structure(first, "pdbe", model_identifier="4LDE"),
+            copy_structure(second, "alphafold", model_identifier="other"),
+            copy_structure(first, "ped", model_url="http://other"),
+        ],
+    ).structures
+
+    result = dedupe_structures(structures)
+
+    # the copy of the preferred provider is kept at the position of the first copy
+    assert [(x.summary.model_identifier, x.summary.provider) for x in result] == [
+        ("4LDE", "pdbe"),
+        ("6mxt", "PDBe"),
+    ]
+
+
+def test_get_provider_rank(mocker):
+    mocker.patch("app.config.PROVIDER_PREFERENCE", ["alphafold"])
+    mocker.patch.dict("app.config.REGISTRY_INDEX", clear=True)
+
+    from app.config import get_provider_rank
+
+    assert get_provider_rank("AlphaFold") == 0
+    assert get_provider_rank("swissmodel") < get_provider_rank("pdbe")
+    assert get_provider_rank("unknown") == get_provider_rank(None)
+    assert get_provider_rank("unknown") > get_provider_rank("bfvd")
+
+
+@pytest.mark.asyncio
+async def test_stream_uniprot_helper_dedupe(mocker, registry, uniprot_details):
+    structure = uniprot_details["structures"][0]
+    responses = beacon_responses(
+        {**uniprot_details, "structures": [copy_structure(structure, "swissmodel")]},
+        {
+            **uniprot_details,
+            "structures": [
+                copy_structure(structure, "pdbe"),
+                copy_structure(
+                    structure,
+                    "pdbe",
+                    model_identifier="1abc",
+                    model_url="http://1abc.cif",
+                ),
+            ],
+        },
+    )
+    mocker.patch(
+        "app.uniprot.uniprot.get_services",
+        return_value=[{"provider": "swissmodel"}, {"provider": "pdbe"}],
+    )
+    mocker.patch("app.uniprot.uniprot.get_service_url", return_value="http://test")
+    mock_beacon_requests(mocker, responses)
+
+    result = await get_uniprot_helper("P0DTD1", dedupe=True)
+    chunks = await read_stream("P0DTD1", dedupe=True)
+
+    assert [x.summary.model_identifier for x in result.structures] == ["4lde", "1abc"]
+    assert [x.summary.provider for x in result.structures] == ["pdbe", "pdbe"]
+    # streamed in the preference order of the providers, with the same models
+    assert json.loads(b"".join(chunks)) == json.loads(dump_json(result, UniprotDetails))
+
+
+def test_get_residue_coverage(uniprot_summary):
+    summary = summary_with_ranges(uniprot_summary, (2, 4), (1, 2), (3, 9), (7, 8))
+    summary.structures[1].summary.model_category = ModelCategory.TEMPLATE_BASED
+
+    coverage = get_residue_coverage(summary.structures, 6)
+
+    assert coverage == {
+        "EXPERIMENTALLY DETERMINED": [0, 1, 2, 2, 1, 1],
+        "TEMPLATE-BASED": [1, 1, 0, 0, 0, 0],
+        "AB-INITIO": [0] * 6,
+        "CONFORMATIONAL ENSEMBLE": [0] * 6,
+    }
+    assert get_residue_coverage([], 0)["AB-INITIO"] == []
+
+
+def test_get_sequence_length(uniprot_summary):
+    summary = summary_with_ranges(uniprot_summary, (2, 4), (3, 9))
+
+    summary.uniprot_entry.sequence_length = 7
+    assert get_sequence_length(summary) == 7
+    summary.uniprot_entry.sequence_length = None
+    assert get_sequence_length(summary) == 9
+
+
+def test_get_model_quality(uniprot_summary):
+    summary = UniprotSummary(**uniprot_summary).structures[0].summary
+    summary.sequence_identity = 0.9
+
+    summary.resolution = 1.5
+    assert get_model_quality(summary) == pytest.approx(0.9)
+    summary.resolution = 3.0
+    assert get_model_quality(summary) == pytest.approx(0.6)
+
+    summary.resolution = None
+    summary.confidence_type = ConfidenceType.pLDDT
+    summary.confidence_avg_local_score = 80
+    assert get_model_quality(summary) == pytest.approx(0.72)
+
+
+def test_select_covering_set(uniprot_summary):
+    summary = summary_with_ranges(
+        uniprot_summary, (3, 10), (1, 6), (5, 20), (7, 20), (30, 40), (35, 38)
+    )
+    # same reach as the third model, better quality
+    summary.structures[3].summary.resolution = 1.0
+    summary.structures[2].summary.resolution = 4.0
+
+    structures, gaps = select_covering_set(summary.structures, 45)
+
+    assert [x.summary.model_identifier for x in structures] == [
+        "1abc.1.A",
+        "3abc.1.A",
+        "4abc.1.A",
+    ]
+    assert gaps == [(21, 29), (41, 45)]
+    assert select_covering_set(summary.structures, 0) == ([], [])
+    assert select_covering_set([], 3) == ([], [(1, 3)])
+
+
+@pytest.mark.asyncio
+async def test_get_list_of_uniprot_summary_helper_batch(mocker, uniprot_summary):
+    summary = UniprotSummary(**uniprot_summary)
+    cached = dump_json(summary, UniprotSummary, exclude_unset=True)
+    mocker.patch(
+        "app.uniprot.helper.get_cached_responses",
+        side_effect=lambda keys: [cached if "P2" in x else None for x in keys],
+    )
+    set_mock = mocker.patch("app.uniprot.helper.set_cached_response")
+    helper_mock = mocker.patch(
+        "app.uniprot.helper.get_uniprot_summary_helper",
+        new=mocker.AsyncMock(side_effect=lambda q, *args, **kwargs: summary),
+    )
+    mocker.patch("app.uniprot.helper.BATCH_CHUNK_SIZE", 2)
+
+    results = await get_list_of_uniprot_summary_helper(
+        AccessionListRequest(accessions=["P1", "p2", "P3", "P1 ", "P2"])
+    )
+
+    # the cached accession is not requested, repeated accessions once
+    assert [x.args[0] for x in helper_mock.call_args_list] == ["P1", "P3"]
+    assert [x.args[0] for x in set_mock.call_args_list] == [
+        "uniprot-summary:P1:exclude_provider=:provider=:uniprot_checksum=",
+        "uniprot-summary:P3:exclude_provider=:provider=:uniprot_checksum=",
+    ]
+    assert len(results) == 3
+
+
+@pytest.mark.asyncio
+async def test_get_list_of_uniprot_summary_helper_limits(mocker, uniprot_summary):
+    summary = UniprotSummary(**uniprot_summary)
+    mocker.patch(
+        "app.uniprot.helper.get_uniprot_summary_helper",
+        new=mocker.AsyncMock(return_value=summary),
+    )
+    request = AccessionListRequest(accessions=["P1", "P2", "P3"])
+
+    # no time left, no accession is requested
+    deadline = Deadline(0)
+    assert await get_list_of_uniprot_summary_helper(request, deadline) is None
+    assert deadline.skipped == ["P1", "P2", "P3"]
+    assert deadline.headers() == {"X-3DBeacons-Skipped": "3"}
+
+    # the summaries hold at most 3 structures
+    mocker.patch("app.uniprot.helper.BATCH_MAX_STRUCTURES", 3)
+    deadline = Deadline(10)
+    results = await get_list_of_uniprot_summary_helper(request, deadline)
+    assert len(results) == 1
+    assert sorted(deadline.skipped) == ["P2", "P3"]
+
+
+@pytest.mark.asyncio
+async def test_get_list_of_uniprot_summary_helper_incomplete(mocker, uniprot_summary):
+    summary = UniprotSummary(**uniprot_summary)
+    mocker.patch("app.uniprot.helper.get_cached_responses", return_value=[None] * 2)
+    set_mock = mocker.patch("app.uniprot.helper.set_cached_response")
+
+    async def get_summary(qualifier, *args, deadline, **kwargs):
+        if qualifier == "P1":
+            deadline.incomplete.append("slow")
+        return summary
+
+    mocker.patch(
+        "app.uniprot.helper.get_uniprot_summary_helper",
+        new=mocker.AsyncMock(side_effect=get_summary),
+    )
+    deadline = Deadline(10)
+
+    await get_list_of_uniprot_summary_helper(
+        AccessionListRequest(accessions=["P1", "P2"]), deadline
+    )
+
+    # the complete summary is cached even after an incomplete one
+    assert [x.args[0] for x in set_mock.call_args_list] == [
+        "uniprot-summary:P2:exclude_provider=:provider=:uniprot_checksum="
+    ]
+    assert deadline.incomplete == ["slow"]
+
+
+@pytest.mark.asyncio
+async def test_stream_uniprot_helper_as_completed(mocker, uniprot_details):
+    release = asyncio.Event()
+
+    async def request_get(url, *args):
+        if "slow" in url:
+            await release.wait()
+        return httpx.Response(
+            200, json=uniprot_details, request=httpx.Request("GET", url)
+        )
+
+    mocker.patch("app.utils.request_get", side_effect=request_get)
+    mocker.patch("app.utils.get_cached_responses", return_value=[None, None])
+    mocker.patch("app.utils.set_cached_response")
+    mocker.patch("app.utils.CircuitBreaker.allow_requests", return_value=[True, True])
+    mocker.patch("app.utils.CircuitBreaker.record_result")
+    mocker.patch(
+        "app.uniprot.uniprot.get_services",
+        return_value=[{"provider": "slow"}, {"provider": "fast"}],
+    )
+    mocker.patch(
+        "app.uniprot.uniprot.get_service_url",
+        side_effect=lambda service, *parts: f"http://{service['provider']}",
+    )
+
+    # the stream starts with the provider answering first
+    chunks = await asyncio.wait_for(stream_uniprot_helper("P0DTD1"), timeout=1)
+    first_chunk = await chunks.__anext__()
+    release.set()
+    rest = [x async for x in chunks]
+
+    assert first_chunk.startswith(b'{"structures":[')
+    assert len(rest) == 2
@@ -1,6 +1,23 @@
-from app.config import get_base_service_url, get_services
+import asyncio
+import copy
+
+import httpx
+import pytest
+from fastapi import Query
+
+from app.config import get_base_service_url, get_service_url, get_services
 from app.uniprot.uniprot import filter_on_checksum, get_first_entry_with_checksum
-from app.utils import get_final_service_url
+from app.utils import (
+    IN_FLIGHT_REQUESTS,
+    IN_FLIGHT_WAITERS,
+    Deadline,
+    accepts_ndjson,
+    coalesced_request_get,
+    get_cache_key,
+    get_deadline,
+    get_final_service_url,
+    send_async_requests,
+)
 from app.version import __major__version__
 
 
@@ -90,8 +107,212 @@ def test_get_services_provider(mocker, registry):
     ]
 
 
+def test_get_services_query_defaults(mocker, registry):
+    mocker.patch("app.config.read_data_file", return_value=registry)
+    assert get_services(
+        service_type="serviceOne", provider=Query(None), exclude_provider=Query(None)
+    ) == get_services(service_type="serviceOne")
+
+
 def test_get_base_service_url(mocker, registry):
-    mocker.patch("app.config.get_providers", return_value=registry["providers"])
+    mocker.patch("app.config.read_data_file", return_value=registry)
     assert (
         get_base_service_url("providerOneId") == "https://providerOneDevBaseServiceUrl"
     )
+
+
+def test_get_cache_key():
+    assert get_cache_key("summary", " p00520 ", range="1-10", provider=None) == (
+        "summary:P00520:provider=:range=1-10"
+    )
+    assert get_cache_key("summary", "P00520", provider="pdbe", range=None) != (
+        get_cache_key("summary", "P00520", provider=None, range=None)
+    )
+
+
+@pytest.mark.asyncio
+async def test_send_async_requests_cached(mocker):
+    mocker.patch(
+        "app.utils.get_cached_responses", return_value=[b'{"cached": true}', None]
+    )
+    set_mock = mocker.patch("app.utils.set_cached_response")
+    request_mock = mocker.patch(
+        "app.utils.request_get", return_value=httpx.Response(200, content=b"{}")
+    )
+
+    result = await send_async_requests(["http://one", "http://two"], cache_ttl=60)
+
+    request_mock.assert_called_once()
+    assert request_mock.call_args.args[0] == "http://two"
+    set_mock.assert_called_once_with("beacon-response:http://two", b"{}", 60)
+    assert result[0].json() == {"cached": True}
+    assert str(result[0].url) == "http://one"
+    assert result[1].json() == {}
+
+
+@pytest.mark.asyncio
+async def test_send_async_requests_failure_not_cached(mocker):
+    mocker.patch("app.utils.get_cached_responses", return_value=[None])
+    set_mock = mocker.patch("app.utils.set_cached_response")
+    mocker.patch("app.utils.request_get", return_value=None)
+
+    assert await send_async_requests(["http://one"], cache_ttl=60) == [None]
+    set_mock.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_coalesced_request_get(mocker):
+    async def slow_request_get(url, *args):
+        await asyncio.sleep(0.01)
+        return httpx.Response(200, content=b"{}")
+
+    request_mock = mocker.patch("app.utils.request_get", side_effect=slow_request_get)
+
+    results = await asyncio.gather(
+        *[coalesced_request_get("http://one") for _ in range(5)],
+        coalesced_request_get("http://two"),
+    )
+
+    assert request_mock.call_count == 2
+    assert all(x is results[0] for x in results[:5])
+    assert not IN_FLIGHT_REQUESTS
+
+
+@pytest.mark.asyncio
+async def test_send_async_requests_skips_open_circuits(mocker):
+    mocker.patch("app.utils.CircuitBreaker.allow_requests", return_value=[False, True])
+    record_mock = mocker.patch("app.utils.CircuitBreaker.record_result")
+    request_mock = mocker.patch(
+        "app.utils.request_get", return_value=httpx.Response(503)
+    )
+
+    result = await send_async_requests(
+        ["http://one", "http://two"], providers=["one", "two"]
+    )
+
+    request_mock.assert_called_once()
+    assert request_mock.call_args.args[0] == "http://two"
+    record_mock.assert_called_once_with("two", False)
+    assert result[0] is None
+
+
+@pytest.mark.asyncio
+async def test_send_async_requests_deadline(mocker):
+    async def request_get(url, *args):
+        await asyncio.sleep(0 if url == "http://fast" else 1)
+        return httpx.Response(200, content=b"{}")
+
+    mocker.patch("app.utils.request_get", side_effect=request_get)
+    mocker.patch("app.utils.CircuitBreaker.allow_requests", return_value=[True, True])
+    record_mock = mocker.patch("app.utils.CircuitBreaker.record_result")
+    deadline = Deadline(0.05)
+
+    result = await send_async_requests(
+        ["http://fast", "http://slow"], providers=["fast", "slow"], deadline=deadline
+    )
+
+    assert result[0].status_code == 200
+    assert result[1] is None
+    assert deadline.incomplete == ["slow"]
+    assert deadline.headers() == {"X-3DBeacons-Incomplete": "slow"}
+    record_mock.assert_called_once_with("fast", True)
+
+
+@pytest.mark.asyncio
+async def test_send_async_requests_deadline_cancels_upstream(mocker):
+    upstream = {"cancelled": False}
+
+    async def request_get(url, *args):
+        try:
+            await asyncio.sleep(1)
+        except asyncio.CancelledError:
+            upstream["cancelled"] = True
+            raise
+
+    mocker.patch("app.utils.request_get", side_effect=request_get)
+    deadline = Deadline(0.05)
+
+    result = await send_async_requests(["http://slow"], deadline=deadline)
+    # let the cancellation reach the upstream request
+    await asyncio.sleep(0.01)
+
+    assert result == [None]
+    assert upstream["cancelled"]
+    assert not IN_FLIGHT_REQUESTS
+    assert not IN_FLIGHT_WAITERS
+
+
+@pytest.mark.asyncio
+async def test_coalesced_request_get_cancelled_waiter(mocker):
+    async def slow_request_get(url, *args):
+        await asyncio.sleep(0.05)
+        return httpx.Response(200, content=b"{}")
+
+    mocker.patch("app.utils.request_get", side_effect=slow_request_get)
+
+    first = asyncio.create_task(coalesced_request_get("http://one"))
+    second = asyncio.create_task(coalesced_request_get("http://one"))
+    await asyncio.sleep(0.01)
+    first.cancel()
+
+    # the request is still awaited by the second caller
+    assert (await second).status_code == 200
+    assert first.cancelled()
+
+
+def test_get_deadline():
+    assert get_deadline(timeout=1, x_3dbeacons_timeout=2).remaining() <= 1
+    assert 1 < get_deadline(timeout=None, x_3dbeacons_timeout=2).remaining() <= 2
+    assert get_deadline(timeout=None, x_3dbeacons_timeout=None).remaining() > 2
+    assert get_deadline(timeout=1000, x_3dbeacons_timeout=None).remaining() <= 30
+
+
+def test_get_services_unknown(mocker, registry):
+    mocker.patch("app.config.read_data_file", return_value=registry)
+    assert get_services(service_type="unknown") == []
+    assert get_services(service_type="serviceOne", provider="unknown") == []
+    assert (
+        get_services(
+            service_type="serviceOne",
+            provider="providerOne",
+            exclude_provider="providerOne",
+        )
+        == []
+    )
+
+
+def test_get_services_disabled(mocker, registry):
+    mocker.patch("app.config.read_data_file", return_value=registry)
+    mocker.patch("app.config.DISABLED_BEACONS", ["providerTwo"])
+    mocker.patch.dict("app.config.REGISTRY_INDEX", clear=True)
+    assert [x["provider"] for x in get_services(service_type="serviceOne")] == [
+        "providerOne"
+    ]
+
+
+def test_get_service_url(mocker, registry):
+    registry = copy.deepcopy(registry)
+    registry["providers"][0]["devBaseServiceUrl"] = "https://providerOne/"
+    registry["providers"][0]["providerId"] = "providerOne"
+    mocker.patch("app.config.read_data_file", return_value=registry)
+    mocker.patch.dict("app.config.REGISTRY_INDEX", clear=True)
+    service = registry["services"][0]
+
+    assert (
+        get_service_url(service, "P12345.json")
+        == f"https://providerOne/service/P12345.json?version={__major__version__}"
+    )
+    assert (
+        get_service_url(service, "?id=1")
+        == f"https://providerOne/service?id=1&version={__major__version__}"
+    )
+
+
+def test_accepts_ndjson():
+    def request(accept):
+        return httpx.Request("GET", "http://test", headers={"Accept": accept})
+
+    assert accepts_ndjson(request("application/x-ndjson"))
+    assert accepts_ndjson(request("application/json, application/x-ndjson; q=0.9"))
+    assert not accepts_ndjson(request("application/json"))
+    assert not accepts_ndjson(request("*/*"))
@@ -1,14 +1,18 @@
 import json
 
 import pytest
+from redis.exceptions import ConnectionError as RedisConnectionError
 
 from tests.utils import StubHttpResponse
+from worker.cache.redis_cache import RedisCache
+from worker.cache.utils import get_cached_response, set_cached_response
 from worker.helper import (
     JobResultsNotFoundException,
     filter_json_results,
     get_job_dispatcher_json_results,
     prepare_accession_list,
     prepare_hit_dictionary,
+    prepare_hit_dictionary_with_summary_results,
 )
 from worker.schema import AccessionListRequest
 
@@ -56,3 +60,67 @@ async def test_get_job_dispatcher_json_results_invalid(mocker, sample_sequence_h
 
     with pytest.raises(JobResultsNotFoundException):
         assert get_job_dispatcher_json_results(sample_sequence_hash)
+
+
+def test_cached_response_round_trip(mocker):
+    store = {}
+    redis_mock = mocker.patch.object(RedisCache, "redis_client")
+    redis_mock.set.side_effect = lambda key, value, ex=None: store.update({key: value})
+    redis_mock.get.side_effect = store.get
+
+    set_cached_response("key", {"structures": [1, 2]}, 60)
+
+    assert get_cached_response("key") == {"structures": [1, 2]}
+    assert get_cached_response("missing") is None
+
+
+def test_cached_response_redis_unavailable(mocker):
+    redis_mock = mocker.patch.object(RedisCache, "redis_client")
+    redis_mock.get.side_effect = RedisConnectionError()
+
+    assert get_cached_response("key") is None
+
+
+def test_prepare_hit_dictionary_with_summary_results_partial(mocker):
+    hit_dictionary = {x: {"accession": x} for x in ["P12345", "P23456", "P34567"]}
+    responses = [
+        StubHttpResponse(
+            status_code=200,
+            data=[{"uniprot_entry": {"ac": "P12345"}}],
+            headers={"X-3DBeacons-Skipped": "2"},
+        ),
+        StubHttpResponse(status_code=200, data=[{"uniprot_entry": {"ac": "P23456"}}]),
+    ]
+    post_mock = mocker.patch(
+        "worker.helper.requests.Session.post", side_effect=responses
+    )
+
+    result = prepare_hit_dictionary_with_summary_results(hit_dictionary)
+
+    assert list(result) == ["P12345", "P23456"]
+    assert result["P23456"]["summary"] == {"uniprot_entry": {"ac": "P23456"}}
+    # only the skipped accessions are resubmitted
+    assert post_mock.call_args_list[1].kwargs["json"] == {
+        "accessions": ["P23456", "P34567"]
+    }
+    assert post_mock.call_args.kwargs["timeout"]
+
+
+def test_prepare_hit_dictionary_with_summary_results_skipped_not_found(mocker):
+    hit_dictionary = {x: {"accession": x} for x in ["P12345", "P23456"]}
+    responses = [
+        # every accession was cut by the batch deadline
+        StubHttpResponse(
+            status_code=404, data={}, headers={"X-3DBeacons-Skipped": "2"}
+        ),
+        StubHttpResponse(status_code=200, data=[{"uniprot_entry": {"ac": "P12345"}}]),
+    ]
+    post_mock = mocker.patch(
+        "worker.helper.requests.Session.post", side_effect=responses
+    )
+
+    result = prepare_hit_dictionary_with_summary_results(hit_dictionary)
+
+    assert list(result) == ["P12345"]
+    assert post_mock.call_count == 2
+    assert post_mock.call_args.kwargs["json"] == {"accessions": ["P12345", "P23456"]}
@@ -38,10 +38,11 @@ class Content:
 
 
 class StubHttpResponse:
-    def __init__(self, status_code: int, data):
+    def __init__(self, status_code: int, data, headers=None):
         self.status_code = status_code
         self.content = Content(data)
         self.data = data
+        self.headers = headers or {}
 
     def json(self):
         return self.data
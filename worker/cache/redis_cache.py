@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import List, Optional
 
 from redis import Redis
 
@@ -22,8 +22,20 @@ class RedisCache:
         return cls.redis_client.get(key)
 
     @classmethod
-    def set(cls, key: str, value: str) -> bool:
-        return bool(cls.redis_client.set(key, value))
+    def set(cls, key: str, value: str | bytes, ex: Optional[int] = None) -> bool:
+        return bool(cls.redis_client.set(key, value, ex=ex))
+
+    @classmethod
+    def set_if_missing(cls, key: str, value: str | bytes, ex: int) -> bool:
+        return bool(cls.redis_client.set(key, value, ex=ex, nx=True))
+
+    @classmethod
+    def delete(cls, key: str) -> int:
+        return int(cls.redis_client.delete(key))
+
+    @classmethod
+    def mget(cls, keys: List[str]) -> List[Optional[bytes]]:
+        return cls.redis_client.mget(keys)
 
     @classmethod
     def hget(cls, prefix: str, key: str, decode: bool = True) -> Optional[bytes | str]:
@@ -34,13 +46,21 @@ class RedisCache:
             return value.decode()
         return value
 
+    @classmethod
+    def hmget(cls, prefix: str, keys: List[str]) -> List[Optional[bytes]]:
+        return cls.redis_client.hmget(prefix, keys)
+
     @classmethod
     def hset(cls, prefix: str, key: str, value: str) -> int:
         return int(cls.redis_client.hset(prefix, key, value))
 
     @classmethod
-    def hdel(cls, prefix: str, key: str) -> int:
-        return int(cls.redis_client.hdel(prefix, key))
+    def hincrby(cls, prefix: str, key: str, amount: int = 1) -> int:
+        return int(cls.redis_client.hincrby(prefix, key, amount))
+
+    @classmethod
+    def hdel(cls, prefix: str, *keys: str) -> int:
+        return int(cls.redis_client.hdel(prefix, *keys))
 
     @classmethod
     def flush(cls) -> None:
@@ -1,7 +1,9 @@
 from typing import Any, Dict, List, Optional
 
 import msgpack
+from redis.exceptions import RedisError
 
+from app import logger
 from worker.cache.redis_cache import RedisCache
 
 
@@ -45,3 +47,154 @@ def clear_celery_task_id(hashed_sequence: str):
 
 def clear_jobdispatcher_id(hashed_sequence: str):
     RedisCache.hdel("sequence-jdid-mapping", hashed_sequence)
+
+
+def get_cached_response(key: str) -> Optional[Any]:
+    """Returns a cached API response, None on a miss or if Redis is unavailable.
+
+    Args:
+        key (str): A cache key
+
+    Returns:
+        Any: The unpacked response
+    """
+    if RedisCache.redis_client is None:
+        return None
+
+    try:
+        packed = RedisCache.get(key)
+    except RedisError:
+        logger.warning(f"Unable to read {key} from cache", exc_info=True)
+        return None
+
+    if packed is None:
+        return None
+
+    return msgpack.loads(packed)
+
+
+def get_cached_responses(keys: List[str]) -> List[Optional[Any]]:
+    """Returns cached API responses for several keys with a single round trip.
+
+    Args:
+        keys (List[str]): A list of cache keys
+
+    Returns:
+        List: The unpacked responses, None for every miss
+    """
+    if RedisCache.redis_client is None or not keys:
+        return [None] * len(keys)
+
+    try:
+        packed_values = RedisCache.mget(keys)
+    except RedisError:
+        logger.warning("Unable to read responses from cache", exc_info=True)
+        return [None] * len(keys)
+
+    return [msgpack.loads(x) if x is not None else None for x in packed_values]
+
+
+def set_cached_response(key: str, value, ttl: int):
+    """Caches an API response for ttl seconds, a ttl of 0 disables caching.
+
+    Args:
+        key (str): A cache key
+        value (Any): A msgpack serialisable response
+        ttl (int): Time to live in seconds
+    """
+    if RedisCache.redis_client is None or ttl <= 0:
+        return
+
+    try:
+        RedisCache.set(key, msgpack.dumps(value), ex=ttl)
+    except RedisError:
+        logger.warning(f"Unable to write {key} to cache", exc_info=True)
+
+
+def get_circuit_states(providers: List[str]) -> List[Optional[Dict[str, Any]]]:
+    """Returns the shared circuit breaker state of each provider.
+
+    Args:
+        providers (List[str]): A list of provider ids
+
+    Returns:
+        List: The failures and opened_at of each provider, None for all of them if
+        Redis is unavailable
+    """
+    if RedisCache.redis_client is None or not providers:
+        return [None] * len(providers)
+
+    fields = [f"{x}:{y}" for x in providers for y in ("failures", "opened_at")]
+    try:
+        values = RedisCache.hmget("circuit-breaker", fields)
+    except RedisError:
+        logger.warning("Unable to read circuit breaker states", exc_info=True)
+        return [None] * len(providers)
+
+    return [
+        {"failures": int(failures or 0), "opened_at": float(opened_at or 0)}
+        for failures, opened_at in zip(values[::2], values[1::2])
+    ]
+
+
+def increment_circuit_failures(provider: str) -> Optional[int]:
+    """Adds a failure to the shared count of a provider, atomically.
+
+    Args:
+        provider (str): A provider id
+
+    Returns:
+        int: The failures of the provider, None if Redis is unavailable
+    """
+    if RedisCache.redis_client is None:
+        return None
+
+    try:
+        return RedisCache.hincrby("circuit-breaker", f"{provider}:failures")
+    except RedisError:
+        logger.warning(f"Unable to write circuit breaker state of {provider}")
+        return None
+
+
+def set_circuit_opened(provider: str, opened_at: float):
+    if RedisCache.redis_client is None:
+        return
+
+    try:
+        RedisCache.hset("circuit-breaker", f"{provider}:opened_at", str(opened_at))
+    except RedisError:
+        logger.warning(f"Unable to write circuit breaker state of {provider}")
+
+
+def reset_circuit(provider: str):
+    if RedisCache.redis_client is None:
+        return
+
+    try:
+        RedisCache.hdel(
+            "circuit-breaker", f"{provider}:failures", f"{provider}:opened_at"
+        )
+        RedisCache.delete(f"circuit-breaker-probe:{provider}")
+    except RedisError:
+        logger.warning(f"Unable to write circuit breaker state of {provider}")
+
+
+def claim_circuit_probe(provider: str, ttl: int) -> Optional[bool]:
+    """Claims the probe request of a half-open circuit for ttl seconds, only one
+    worker gets it.
+
+    Args:
+        provider (str): A provider id
+        ttl (int): Seconds after which the probe can be claimed again
+
+    Returns:
+        bool: If the probe was claimed, None if Redis is unavailable
+    """
+    if RedisCache.redis_client is None:
+        return None
+
+    try:
+        return RedisCache.set_if_missing(f"circuit-breaker-probe:{provider}", b"1", ttl)
+    except RedisError:
+        logger.warning(f"Unable to claim the probe request of {provider}")
+        return None
@@ -1,15 +1,17 @@
 import os
 import re
 from time import sleep
-from typing import Dict, List
+from typing import Dict, List, Tuple
 
 import requests
 
 from app import logger
 from worker.schema import AccessionListRequest
 
-MAX_POST_LIMIT = int(os.environ.get("MAX_POST_LIMIT", 10))
 BEACONS_API_URL = os.environ.get("BEACONS_API_URL")
+SUMMARY_BATCH_SIZE = int(os.environ.get("SUMMARY_BATCH_SIZE", 500))
+SUMMARY_BATCH_RETRIES = int(os.environ.get("SUMMARY_BATCH_RETRIES", 2))
+SUMMARY_REQUEST_TIMEOUT = float(os.environ.get("SUMMARY_REQUEST_TIMEOUT", 120))
 ARRAY_REGEX = r"(\w+)(\[(\d+)\])?"
 
 
@@ -64,7 +66,7 @@ def prepare_hit_dictionary(hit_list: List) -> Dict:
 
 
 def filter_json_results(results: Dict, hsp_identity: int = 90) -> List:
-    """Filter the results from the search engine. Only returns MAX_POST_LIMIT results.
+    """Filter the results from the search engine.
 
     Args:
         results (Dict): Results from the search engine
@@ -95,28 +97,72 @@ def prepare_accession_list(accession_list: List) -> AccessionListRequest:
     return AccessionListRequest(accessions=accession_list)
 
 
-def prepare_hit_dictionary_with_summary_results(hit_dictionary: Dict):
-    final_hit_dictionary = {}
+def get_summary_results(
+    session: requests.Session, accessions: List[str]
+) -> Tuple[Dict, bool]:
+    """Gets the summaries of a batch of accessions from the hub.
+
+    Args:
+        session (requests.Session): A requests session
+        accessions (List[str]): A list of accessions
+
+    Returns:
+        Tuple: The summaries keyed on accession, and False if the hub left out
+        some accessions or the request failed.
+    """
+    try:
+        summary_response = session.post(
+            f"{BEACONS_API_URL}/uniprot/summary",
+            json={"accessions": accessions},
+            timeout=SUMMARY_REQUEST_TIMEOUT,
+        )
+    except requests.RequestException:
+        logger.warning(f"Error fetching summaries of {len(accessions)} accessions")
+        return {}, False
+
+    # accessions cut by the batch deadline or size are counted in this header,
+    # it is sent with the 404 as well if all of them were cut
+    skipped = int(summary_response.headers.get("X-3DBeacons-Skipped", 0))
+
+    if summary_response.status_code == 404:
+        # none of the accessions processed has a model
+        return {}, not skipped
+    if summary_response.status_code != 200:
+        return {}, False
+
+    results = {x["uniprot_entry"]["ac"]: x for x in summary_response.json()}
+
+    return results, not skipped
+
+
+def prepare_hit_dictionary_with_summary_results(hit_dictionary: Dict) -> Dict:
+    final_hit_dictionary: Dict = {}
+    pending = list(hit_dictionary.keys())
+    attempt = 0
+
     with requests.Session() as session:
-        for accessions_batch in divide_chunks(
-            list(hit_dictionary.keys()), MAX_POST_LIMIT
-        ):
-            summary_response = session.post(
-                f"{BEACONS_API_URL}/uniprot/summary",
-                json={"accessions": accessions_batch},
-            )
-
-            if (
-                summary_response
-                and summary_response.status_code == 200
-                and summary_response.json()
-            ):
-                for result in summary_response.json():
-                    accession = result["uniprot_entry"]["ac"]
+        # the summaries fetched already are cached by the hub, so resubmitting
+        # the accessions of an incomplete batch only requests the missing ones
+        while pending and attempt <= SUMMARY_BATCH_RETRIES:
+            attempt += 1
+            incomplete: List[str] = []
+
+            for accessions_batch in divide_chunks(pending, SUMMARY_BATCH_SIZE):
+                results, complete = get_summary_results(session, accessions_batch)
+
+                for accession, result in results.items():
                     accession_record = hit_dictionary[accession]
                     accession_record.update({"summary": result})
                     final_hit_dictionary.update({accession: accession_record})
 
+                if not complete:
+                    incomplete.extend(x for x in accessions_batch if x not in results)
+
+            pending = incomplete
+
+    if pending:
+        logger.warning(f"Summaries of {len(pending)} accessions could not be fetched")
+
     return final_hit_dictionary
 
 